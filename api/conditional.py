@@ -0,0 +1,85 @@
+"""
+Validators for conditional GET on the public business endpoints.
+
+Each business carries a ``content_version`` that is bumped whenever the
+business, its services or its employees change (see businesses/signals.py).
+The ETag is derived from that version and Last-Modified from
+``content_updated_at``, so a revalidation costs one small query and a
+``304 Not Modified`` never reaches the serialization code.
+
+The list ETag hashes the (id, content_version) pair of every active
+business. The list has no Last-Modified: the newest ``content_updated_at``
+moves backwards when that business is deactivated or deleted, so it can't
+tell a client its copy is still current.
+"""
+import hashlib
+
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from businesses.models import Business
+
+_CACHE_ATTR = '_business_validators'
+
+
+def _memoize(request, key, loader):
+    # Django's condition() calls the ETag and Last-Modified functions
+    # separately; keep both results from the same query on the request.
+    cache = request.__dict__.setdefault(_CACHE_ATTR, {})
+    if key not in cache:
+        cache[key] = loader()
+    return cache[key]
+
+
+def _detail_validators(request, business_id):
+    def load():
+        row = Business.objects.filter(id=business_id, is_active=True).values(
+            'content_version', 'content_updated_at'
+        ).first()
+        if row is None:
+            return None, None
+        etag = f'"business-{business_id}-v{row["content_version"]}"'
+        return etag, row['content_updated_at']
+    return _memoize(request, ('detail', business_id), load)
+
+
+def _list_validators(request):
+    def load():
+        versions = Business.objects.filter(is_active=True).order_by('id').values_list('id', 'content_version')
+        digest = hashlib.sha1()
+        for business_id, version in versions:
+            digest.update(f'{business_id}:{version},'.encode())
+        # Filters change the response without changing any business, so
+        # they are part of the ETag. open_now also depends on the clock.
+        digest.update(request.GET.urlencode().encode())
+        if request.GET.get('open_now', '').lower() in ('1', 'true'):
+            digest.update(timezone.localtime().strftime('%w%H%M').encode())
+        return f'"businesses-{digest.hexdigest()}"', None
+    return _memoize(request, 'list', load)
+
+
+def business_etag(request, business_id, **kwargs):
+    return _detail_validators(request, int(business_id))[0]
+
+
+def business_last_modified(request, business_id, **kwargs):
+    return _detail_validators(request, int(business_id))[1]
+
+
+def business_list_etag(request, **kwargs):
+    return _list_validators(request)[0]
+
+
+def business_list_last_modified(request, **kwargs):
+    return _list_validators(request)[1]
+
+
+business_detail_condition = condition(
+    etag_func=business_etag,
+    last_modified_func=business_last_modified,
+)
+
+business_list_condition = condition(
+    etag_func=business_list_etag,
+    last_modified_func=business_list_last_modified,
+)
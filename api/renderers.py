@@ -0,0 +1,70 @@
+"""
+Fast JSON serialization shared by the Ninja API and the DRF views.
+
+``orjson`` is used when it is installed, otherwise we fall back to the
+standard library with Django's encoder. Anything orjson can't encode
+natively (Decimal, lazy translation strings, ...) goes through
+DjangoJSONEncoder, so both backends accept the same data.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from ninja.renderers import BaseRenderer
+from rest_framework import renderers
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+_encoder = DjangoJSONEncoder()
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def json_dumps(data):
+    """Serialize data to JSON bytes using the fastest available backend"""
+    if orjson is not None:
+        return orjson.dumps(
+            data,
+            default=_encoder.default,
+            option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    Drop-in replacement for django.http.JsonResponse.
+
+    Returning one from a Ninja operation skips the validation against its
+    ``response=`` schema, which still documents the endpoint in OpenAPI, so
+    the tests check the data the hot endpoints build against their schemas.
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                'In order to allow non-dict objects to be serialized set the '
+                'safe parameter to False.'
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=json_dumps(data), **kwargs)
+
+
+class FastJSONRenderer(BaseRenderer):
+    """Ninja renderer"""
+    media_type = 'application/json'
+
+    def render(self, request, data, *, response_status):
+        return json_dumps(data)
+
+
+class FastDRFJSONRenderer(renderers.JSONRenderer):
+    """DRF renderer"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json_dumps(data)
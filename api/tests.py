@@ -1,3 +1,142 @@
+import json
+import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+from businesses.models import Business, Employee, Service, Shift
+from . import renderers
+from .views import BusinessSchema, TimeSlotSchema, api
+
+
+def create_business(owner, name='Barber'):
+    return Business.objects.create(
+        owner=owner, name=name, description='', main_image='business/main/test.jpg',
+        address='123 Test St', phone='123-456-7890', email=f'{name.lower()}@example.com',
+    )
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = create_business(User.objects.create_user('owner'))
+        create_business(User.objects.create_user('other'), 'Salon')
+
+    def test_list_revalidates_with_one_query(self):
+        response = self.client.get('/api/businesses')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/businesses', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Filters are part of the ETag
+        self.assertEqual(self.client.get('/api/businesses', {'open_at': '2025-06-02T10:00'},
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        Service.objects.create(business=self.business, name='Cut', description='', price=20, duration=30)
+        response = self.client.get('/api/businesses', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_tells_swapped_businesses_apart(self):
+        other = create_business(User.objects.create_user('third'), 'Spa')
+        Business.objects.filter(pk=self.business.pk).update(content_version=2)
+        Business.objects.filter(pk=other.pk).update(content_version=2, is_active=False)
+        etag = self.client.get('/api/businesses')['ETag']
+
+        # Same number of businesses and the same sum of versions
+        Business.objects.filter(pk=self.business.pk).update(is_active=False)
+        Business.objects.filter(pk=other.pk).update(is_active=True)
+        response = self.client.get('/api/businesses', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_saving_the_business_bumps_its_version(self):
+        url = f'/api/businesses/{self.business.pk}'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.business.name = 'Barber Shop'
+        self.business.save()
+        self.business.refresh_from_db()
+        self.assertEqual(self.business.content_version, 2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Barber Shop')
+
+
+class JsonDumpsTests(TestCase):
+    data = {
+        'date': date(2025, 6, 2),
+        'datetime': datetime(2025, 6, 2, 10, 30, tzinfo=dt_timezone.utc),
+        'time': time(10, 30),
+        'price': Decimal('10.50'),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'label': gettext_lazy('Monday'),
+        1: [None, True, 1.5],
+    }
+    expected = {
+        'date': '2025-06-02',
+        'datetime': '2025-06-02T10:30:00Z',
+        'time': '10:30:00',
+        'price': '10.50',
+        'id': '12345678-1234-5678-1234-567812345678',
+        'label': 'Monday',
+        '1': [None, True, 1.5],
+    }
+
+    @skipUnless(renderers.orjson is not None, 'orjson is not installed')
+    def test_orjson_encodes_django_types(self):
+        self.assertEqual(json.loads(renderers.json_dumps(self.data)), self.expected)
+
+    def test_standard_library_fallback_matches(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(json.loads(renderers.json_dumps(self.data)), self.expected)
+
+    def test_response_refuses_non_dicts_unless_told(self):
+        with self.assertRaises(TypeError):
+            renderers.FastJsonResponse([1])
+        response = renderers.FastJsonResponse([1], safe=False)
+        self.assertEqual((response['Content-Type'], response.content), ('application/json', b'[1]'))
+
+
+class FastPathSchemaTests(TestCase):
+    """The endpoints returning FastJsonResponse still follow the schemas they name"""
+
+    def setUp(self):
+        cache.clear()
+        self.business = create_business(User.objects.create_user('owner'))
+        service = Service.objects.create(business=self.business, name='Cut', description='', price=20, duration=30)
+        employee = Employee.objects.create(business=self.business, name='Employee')
+        employee.services.add(service)
+        Shift.objects.create(business=self.business, employee=employee,
+                             day_of_week=(timezone.now().date() + timedelta(days=1)).weekday(),
+                             start_time=time(9, 0), end_time=time(10, 0))
+
+    def test_business_payloads(self):
+        businesses = self.client.get('/api/businesses').json()
+        self.assertEqual(len(businesses), 1)
+        for payload in [*businesses, self.client.get(f'/api/businesses/{self.business.pk}').json()]:
+            BusinessSchema.model_validate(payload)
+
+    def test_available_slots_payload(self):
+        slots = self.client.get(f'/api/businesses/{self.business.pk}/available-slots').json()
+        self.assertEqual(len(slots), 2)
+        for payload in slots:
+            TimeSlotSchema.model_validate(payload)
 
-# Create your tests here.
+    def test_schemas_stay_in_openapi(self):
+        paths = api.get_openapi_schema()['paths']
+        for path, schema in [('/api/businesses', 'BusinessSchema'),
+                             ('/api/businesses/{business_id}', 'BusinessSchema'),
+                             ('/api/businesses/{business_id}/available-slots', 'TimeSlotSchema'),
+                             ('/api/my-business/schedule', 'ShiftSchema')]:
+            content = paths[path]['get']['responses'][200]['content']['application/json']['schema']
+            self.assertEqual(content.get('items', content)['$ref'], f'#/components/schemas/{schema}')
@@ -0,0 +1,152 @@
+"""
+Token-bucket throttling for DRF views and Ninja operations.
+
+A throttled endpoint belongs to a scope with up to three buckets, each
+configured in TOKEN_BUCKET_RATES as ``'<scope>.<kind>': '<tokens>/<period>'``:
+
+- ``user``: one bucket per authenticated user
+- ``ip``: one bucket per client address
+- ``endpoint``: one bucket shared by every client of the scope
+
+A bucket lets through up to <tokens> requests in any <period>: a client can
+burst the full count, and then gets tokens back as its earlier requests
+age out of the period. A request takes a token from each of its buckets, or
+from none of them when one is empty, and is answered with 429 and a
+Retry-After of the seconds until it would get through. Kinds without a rate
+are not enforced.
+
+Buckets are counted as a sliding window over two fixed-window counters in
+the THROTTLE_CACHE cache: the current period's count plus the previous
+period's, weighted by how much of it still falls inside the window. Tokens
+are taken with the cache's atomic add() and incr() and handed back with
+decr() when the request is refused, so concurrent requests never get more
+than <tokens> through; at worst a request racing a refused one is refused
+too. The cache must be shared between processes and have atomic incr()
+(Redis, Memcached; locmem within one process) in production.
+
+The client address comes from REMOTE_ADDR, or X-Forwarded-For as set by
+the NUM_PROXIES trusted proxies in front of the app.
+"""
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from ninja.throttling import BaseThrottle as NinjaBaseThrottle
+from rest_framework.throttling import BaseThrottle
+
+KINDS = ('user', 'ip', 'endpoint')
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """'<tokens>/<period>' as (capacity, period in seconds)"""
+    tokens, period = rate.split('/')
+    return int(tokens), PERIODS[period]
+
+
+def _incr(store, key, timeout):
+    try:
+        return store.incr(key)
+    except ValueError:
+        # First token of the window; add() loses to a concurrent first one
+        if store.add(key, 1, timeout):
+            return 1
+        return store.incr(key)
+
+
+def _wait(capacity, period, previous, count, elapsed):
+    """
+    Seconds until one more request fits, given the previous window's count,
+    the current one's and the elapsed fraction of the current window
+    """
+    if count < capacity:
+        # The previous window still weighs too much
+        return max((1 - (capacity - count - 1) / previous - elapsed) * period, 0.001)
+    # The current window is full: wait for it to end and to weigh little enough
+    return (1 - elapsed) * period + (1 - (capacity - 1) / count) * period
+
+
+def take(scope, user_id, ip, now=None):
+    """
+    Take a token from each of the request's buckets in the scope. Returns 0
+    when the request may go ahead, else the seconds until it could.
+    """
+    rates = settings.TOKEN_BUCKET_RATES
+    idents = {'user': user_id, 'ip': ip, 'endpoint': 'all'}
+    buckets = {
+        f'throttle:{scope}:{kind}:{idents[kind]}': parse_rate(rates[f'{scope}.{kind}'])
+        for kind in KINDS
+        if rates.get(f'{scope}.{kind}') and idents[kind] is not None
+    }
+    if not buckets:
+        return 0
+
+    now = time.time() if now is None else now
+    store = caches[settings.THROTTLE_CACHE]
+    windows = {key: divmod(now, period) for key, (capacity, period) in buckets.items()}
+    previous = store.get_many([f'{key}:{int(index) - 1}' for key, (index, _) in windows.items()])
+    wait = 0
+    taken = []
+    for key, (capacity, period) in buckets.items():
+        index, offset = int(windows[key][0]), windows[key][1]
+        current = f'{key}:{index}'
+        # A window's count is read until the end of the next one
+        count = _incr(store, current, timeout=2 * period + 1)
+        taken.append(current)
+        before = previous.get(f'{key}:{index - 1}', 0)
+        elapsed = offset / period
+        if before * (1 - elapsed) + count > capacity:
+            wait = max(wait, _wait(capacity, period, before, count - 1, elapsed))
+    if wait:
+        for key in taken:
+            try:
+                store.decr(key)
+            except ValueError:
+                pass
+    return wait
+
+
+def _user_id(user):
+    return user.pk if getattr(user, 'is_authenticated', False) else None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle for the token buckets of ``scope``"""
+    scope = None
+
+    def allow_request(self, request, view):
+        self._wait = take(self.scope, _user_id(request.user), self.get_ident(request))
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class AvailabilityThrottle(TokenBucketThrottle):
+    scope = 'availability'
+
+
+class LoginThrottle(TokenBucketThrottle):
+    scope = 'login'
+
+
+class NinjaTokenBucket(NinjaBaseThrottle):
+    """
+    Ninja throttle for the token buckets of a scope. Ninja shares throttle
+    instances between requests, so the wait is kept per thread.
+    """
+
+    def __init__(self, scope):
+        self.scope = scope
+        self._local = threading.local()
+
+    def allow_request(self, request):
+        user = getattr(request, 'auth', None) or getattr(request, 'user', None)
+        self._local.wait = take(self.scope, _user_id(user), self.get_ident(request))
+        return not self._local.wait
+
+    def wait(self):
+        return getattr(self._local, 'wait', None)
@@ -2,15 +2,34 @@ from django.shortcuts import render
 
 # Create your views here.
 from ninja import NinjaAPI, Schema
+from ninja.decorators import decorate_view
 from typing import List, Optional, Dict
 from businesses.models import Business, Service, Employee, Booking, Shift, TimeSlot
 from datetime import datetime, date, timedelta
 from pydantic import Field
 from django.shortcuts import get_object_or_404
+from django.http import Http404
 from django.db.models import Q
 from django.contrib.auth.models import User
-
-api = NinjaAPI()
+from django.utils import timezone
+from authentication.authentication import ClaimsBearer
+from businesses import analytics
+from businesses.availability import BlockedTime
+from businesses.dashboard import get_dashboard
+from businesses.hours import open_business_ids
+from businesses.month_availability import get_month_availability
+from businesses.owner import get_owner_context
+from businesses.recurrence import business_occurrences
+from businesses.replicas import current_read_db, replica_reads
+from businesses.sharding import activate_business, business_shard, copy_user, fan_out, for_business, locate
+from businesses.singleflight import group
+from .conditional import business_list_condition, business_detail_condition
+from .renderers import FastJSONRenderer, FastJsonResponse
+from .throttling import NinjaTokenBucket
+
+api = NinjaAPI(renderer=FastJSONRenderer())
+
+AVAILABLE_SLOTS = group('api-available-slots')
 
 @api.get("/hello")
 def hello(request):
@@ -55,114 +74,91 @@ class BusinessSchema(Schema):
     services: List[ServiceSchema] = []
     employees: List[EmployeeSchema] = []
 
+def _image_url(image):
+    """Safely get an image URL"""
+    if image and image.name:
+        try:
+            return image.url
+        except ValueError:
+            return None
+    return None
+
+def _business_payload(business):
+    """
+    Build the BusinessSchema payload for a business as plain data.
+    The result already matches the schema, so it's returned without
+    being validated again.
+    """
+    # Get services for this business
+    services = [
+        {
+            "id": service.id,
+            "name": service.name,
+            "description": service.description,
+            "price": float(service.price),
+            "duration": service.duration,
+            "is_active": service.is_active
+        }
+        for service in business.services.filter(is_active=True)
+    ]
+    
+    # Get employees for this business
+    employees = [
+        {
+            "id": employee.id,
+            "name": employee.name,
+            "image": _image_url(employee.image),
+            "phone": employee.phone,
+            "email": employee.email,
+            "is_active": employee.is_active,
+            "services": [service.id for service in employee.services.all()]
+        }
+        for employee in business.employees.filter(is_active=True)
+    ]
+    
+    return {
+        "id": business.id,
+        "name": business.name,
+        "description": business.description,
+        "main_image": _image_url(business.main_image),
+        "image1": _image_url(business.image1),
+        "image2": _image_url(business.image2),
+        "image3": _image_url(business.image3),
+        "image4": _image_url(business.image4),
+        "address": business.address,
+        "latitude": float(business.latitude) if business.latitude else None,
+        "longitude": float(business.longitude) if business.longitude else None,
+        "phone": business.phone,
+        "email": business.email,
+        "opening_hours": business.opening_hours,
+        "is_active": business.is_active,
+        "created_at": business.created_at,
+        "updated_at": business.updated_at,
+        "services": services,
+        "employees": employees
+    }
+
 @api.get("/businesses", response=List[BusinessSchema])
-def get_businesses(request):
+@decorate_view(business_list_condition, replica_reads)
+def get_businesses(request, open_at: Optional[datetime] = None, open_now: bool = False):
     """
-    Get all businesses with their details including services and employees
+    Get all businesses with their details including services and employees.
+    open_at (ISO datetime) or open_now=true only returns businesses open at that time.
     """
     businesses = Business.objects.filter(is_active=True)
+    if open_now and open_at is None:
+        open_at = timezone.now()
+    if open_at is not None:
+        businesses = businesses.filter(id__in=open_business_ids(open_at))
+    # Each business's services and employees are read from its own shard
     result = []
-    
     for business in businesses:
-        # Get services for this business
-        services = [
-            ServiceSchema(
-                id=service.id,
-                name=service.name,
-                description=service.description,
-                price=float(service.price),
-                duration=service.duration,
-                is_active=service.is_active
-            )
-            for service in business.services.filter(is_active=True)
-        ]
-        
-        # Get employees for this business
-        employees = []
-        for employee in business.employees.filter(is_active=True):
-            # Safely get image URL
-            image_url = None
-            if employee.image and employee.image.name:
-                try:
-                    image_url = employee.image.url
-                except ValueError:
-                    image_url = None
-                    
-            employee_data = EmployeeSchema(
-                id=employee.id,
-                name=employee.name,
-                image=image_url,
-                phone=employee.phone,
-                email=employee.email,
-                is_active=employee.is_active,
-                services=[service.id for service in employee.services.all()]
-            )
-            employees.append(employee_data)
-        
-        # Safely get image URLs
-        main_image_url = None
-        if business.main_image and business.main_image.name:
-            try:
-                main_image_url = business.main_image.url
-            except ValueError:
-                main_image_url = None
-                
-        image1_url = None
-        if business.image1 and business.image1.name:
-            try:
-                image1_url = business.image1.url
-            except ValueError:
-                image1_url = None
-                
-        image2_url = None
-        if business.image2 and business.image2.name:
-            try:
-                image2_url = business.image2.url
-            except ValueError:
-                image2_url = None
-                
-        image3_url = None
-        if business.image3 and business.image3.name:
-            try:
-                image3_url = business.image3.url
-            except ValueError:
-                image3_url = None
-                
-        image4_url = None
-        if business.image4 and business.image4.name:
-            try:
-                image4_url = business.image4.url
-            except ValueError:
-                image4_url = None
-        
-        # Create business data
-        business_data = BusinessSchema(
-            id=business.id,
-            name=business.name,
-            description=business.description,
-            main_image=main_image_url,
-            image1=image1_url,
-            image2=image2_url,
-            image3=image3_url,
-            image4=image4_url,
-            address=business.address,
-            latitude=float(business.latitude) if business.latitude else None,
-            longitude=float(business.longitude) if business.longitude else None,
-            phone=business.phone,
-            email=business.email,
-            opening_hours=business.opening_hours,
-            is_active=business.is_active,
-            created_at=business.created_at,
-            updated_at=business.updated_at,
-            services=services,
-            employees=employees
-        )
-        
-        result.append(business_data)
-    
-    return result
+        with for_business(business.id):
+            result.append(_business_payload(business))
+    return FastJsonResponse(result, safe=False)
 
 @api.get("/businesses/{business_id}", response=BusinessSchema)
+@decorate_view(business_detail_condition, replica_reads, business_shard)
 def get_business(request, business_id: int):
     """
     Get a specific business by ID with all its details
@@ -172,101 +168,7 @@ def get_business(request, business_id: int):
     except Business.DoesNotExist:
         return api.create_response(request, {"message": "Business not found"}, status=404)
     
-    # Get services for this business
-    services = [
-        ServiceSchema(
-            id=service.id,
-            name=service.name,
-            description=service.description,
-            price=float(service.price),
-            duration=service.duration,
-            is_active=service.is_active
-        )
-        for service in business.services.filter(is_active=True)
-    ]
-    
-    # Get employees for this business
-    employees = []
-    for employee in business.employees.filter(is_active=True):
-        # Safely get image URL
-        image_url = None
-        if employee.image and employee.image.name:
-            try:
-                image_url = employee.image.url
-            except ValueError:
-                image_url = None
-                
-        employee_data = EmployeeSchema(
-            id=employee.id,
-            name=employee.name,
-            image=image_url,
-            phone=employee.phone,
-            email=employee.email,
-            is_active=employee.is_active,
-            services=[service.id for service in employee.services.all()]
-        )
-        employees.append(employee_data)
-    
-    # Safely get image URLs
-    main_image_url = None
-    if business.main_image and business.main_image.name:
-        try:
-            main_image_url = business.main_image.url
-        except ValueError:
-            main_image_url = None
-            
-    image1_url = None
-    if business.image1 and business.image1.name:
-        try:
-            image1_url = business.image1.url
-        except ValueError:
-            image1_url = None
-            
-    image2_url = None
-    if business.image2 and business.image2.name:
-        try:
-            image2_url = business.image2.url
-        except ValueError:
-            image2_url = None
-            
-    image3_url = None
-    if business.image3 and business.image3.name:
-        try:
-            image3_url = business.image3.url
-        except ValueError:
-            image3_url = None
-            
-    image4_url = None
-    if business.image4 and business.image4.name:
-        try:
-            image4_url = business.image4.url
-        except ValueError:
-            image4_url = None
-    
-    # Create business data
-    business_data = BusinessSchema(
-        id=business.id,
-        name=business.name,
-        description=business.description,
-        main_image=main_image_url,
-        image1=image1_url,
-        image2=image2_url,
-        image3=image3_url,
-        image4=image4_url,
-        address=business.address,
-        latitude=float(business.latitude) if business.latitude else None,
-        longitude=float(business.longitude) if business.longitude else None,
-        phone=business.phone,
-        email=business.email,
-        opening_hours=business.opening_hours,
-        is_active=business.is_active,
-        created_at=business.created_at,
-        updated_at=business.updated_at,
-        services=services,
-        employees=employees
-    )
-    
-    return business_data
+    return FastJsonResponse(_business_payload(business))
 
 # Schemas for the booking system
 class ShiftSchema(Schema):
@@ -317,6 +219,7 @@ class ShiftCreateSchema(Schema):
 # Endpoints for barbershop owners
 
 @api.post("/businesses/{business_id}/shifts", response=ShiftSchema)
+@decorate_view(business_shard)
 def create_shift(request, business_id: int, shift_data: ShiftCreateSchema):
     """Create a new shift for an employee"""
     if not request.user.is_authenticated:
@@ -362,6 +265,7 @@ def create_shift(request, business_id: int, shift_data: ShiftCreateSchema):
     }
 
 @api.get("/businesses/{business_id}/shifts", response=List[ShiftSchema])
+@decorate_view(business_shard)
 def get_shifts(request, business_id: int, shift_type: Optional[str] = None, employee_id: Optional[int] = None):
     """Get all shifts for a business with optional filtering"""
     business = get_object_or_404(Business, id=business_id)
@@ -393,13 +297,31 @@ def get_shifts(request, business_id: int, shift_type: Optional[str] = None, empl
     
     return result
 
+def _locate_shift(request, shift_id):
+    """The shift on whichever shard has it, with its business activated"""
+    shift = locate(Shift.objects.filter(id=shift_id).select_related('business'),
+                   lambda shift: shift.business.owner_id == request.user.id)
+    if shift is None:
+        raise Http404
+    activate_business(shift.business_id)
+    return shift
+
+def _locate_booking(request, booking_id):
+    """The booking on whichever shard has it, with its business activated"""
+    booking = locate(Booking.objects.filter(id=booking_id).select_related('business'),
+                     lambda booking: request.user.id in (booking.customer_id, booking.business.owner_id))
+    if booking is None:
+        raise Http404
+    activate_business(booking.business_id)
+    return booking
+
 @api.put("/shifts/{shift_id}", response=ShiftSchema)
 def update_shift(request, shift_id: int, shift_data: ShiftCreateSchema):
     """Update a shift"""
     if not request.user.is_authenticated:
         return api.create_response(request, {"detail": "Authentication required"}, status=401)
     
-    shift = get_object_or_404(Shift, id=shift_id)
+    shift = _locate_shift(request, shift_id)
     
     # Check if the user is the owner of the business
     if shift.business.owner != request.user:
@@ -439,7 +361,7 @@ def delete_shift(request, shift_id: int):
     if not request.user.is_authenticated:
         return api.create_response(request, {"detail": "Authentication required"}, status=401)
     
-    shift = get_object_or_404(Shift, id=shift_id)
+    shift = _locate_shift(request, shift_id)
     
     # Check if the user is the owner of the business
     if shift.business.owner != request.user:
@@ -456,7 +378,7 @@ def generate_time_slots(request, shift_id: int, days_ahead: int = 7):
     if not request.user.is_authenticated:
         return api.create_response(request, {"detail": "Authentication required"}, status=401)
     
-    shift = get_object_or_404(Shift, id=shift_id)
+    shift = _locate_shift(request, shift_id)
     
     # Check if the user is the owner of the business
     if shift.business.owner != request.user:
@@ -476,7 +398,8 @@ def generate_time_slots(request, shift_id: int, days_ahead: int = 7):
     return {"slots_created": slots_created}
 
 @api.post("/businesses/{business_id}/generate-slots")
-def generate_business_time_slots(request, business_id: int, days_ahead: int = 7, slot_duration: int = 30):
+@decorate_view(business_shard)
+def generate_business_time_slots(request, business_id: int, days_ahead: int = 7, slot_duration: Optional[int] = None):
     """Generate time slots for all employees in a business for the next X days"""
     if not request.user.is_authenticated:
         return api.create_response(request, {"detail": "Authentication required"}, status=401)
@@ -500,7 +423,8 @@ def generate_business_time_slots(request, business_id: int, days_ahead: int = 7,
 
 # Endpoints for customers
 
-@api.get("/businesses/{business_id}/available-slots", response=List[TimeSlotSchema])
+@api.get("/businesses/{business_id}/available-slots", response=List[TimeSlotSchema], throttle=NinjaTokenBucket('availability'))
+@decorate_view(replica_reads, business_shard)
 def get_available_slots(request, business_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None, employee_id: Optional[int] = None):
     """Get available time slots for a business"""
     business = get_object_or_404(Business, id=business_id)
@@ -511,35 +435,76 @@ def get_available_slots(request, business_id: int, date_from: Optional[date] = N
     if date_to is None:
         date_to = date_from + timedelta(days=7)
     
-    # Build the query
-    query = Q(
-        shift__business=business,
-        date__gte=date_from,
-        date__lte=date_to,
-        is_available=True
-    )
+    def compute():
+        # Build the query
+        query = Q(
+            shift__business=business,
+            date__gte=date_from,
+            date__lte=date_to,
+            is_available=True
+        )
+
+        # Filter by employee if specified
+        if employee_id:
+            query &= Q(shift__employee_id=employee_id)
+
+        # Get the available slots
+        slots = TimeSlot.objects.filter(query).order_by('date', 'start_time').values_list(
+            'id', 'date', 'start_time', 'end_time', 'is_available', 'shift_id', 'shift__employee_id'
+        )
+
+        # Leave out slots covered by time off, closures and holidays
+        blocked = BlockedTime(business.id, date_from, date_to, employee_ids=[employee_id] if employee_id else None)
+        if blocked:
+            slots = [slot for slot in slots if not blocked.is_blocked(slot[6], slot[1], slot[2], slot[3])]
+
+        # Hot path: the rows already match TimeSlotSchema, skip re-validation
+        result = [
+            {
+                "id": slot_id,
+                "date": slot_date,
+                "start_time": start_time.strftime("%H:%M"),
+                "end_time": end_time.strftime("%H:%M"),
+                "is_available": is_available,
+                "shift_id": shift_id,
+                "employee_id": employee_id,
+                "business_id": business.id
+            }
+            for slot_id, slot_date, start_time, end_time, is_available, shift_id, employee_id in slots
+        ]
+
+        return result
     
-    # Filter by employee if specified
-    if employee_id:
-        query &= Q(shift__employee_id=employee_id)
+    # Concurrent requests for the same range share one computation
+    result = AVAILABLE_SLOTS.do((business.id, date_from, date_to, employee_id or None, current_read_db()), compute)
     
-    # Get the available slots
-    slots = TimeSlot.objects.filter(query).order_by('date', 'start_time')
+    return FastJsonResponse(result, safe=False)
+
+@api.get("/businesses/{business_id}/month-availability", throttle=NinjaTokenBucket('availability'))
+@decorate_view(replica_reads, business_shard)
+def get_business_month_availability(request, business_id: int, service_ids: str, month: Optional[str] = None, employee_id: Optional[int] = None):
+    """
+    Per day of a month, how many start times have room for the services.
     
-    result = []
-    for slot in slots:
-        result.append({
-            "id": slot.id,
-            "date": slot.date,
-            "start_time": slot.start_time.strftime("%H:%M"),
-            "end_time": slot.end_time.strftime("%H:%M"),
-            "is_available": slot.is_available,
-            "shift_id": slot.shift.id,
-            "employee_id": slot.shift.employee.id,
-            "business_id": slot.shift.business.id
-        })
+    Query parameters:
+    - service_ids: Comma-separated list of service IDs
+    - month: YYYY-MM, defaults to the current month
+    - employee_id: Only this employee's slots
+    """
+    business = get_object_or_404(Business, id=business_id)
     
-    return result
+    try:
+        year, month_number = (int(part) for part in (month or datetime.now().strftime('%Y-%m')).split('-'))
+        date(year, month_number, 1)
+        ids = {int(service_id) for service_id in service_ids.split(',') if service_id}
+    except ValueError:
+        return api.create_response(request, {"detail": "Expected month as YYYY-MM and comma-separated service IDs"}, status=400)
+    
+    durations = list(Service.objects.filter(business=business, id__in=ids).values_list('duration', flat=True))
+    if not ids or len(durations) != len(ids):
+        return api.create_response(request, {"detail": "One or more services not found"}, status=404)
+    
+    return FastJsonResponse(get_month_availability(business, year, month_number, sum(durations), employee_id))
 
 @api.post("/bookings", response=BookingResponseSchema)
 def create_booking(request, booking_data: BookingCreateSchema):
@@ -548,7 +513,10 @@ def create_booking(request, booking_data: BookingCreateSchema):
         return api.create_response(request, {"detail": "Authentication required"}, status=401)
     
     # Get the time slot
-    time_slot = get_object_or_404(TimeSlot, id=booking_data.time_slot_id)
+    time_slot = locate(TimeSlot.objects.filter(id=booking_data.time_slot_id))
+    if time_slot is None:
+        raise Http404
+    activate_business(time_slot.shift.business_id)
     
     # Check if the slot is available
     if not time_slot.is_available:
@@ -566,6 +534,7 @@ def create_booking(request, booking_data: BookingCreateSchema):
         return api.create_response(request, {"detail": "Employee does not provide this service"}, status=400)
     
     # Create the booking
+    copy_user(request.user.id)
     booking = Booking.objects.create(
         business=time_slot.shift.business,
         customer=request.user,
@@ -603,7 +572,7 @@ def get_booking(request, booking_id: int):
         return api.create_response(request, {"detail": "Authentication required"}, status=401)
     
     # Get the booking
-    booking = get_object_or_404(Booking, id=booking_id)
+    booking = _locate_booking(request, booking_id)
     
     # Check if the user is authorized to view this booking
     if booking.customer != request.user and booking.business.owner != request.user:
@@ -661,7 +630,7 @@ def cancel_booking(request, booking_id: int):
         return api.create_response(request, {"detail": "Authentication required"}, status=401)
     
     # Get the booking
-    booking = get_object_or_404(Booking, id=booking_id)
+    booking = _locate_booking(request, booking_id)
     
     # Check if the user is authorized to cancel this booking
     if booking.customer != request.user and booking.business.owner != request.user:
@@ -674,20 +643,25 @@ def cancel_booking(request, booking_id: int):
     if booking.status == 'completed':
         return api.create_response(request, {"detail": "Completed bookings cannot be cancelled"}, status=400)
     
-    # Cancel the booking
-    booking.status = 'cancelled'
-    booking.save()  # This will also make the time slot available again
+    # Cancel the booking, freeing its time slots
+    booking.cancel()
     
     return {"success": True}
 
 @api.get("/my-bookings", response=List[BookingResponseSchema])
+@decorate_view(replica_reads)
 def get_my_bookings(request):
     """Get all bookings for the current user"""
     if not request.user.is_authenticated:
         return api.create_response(request, {"detail": "Authentication required"}, status=401)
     
     # Get the bookings
-    bookings = Booking.objects.filter(customer=request.user).order_by('-created_at')
+    # A customer's bookings can be on every shard
+    bookings = fan_out(
+        Booking.objects.filter(customer=request.user).order_by('-created_at'),
+        key=lambda booking: booking.created_at,
+        reverse=True,
+    )
     
     result = []
     for booking in bookings:
@@ -738,6 +712,7 @@ def get_my_bookings(request):
     return result
 
 @api.get("/businesses/{business_id}/bookings", response=List[BookingResponseSchema])
+@decorate_view(replica_reads, business_shard)
 def get_business_bookings(request, business_id: int):
     """Get all bookings for a business"""
     if not request.user.is_authenticated:
@@ -800,24 +775,20 @@ def get_business_bookings(request, business_id: int):
     
     return result
 
-@api.get("/my-business/schedule", response=List[ShiftSchema])
+@api.get("/my-business/schedule", response=List[ShiftSchema], auth=ClaimsBearer())
 def get_my_business_schedule(request, date_from: Optional[date] = None, date_to: Optional[date] = None):
     """
     Get the schedule for the authenticated business owner's business.
     This endpoint requires authentication with a bearer token.
     """
-    # Check if user is authenticated
-    if not request.user.is_authenticated:
-        return api.create_response(request, {"detail": "Authentication required"}, status=401)
-    
     # Check if user is a business owner
-    if not request.user.groups.filter(name='Business Owners').exists():
+    owner = get_owner_context(request)
+    if not owner.is_business_owner:
         return api.create_response(request, {"detail": "You must be a business owner to access this endpoint"}, status=403)
     
     # Get the business for the authenticated user
-    try:
-        business = Business.objects.get(owner=request.user)
-    except Business.DoesNotExist:
+    business = owner.business
+    if business is None:
         return api.create_response(request, {"detail": "No business found for this user"}, status=404)
     
     # Set default date range if not provided
@@ -826,63 +797,35 @@ def get_my_business_schedule(request, date_from: Optional[date] = None, date_to:
     if not date_to:
         date_to = date_from + timedelta(days=30)  # Default to 30 days ahead
     
-    # Get all shifts for the business within the date range
-    shifts = Shift.objects.filter(business=business, is_active=True)
-    
-    result = []
-    for shift in shifts:
-        # For recurring shifts, check if they occur within the date range
-        if shift.shift_type == 'recurring':
-            # Add the shift if it occurs on a day within the date range
-            current_date = date_from
-            while current_date <= date_to:
-                if current_date.weekday() == shift.day_of_week:
-                    result.append({
-                        "id": shift.id,
-                        "shift_type": shift.shift_type,
-                        "day_of_week": shift.day_of_week,
-                        "specific_date": current_date,  # Use the actual date for this occurrence
-                        "start_time": shift.start_time.strftime("%H:%M"),
-                        "end_time": shift.end_time.strftime("%H:%M"),
-                        "is_active": shift.is_active,
-                        "employee_id": shift.employee.id,
-                        "business_id": business.id
-                    })
-                current_date += timedelta(days=1)
-        # For one-time shifts, add them if they fall within the date range
-        elif shift.shift_type == 'one_time' and shift.specific_date and date_from <= shift.specific_date <= date_to:
-            result.append({
-                "id": shift.id,
-                "shift_type": shift.shift_type,
-                "day_of_week": None,
-                "specific_date": shift.specific_date,
-                "start_time": shift.start_time.strftime("%H:%M"),
-                "end_time": shift.end_time.strftime("%H:%M"),
-                "is_active": shift.is_active,
-                "employee_id": shift.employee.id,
-                "business_id": business.id
-            })
-    
-    return result
-
-@api.get("/my-business/time-slots", response=List[TimeSlotSchema])
+    # Expand the weekly shifts, with their exceptions, into dated occurrences
+    result = [{
+        "id": occurrence.shift_id,
+        "shift_type": "one_time" if occurrence.is_one_off else "recurring",
+        "day_of_week": None if occurrence.is_one_off else occurrence.day_of_week,
+        "specific_date": occurrence.date,  # Use the actual date for this occurrence
+        "start_time": occurrence.start_time.strftime("%H:%M"),
+        "end_time": occurrence.end_time.strftime("%H:%M"),
+        "is_active": True,
+        "employee_id": occurrence.employee_id,
+        "business_id": occurrence.business_id
+    } for occurrence in business_occurrences(business, date_from, date_to)]
+    
+    return FastJsonResponse(result, safe=False)
+
+@api.get("/my-business/time-slots", response=List[TimeSlotSchema], auth=ClaimsBearer())
 def get_my_business_time_slots(request, date_from: Optional[date] = None, date_to: Optional[date] = None):
     """
     Get all time slots for the authenticated business owner's business.
     This endpoint requires authentication with a bearer token.
     """
-    # Check if user is authenticated
-    if not request.user.is_authenticated:
-        return api.create_response(request, {"detail": "Authentication required"}, status=401)
-    
     # Check if user is a business owner
-    if not request.user.groups.filter(name='Business Owners').exists():
+    owner = get_owner_context(request)
+    if not owner.is_business_owner:
         return api.create_response(request, {"detail": "You must be a business owner to access this endpoint"}, status=403)
     
     # Get the business for the authenticated user
-    try:
-        business = Business.objects.get(owner=request.user)
-    except Business.DoesNotExist:
+    business = owner.business
+    if business is None:
         return api.create_response(request, {"detail": "No business found for this user"}, status=404)
     
     # Set default date range if not provided
@@ -913,24 +856,20 @@ def get_my_business_time_slots(request, date_from: Optional[date] = None, date_t
     
     return result
 
-@api.get("/my-business/employees", response=List[EmployeeSchema])
+@api.get("/my-business/employees", response=List[EmployeeSchema], auth=ClaimsBearer())
 def get_my_business_employees(request):
     """
     Get all employees for the authenticated business owner's business.
     This endpoint requires authentication with a bearer token.
     """
-    # Check if user is authenticated
-    if not request.user.is_authenticated:
-        return api.create_response(request, {"detail": "Authentication required"}, status=401)
-    
     # Check if user is a business owner
-    if not request.user.groups.filter(name='Business Owners').exists():
+    owner = get_owner_context(request)
+    if not owner.is_business_owner:
         return api.create_response(request, {"detail": "You must be a business owner to access this endpoint"}, status=403)
     
     # Get the business for the authenticated user
-    try:
-        business = Business.objects.get(owner=request.user)
-    except Business.DoesNotExist:
+    business = owner.business
+    if business is None:
         return api.create_response(request, {"detail": "No business found for this user"}, status=404)
     
     # Get all employees for the business
@@ -950,24 +889,20 @@ def get_my_business_employees(request):
     
     return result
 
-@api.get("/my-business/bookings", response=List[BookingResponseSchema])
+@api.get("/my-business/bookings", response=List[BookingResponseSchema], auth=ClaimsBearer())
 def get_my_business_bookings(request):
     """
     Get all bookings for the authenticated business owner's business.
     This endpoint requires authentication with a bearer token.
     """
-    # Check if user is authenticated
-    if not request.user.is_authenticated:
-        return api.create_response(request, {"detail": "Authentication required"}, status=401)
-    
     # Check if user is a business owner
-    if not request.user.groups.filter(name='Business Owners').exists():
+    owner = get_owner_context(request)
+    if not owner.is_business_owner:
         return api.create_response(request, {"detail": "You must be a business owner to access this endpoint"}, status=403)
     
     # Get the business for the authenticated user
-    try:
-        business = Business.objects.get(owner=request.user)
-    except Business.DoesNotExist:
+    business = owner.business
+    if business is None:
         return api.create_response(request, {"detail": "No business found for this user"}, status=404)
     
     # Get all bookings for the business
@@ -1002,24 +937,69 @@ def get_my_business_bookings(request):
     
     return result
 
-@api.post("/my-business/generate-slots")
-def generate_my_business_time_slots(request, days_ahead: int = 7, slot_duration: int = 30):
+@api.get("/my-business/dashboard", auth=ClaimsBearer())
+def get_my_business_dashboard(request):
     """
-    Generate time slots for all employees in the authenticated business owner's business.
+    Today's and upcoming bookings, per-employee counts, utilisation and next
+    free slots for the authenticated business owner's business.
     This endpoint requires authentication with a bearer token.
     """
-    # Check if user is authenticated
-    if not request.user.is_authenticated:
-        return api.create_response(request, {"detail": "Authentication required"}, status=401)
+    # Check if user is a business owner
+    owner = get_owner_context(request)
+    if not owner.is_business_owner:
+        return api.create_response(request, {"detail": "You must be a business owner to access this endpoint"}, status=403)
+    
+    # Get the business for the authenticated user
+    business = owner.business
+    if business is None:
+        return api.create_response(request, {"detail": "No business found for this user"}, status=404)
+    
+    return FastJsonResponse(get_dashboard(business))
+
+@api.get("/my-business/analytics", auth=ClaimsBearer())
+def get_my_business_analytics(request, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """
+    Utilisation, hour-of-week heatmap, peak hours and idle gaps for the
+    authenticated business owner's business.
+    This endpoint requires authentication with a bearer token.
+    """
+    # Check if user is a business owner
+    owner = get_owner_context(request)
+    if not owner.is_business_owner:
+        return api.create_response(request, {"detail": "You must be a business owner to access this endpoint"}, status=403)
+    
+    # Get the business for the authenticated user
+    business = owner.business
+    if business is None:
+        return api.create_response(request, {"detail": "No business found for this user"}, status=404)
+    
+    if analytics.np is None:
+        return api.create_response(request, {"detail": "Analytics require NumPy to be installed"}, status=501)
+    
+    # Default to the last 90 days
+    if not date_to:
+        date_to = datetime.now().date()
+    if not date_from:
+        date_from = date_to - timedelta(days=89)
+    if date_from > date_to or (date_to - date_from).days >= 366:
+        return api.create_response(request, {"detail": "Date range must be between 1 and 366 days"}, status=400)
     
+    return FastJsonResponse(analytics.build_report(business, date_from, date_to))
+
+@api.post("/my-business/generate-slots", auth=ClaimsBearer())
+def generate_my_business_time_slots(request, days_ahead: int = 7, slot_duration: Optional[int] = None):
+    """
+    Generate time slots for all employees in the authenticated business owner's business.
+    This endpoint requires authentication with a bearer token.
+    """
     # Check if user is a business owner
-    if not request.user.groups.filter(name='Business Owners').exists():
+    owner = get_owner_context(request)
+    if not owner.is_business_owner:
         return api.create_response(request, {"detail": "You must be a business owner to access this endpoint"}, status=403)
     
     # Get the business for the authenticated user
-    try:
-        business = Business.objects.get(owner=request.user)
-    except Business.DoesNotExist:
+    business = owner.business
+    if business is None:
         return api.create_response(request, {"detail": "No business found for this user"}, status=404)
     
     # Generate time slots for all employees
@@ -0,0 +1,59 @@
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from ninja.security import HttpBearer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .claims import ROLE_CLAIM, BUSINESS_CLAIM, VERSION_CLAIM, get_claims_version
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request principal built from the access token claims, no DB lookup.
+    Use ``request.user.id`` / ``business_id`` rather than passing it to the ORM.
+    """
+
+    @cached_property
+    def role(self):
+        return self.token.get(ROLE_CLAIM, 'customer')
+
+    @cached_property
+    def business_id(self):
+        return self.token.get(BUSINESS_CLAIM)
+
+    @property
+    def is_business_owner(self):
+        return self.role == 'business_owner'
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Stateless JWT authentication that trusts the signed role/business claims.
+    Tokens whose claims version is behind the user's current one are rejected.
+    Tokens issued before claims existed count as version 0, so they stay
+    valid until they expire unless the user's claims change first.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if validated_token.get(VERSION_CLAIM, 0) != get_claims_version(user_id):
+            raise InvalidToken(_("Token claims are out of date, please log in again"))
+
+        return ClaimsUser(validated_token)
+
+
+class ClaimsBearer(HttpBearer):
+    """Ninja counterpart of ClaimsJWTAuthentication, sets request.auth to a ClaimsUser"""
+
+    def authenticate(self, request, token):
+        backend = ClaimsJWTAuthentication()
+        try:
+            return backend.get_user(backend.get_validated_token(token.encode()))
+        except (InvalidToken, AuthenticationFailed):
+            return None
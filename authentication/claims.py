@@ -0,0 +1,104 @@
+"""
+Role and business claims carried in the JWTs.
+
+Access tokens embed the user's role, business id and a claims version so
+that owner endpoints can authorize a request without touching the database.
+The version is stored in ClaimsVersion and mirrored in the cache; bumping
+it (see authentication/signals.py) invalidates every outstanding token.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import models, transaction
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+
+from .models import ClaimsVersion
+
+BUSINESS_OWNERS_GROUP = 'Business Owners'
+
+ROLE_CLAIM = 'role'
+BUSINESS_CLAIM = 'business_id'
+VERSION_CLAIM = 'cv'
+
+
+def _version_cache_key(user_id):
+    return f'claims-version:{user_id}'
+
+
+def get_claims_version(user_id):
+    """Current claims version for a user, served from the cache when possible"""
+    key = _version_cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = ClaimsVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+        cache.set(key, version, getattr(settings, 'CLAIMS_VERSION_CACHE_TIMEOUT', 60))
+    return version
+
+
+def bump_claims_version(user_id):
+    """Invalidate all tokens issued to a user before this call"""
+    updated = ClaimsVersion.objects.filter(user_id=user_id).update(version=models.F('version') + 1)
+    if not updated:
+        ClaimsVersion.objects.get_or_create(user_id=user_id, defaults={'version': 1})
+    key = _version_cache_key(user_id)
+    cache.delete(key)
+    # Drop it again once committed, in case a concurrent request cached the old value
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def get_user_claims(user):
+    """
+    Role, business id and claims version for a user.
+    Memoized on the user instance so issuing a token pair queries once.
+    """
+    if not hasattr(user, '_token_claims'):
+        from businesses.models import Business
+
+        is_owner = user.groups.filter(name=BUSINESS_OWNERS_GROUP).exists()
+        user._token_claims = {
+            ROLE_CLAIM: 'business_owner' if is_owner else 'customer',
+            BUSINESS_CLAIM: Business.objects.filter(owner=user).values_list('id', flat=True).first(),
+            VERSION_CLAIM: get_claims_version(user.pk),
+        }
+    return user._token_claims
+
+
+def resolve_role(user, token=None):
+    """
+    Role of a user, read from the request's validated JWT when it belongs
+    to that user and is current, falling back to a group query otherwise.
+    """
+    if (
+        isinstance(token, Token)
+        and ROLE_CLAIM in token
+        # simplejwt stores the user id as a string
+        and str(token.get(api_settings.USER_ID_CLAIM)) == str(user.pk)
+        and token.get(VERSION_CLAIM) == get_claims_version(user.pk)
+    ):
+        return token[ROLE_CLAIM]
+    return get_user_claims(user)[ROLE_CLAIM]
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token that stamps the role claims on the user's tokens and
+    re-stamps access tokens when the claims version has moved on since the
+    refresh token was issued.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.payload.update(get_user_claims(user))
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user_id = access.get(api_settings.USER_ID_CLAIM)
+        if access.get(VERSION_CLAIM) != get_claims_version(user_id):
+            user = User.objects.filter(pk=user_id).first()
+            if user is not None:
+                access.payload.update(get_user_claims(user))
+        return access
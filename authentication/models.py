@@ -18,3 +18,15 @@ class UserProfile(models.Model):
 
     def __str__(self):
         return self.user.username
+
+class ClaimsVersion(models.Model):
+    """
+    Version of the role/business claims embedded in a user's JWTs.
+    Bumped whenever those claims change so outstanding tokens are rejected.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='claims_version')
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} (v{self.version})"
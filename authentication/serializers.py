@@ -1,8 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.password_validation import validate_password
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from .models import UserProfile
+from .claims import (
+    BUSINESS_OWNERS_GROUP, ROLE_CLAIM, BUSINESS_CLAIM, ClaimsRefreshToken, get_user_claims, resolve_role
+)
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -48,7 +51,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         
         # Assign user to appropriate group based on role
         if role == 'business_owner':
-            business_owners_group, _ = Group.objects.get_or_create(name='Business Owners')
+            business_owners_group, _ = Group.objects.get_or_create(name=BUSINESS_OWNERS_GROUP)
             user.groups.add(business_owners_group)
         
         user.save()
@@ -63,6 +66,8 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
     def validate(self, attrs):
         data = super().validate(attrs)
         # Add extra responses here
@@ -70,20 +75,20 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         data['email'] = self.user.email
         data['full_name'] = f"{self.user.first_name} {self.user.last_name}".strip()
         
-        # Add role information
-        if self.user.groups.filter(name='Business Owners').exists():
-            data['role'] = 'business_owner'
-            # Add business ID if the user has a business
-            if hasattr(self.user, 'business'):
-                data['business_id'] = self.user.business.id
-        else:
-            data['role'] = 'customer'
+        # Add role information (same values as the token claims)
+        claims = get_user_claims(self.user)
+        data['role'] = claims[ROLE_CLAIM]
+        if claims[ROLE_CLAIM] == 'business_owner' and claims[BUSINESS_CLAIM] is not None:
+            data['business_id'] = claims[BUSINESS_CLAIM]
             
         if hasattr(self.user, 'profile'):
             data['phone_number'] = self.user.profile.phone_number
             data['gender'] = self.user.profile.gender
         return data
 
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
 class UserSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     phone_number = serializers.CharField(source='profile.phone_number')
@@ -99,9 +104,8 @@ class UserSerializer(serializers.ModelSerializer):
         return f"{obj.first_name} {obj.last_name}".strip()
         
     def get_role(self, obj):
-        if obj.groups.filter(name='Business Owners').exists():
-            return 'business_owner'
-        return 'customer'
+        request = self.context.get('request')
+        return resolve_role(obj, getattr(request, 'auth', None))
 
 class CustomerListSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from businesses.models import Business
+from .claims import bump_claims_version
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # user.groups.add/remove/clear
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            bump_claims_version(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        # group.user_set.add/remove
+        for user_id in pk_set:
+            bump_claims_version(user_id)
+    elif action == 'pre_clear':
+        # group.user_set.clear() doesn't pass pk_set, collect the members first
+        for user_id in instance.user_set.values_list('id', flat=True):
+            bump_claims_version(user_id)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if not created and not instance.is_active:
+        bump_claims_version(instance.pk)
+
+
+@receiver(pre_save, sender=Business)
+def business_owner_changing(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_owner_id = (
+            Business.objects.filter(pk=instance.pk).values_list('owner_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Business)
+def business_owner_changed(sender, instance, created, **kwargs):
+    previous_owner_id = getattr(instance, '_previous_owner_id', None)
+    if created or previous_owner_id != instance.owner_id:
+        bump_claims_version(instance.owner_id)
+        if previous_owner_id:
+            bump_claims_version(previous_owner_id)
+
+
+@receiver(post_delete, sender=Business)
+def business_deleted(sender, instance, **kwargs):
+    owner_id = instance.owner_id
+
+    # The owner may be going away in the same cascade, only bump if they remain
+    def bump():
+        if User.objects.filter(pk=owner_id).exists():
+            bump_claims_version(owner_id)
+    transaction.on_commit(bump)
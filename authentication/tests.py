@@ -1,3 +1,80 @@
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework_simplejwt.exceptions import InvalidToken
 
-# Create your tests here.
+from businesses.models import Business
+from .authentication import ClaimsJWTAuthentication
+from .claims import (
+    BUSINESS_OWNERS_GROUP, VERSION_CLAIM, ClaimsRefreshToken, bump_claims_version, get_claims_version, resolve_role,
+)
+
+
+def create_business(owner, name='Barber'):
+    return Business.objects.create(
+        owner=owner, name=name, description='', main_image='business/main/test.jpg',
+        address='123 Test St', phone='123-456-7890', email='barber@example.com',
+    )
+
+
+class ClaimsVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner')
+        self.owners = Group.objects.create(name=BUSINESS_OWNERS_GROUP)
+
+    def authenticate(self, token):
+        backend = ClaimsJWTAuthentication()
+        return backend.get_user(backend.get_validated_token(str(token).encode()))
+
+    def test_token_with_an_old_version_is_rejected(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.assertEqual(self.authenticate(token).id, str(self.user.pk))
+
+        bump_claims_version(self.user.pk)
+        with self.assertRaises(InvalidToken):
+            self.authenticate(token)
+        response = self.client.get('/businesses/bookings/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_without_a_version_is_valid_until_the_claims_change(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        del token[VERSION_CLAIM]
+        self.assertEqual(self.authenticate(token).id, str(self.user.pk))
+
+        bump_claims_version(self.user.pk)
+        with self.assertRaises(InvalidToken):
+            self.authenticate(token)
+
+    def test_refresh_restamps_the_access_token(self):
+        refresh = ClaimsRefreshToken.for_user(self.user)
+        self.assertEqual(refresh.access_token['role'], 'customer')
+
+        self.user.groups.add(self.owners)
+        business = create_business(self.user)
+        response = self.client.post('/auth/login/refresh/', {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 200, response.content)
+        access = self.authenticate(response.json()['access'])
+        self.assertEqual((access.role, access.business_id), ('business_owner', business.pk))
+        self.assertEqual(access.token[VERSION_CLAIM], get_claims_version(self.user.pk))
+        # A current token answers the role without a query
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_role(self.user, access.token), 'business_owner')
+
+    def test_group_and_owner_changes_bump_the_version(self):
+        versions = [get_claims_version(self.user.pk)]
+        self.user.groups.add(self.owners)
+        versions.append(get_claims_version(self.user.pk))
+        self.owners.user_set.clear()
+        versions.append(get_claims_version(self.user.pk))
+        self.assertEqual(versions, [0, 1, 2])
+
+        business = create_business(self.user)
+        self.assertEqual(get_claims_version(self.user.pk), 3)
+        new_owner = User.objects.create_user('buyer')
+        business.owner = new_owner
+        business.save()
+        self.assertEqual((get_claims_version(self.user.pk), get_claims_version(new_owner.pk)), (4, 1))
+        # Saving without an owner change leaves tokens alone
+        business.save()
+        self.assertEqual(get_claims_version(new_owner.pk), 1)
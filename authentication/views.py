@@ -1,8 +1,10 @@
 from django.shortcuts import render
 from rest_framework import generics, permissions, status
 from django.contrib.auth.models import User
-from .serializers import RegisterSerializer, MyTokenObtainPairSerializer, UserSerializer, CustomerListSerializer
-from rest_framework_simplejwt.views import TokenObtainPairView
+from .serializers import RegisterSerializer, MyTokenObtainPairSerializer, MyTokenRefreshSerializer, UserSerializer, CustomerListSerializer
+from .claims import BUSINESS_OWNERS_GROUP, resolve_role
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from api.throttling import LoginThrottle
 from rest_framework.response import Response
 from django.db import transaction
 from rest_framework.decorators import api_view, permission_classes
@@ -34,6 +36,10 @@ class RegisterView(generics.CreateAPIView):
 
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
+    throttle_classes = [LoginThrottle]
+
+class MyTokenRefreshView(TokenRefreshView):
+    serializer_class = MyTokenRefreshSerializer
 
 class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
@@ -50,7 +56,7 @@ def get_user_role(request):
     Test endpoint to show user role information
     """
     user = request.user
-    role = "business_owner" if user.groups.filter(name='Business Owners').exists() else "user"
+    role = "business_owner" if resolve_role(user, request.auth) == 'business_owner' else "user"
     
     return Response({
         "username": user.username,
@@ -66,4 +72,4 @@ class CustomerListView(generics.ListAPIView):
 
     def get_queryset(self):
         # Get all users who are not in the Business Owners group
-        return User.objects.exclude(groups__name='Business Owners').order_by('first_name', 'last_name')
+        return User.objects.exclude(groups__name=BUSINESS_OWNERS_GROUP).order_by('first_name', 'last_name')
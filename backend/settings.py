@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -61,6 +62,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'businesses.middleware.OwnerBusinessMiddleware',
+    'businesses.middleware.ReplicaStickyMiddleware',
+    'businesses.middleware.ShardContextMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -94,6 +98,35 @@ DATABASES = {
     }
 }
 
+# Read replica for views decorated with businesses.replicas.replica_reads.
+# Locally, point REPLICA_DATABASE_PATH at a second SQLite file and refresh
+# it with `manage.py sync_replica`. Without it every query uses default.
+REPLICA_DATABASE_ALIAS = 'replica'
+REPLICA_DATABASE_PATH = os.environ.get('REPLICA_DATABASE_PATH')
+if REPLICA_DATABASE_PATH:
+    DATABASES[REPLICA_DATABASE_ALIAS] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': REPLICA_DATABASE_PATH,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Shards for business-owned rows (businesses/sharding.py), the BusinessShard
+# table maps each business to one. BUSINESS_SHARD_PATHS adds SQLite shards
+# for local testing: "shard1=/tmp/shard1.sqlite3,shard2=/tmp/shard2.sqlite3".
+BUSINESS_SHARDS = ['default']
+for _shard in filter(None, os.environ.get('BUSINESS_SHARD_PATHS', '').split(',')):
+    _alias, _path = _shard.split('=', 1)
+    DATABASES[_alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': _path}
+    BUSINESS_SHARDS.append(_alias)
+DEFAULT_BUSINESS_SHARD = 'default'
+# Seconds a business's shard is cached
+BUSINESS_SHARD_CACHE_TIMEOUT = 300
+
+DATABASE_ROUTERS = ['businesses.sharding.ShardRouter', 'businesses.replicas.ReplicaRouter']
+
+# Seconds a client reads from the primary after its own write
+REPLICA_STICKY_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -151,6 +184,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastDRFJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # JWT settings
@@ -177,6 +214,94 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Seconds a user's JWT claims version is cached (authentication/claims.py).
+# Role changes are picked up by other processes within this window unless
+# CACHES points at a shared backend.
+CLAIMS_VERSION_CACHE_TIMEOUT = 60
+
+# Seconds the owner's Business is cached across requests (businesses/owner.py).
+# 0 disables it; only enable with a shared cache backend.
+OWNER_BUSINESS_CACHE_TIMEOUT = 0
+
+# Rows counted by admin changelists that use EstimatedCountPaginator
+# (businesses/paginators.py) before they stop counting.
+ADMIN_COUNT_LIMIT = 10000
+
+# Default pool for the run_slot_jobs worker (businesses/jobs.py).
+# 'thread' or 'process'; --workers 0 runs jobs inline.
+SLOT_JOB_WORKERS = 4
+SLOT_JOB_POOL = 'thread'
+
+# Seconds /api/my-business/dashboard is cached per business, 0 disables it.
+# Booking and slot changes invalidate it (businesses/cache.py).
+DASHBOARD_CACHE_TIMEOUT = 30
+
+# Mirror TimeSlot changes into the DayAvailability bitsets
+# (businesses/bitmaps.py). Build the bitsets with sync_day_availability
+# before turning this on; days without a bitset are skipped.
+DAY_AVAILABILITY_BITMAPS = False
+
+# Seconds the per-day month availability (businesses/month_availability.py)
+# is cached per business, month and service duration, 0 disables it.
+# Booking, slot and time off changes invalidate it.
+MONTH_AVAILABILITY_CACHE_TIMEOUT = 300
+
+# Static per-business, per-day availability JSON written by
+# build_availability_snapshots (businesses/snapshots.py) for the web tier
+# to serve, covering this many days from today.
+AVAILABILITY_SNAPSHOT_DIR = BASE_DIR / 'snapshots'
+AVAILABILITY_SNAPSHOT_DAYS = 30
+
+# Booking event outbox (businesses/outbox.py) drained by drain_outbox.
+# A failed delivery is retried after OUTBOX_RETRY_SECONDS, doubling each
+# attempt, and given up after OUTBOX_MAX_ATTEMPTS. Delivered events are
+# kept OUTBOX_KEEP_DAYS days.
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_SECONDS = 30
+OUTBOX_LEASE_SECONDS = 300
+OUTBOX_KEEP_DAYS = 7
+
+# Outgoing mail. Locally, run an SMTP stand-in on localhost:1025.
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 1025))
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
+
+# Booking emails (businesses/notifications.py) sent by send_notifications.
+# A recipient's notifications wait NOTIFICATION_COALESCE_SECONDS so a burst
+# of changes goes out as one digest; failed sends are retried with backoff.
+NOTIFICATION_COALESCE_SECONDS = 60
+NOTIFICATION_BATCH_SIZE = 100
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETRY_SECONDS = 60
+
+# Idempotency-Key replays (businesses/idempotency.py): responses are kept
+# IDEMPOTENCY_KEY_TTL seconds, a retry waits up to IDEMPOTENCY_WAIT_SECONDS
+# for the first request, and an unfinished first request older than
+# IDEMPOTENCY_LOCK_SECONDS is presumed dead.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_WAIT_SECONDS = 10
+IDEMPOTENCY_LOCK_SECONDS = 60
+
+# Token buckets of the throttled endpoints (api/throttling.py), per user,
+# client address and endpoint, as '<tokens>/<period>': at most <tokens>
+# requests in any <period>. THROTTLE_CACHE must be shared between processes
+# and have an atomic incr() in production.
+THROTTLE_CACHE = 'default'
+# Reverse proxies in front of the app that append to X-Forwarded-For. With
+# 0 the client address is REMOTE_ADDR and the header is ignored, so clients
+# cannot pick their own per-address bucket.
+NUM_PROXIES = int(os.environ.get('NUM_PROXIES', 0))
+REST_FRAMEWORK['NUM_PROXIES'] = NUM_PROXIES
+NINJA_NUM_PROXIES = NUM_PROXIES
+TOKEN_BUCKET_RATES = {
+    'availability.user': '120/min',
+    'availability.ip': '240/min',
+    'availability.endpoint': '6000/min',
+    'login.ip': '10/min',
+    'login.endpoint': '600/min',
+}
+
 # Add Jazzmin settings
 JAZZMIN_SETTINGS = {
     # title of the window
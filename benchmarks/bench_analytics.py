@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Benchmark: occupancy analytics over a year of slots for a 20-person salon.
+
+Generates (employee, date, start_time, is_available) rows in memory, the
+shape load_occupancy() fetches, and times building the NumPy matrices plus
+every report against a row-by-row Python version of utilisation and the
+hour-of-week heatmap.
+
+Usage: python benchmarks/bench_analytics.py [--employees 20] [--days 365] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from collections import Counter
+from datetime import date, time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django
+django.setup()
+
+from businesses.analytics import Occupancy
+
+
+def make_rows(employees, days, occupancy=0.6, seed=1):
+    rng = random.Random(seed)
+    date_from = date(2025, 1, 1)
+    rows = []
+    for employee_id in range(1, employees + 1):
+        for offset in range(days):
+            day = date_from + timedelta(days=offset)
+            if day.weekday() == 4:  # closed on Fridays
+                continue
+            for slot in range(16):  # 09:00 - 17:00
+                start = time(9 + slot // 2, 30 * (slot % 2))
+                rows.append((employee_id, day, start, rng.random() >= occupancy))
+    return date_from, date_from + timedelta(days=days - 1), rows
+
+
+def vectorised(rows, date_from, date_to):
+    occupancy = Occupancy.from_rows(rows, date_from, date_to)
+    return (
+        occupancy.utilisation(),
+        occupancy.monthly_utilisation(),
+        occupancy.heatmap(),
+        occupancy.peak_hours(),
+        occupancy.idle_gaps(),
+    )
+
+
+def row_by_row(rows):
+    capacity = Counter()
+    booked = Counter()
+    week_capacity = Counter()
+    week_booked = Counter()
+    for employee_id, day, start, available in rows:
+        capacity[employee_id] += 1
+        week_capacity[day.weekday(), start.hour] += 1
+        if not available:
+            booked[employee_id] += 1
+            week_booked[day.weekday(), start.hour] += 1
+    return (
+        {employee_id: booked[employee_id] / capacity[employee_id] for employee_id in capacity},
+        {cell: week_booked[cell] / week_capacity[cell] for cell in week_capacity},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, default=20)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    date_from, date_to, rows = make_rows(args.employees, args.days)
+    print(f"{len(rows):,} slots, {args.employees} employees, {args.days} days")
+
+    for name, func in (
+        ('row by row (utilisation + heatmap only)', lambda: row_by_row(rows)),
+        ('numpy (all reports)', lambda: vectorised(rows, date_from, date_to)),
+    ):
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f"{name:42s} {best * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+Benchmark: TimeSlot rows against DayAvailability bitsets.
+
+A business with --employees staff working 09:00-17:00 six days a week gets
+--days of slots at --granularity minutes in a throwaway test database, and
+bitmaps.build() turns them into bitsets. Reported for both storages:
+
+- rows and approximate table + index size (SQLite pages used)
+- fitting a 45-minute service on one employee day (query + scan)
+- taking that time for a booking: marking slots unavailable with a
+  conditional UPDATE vs one compare-and-swap of the bitset
+- a month of one employee's days, fitted day by day
+
+Usage: python benchmarks/bench_day_availability.py [--employees 10] [--days 90] [--granularity 15] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import date, time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from businesses import bitmaps
+from businesses.models import Business, DayAvailability, Employee, Shift, TimeSlot
+
+SERVICE_MINUTES = 45
+
+
+def used_bytes():
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA page_count')
+        pages = cursor.fetchone()[0]
+        cursor.execute('PRAGMA freelist_count')
+        pages -= cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        return pages * cursor.fetchone()[0]
+
+
+def setup(employees, days, granularity, start):
+    owner = User.objects.create_user('bench')
+    business = Business.objects.create(
+        owner=owner, name='Bench', description='', main_image='bench.jpg',
+        address='', phone='', email='bench@example.com', slot_granularity=granularity,
+    )
+    staff = [Employee.objects.create(business=business, name=f'Employee {i}') for i in range(employees)]
+    # bulk_create skips Shift.save(), which generates this week's slots
+    shifts = Shift.objects.bulk_create(
+        Shift(business=business, employee=employee, day_of_week=day,
+              start_time=time(9, 0), end_time=time(17, 0))
+        for employee in staff
+        for day in range(6)
+    )
+    slots = [
+        slot
+        for offset in range(days)
+        for shift in shifts
+        if shift.day_of_week == (start + timedelta(days=offset)).weekday()
+        for slot in shift.build_time_slots(start + timedelta(days=offset))
+    ]
+    before = used_bytes()
+    TimeSlot.objects.bulk_create(slots, batch_size=1000)
+    slot_bytes = used_bytes() - before
+    bitmaps.build(business.pk, start, start + timedelta(days=days))
+    bitmap_bytes = used_bytes() - before - slot_bytes
+    return business, staff, slot_bytes, bitmap_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, default=10)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--granularity', type=int, default=15, choices=(5, 10, 15, 30))
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        start = date(2025, 3, 3)  # a Monday
+        business, staff, slot_bytes, bitmap_bytes = setup(args.employees, args.days, args.granularity, start)
+        employee_id = staff[0].pk
+        day = start + timedelta(days=7)
+        step = args.granularity
+        required = business.slots_needed(SERVICE_MINUTES)
+
+        print(f"{args.employees} employees, {args.days} days, {step}-minute slots, 09:00-17:00 Mon-Sat\n")
+        print(f"{'':28} {'TimeSlot':>12} {'bitmap':>12}")
+        print(f"{'rows':28} {TimeSlot.objects.count():>12,} {DayAvailability.objects.count():>12,}")
+        print(f"{'size':28} {slot_bytes / 1024:>10.0f}KB {bitmap_bytes / 1024:>10.0f}KB")
+
+        def slot_fit():
+            rows = TimeSlot.objects.filter(
+                shift__employee_id=employee_id, date=day, is_available=True,
+            ).order_by('start_time').values_list('start_time', 'end_time')
+            return bitmaps.slot_fit_starts(rows, required)
+
+        def bitmap_fit():
+            return bitmaps.fit_starts(bitmaps.get_free(employee_id, day), required * step, step)
+
+        assert slot_fit() == bitmap_fit()
+
+        def slot_book():
+            ids = list(TimeSlot.objects.filter(
+                shift__employee_id=employee_id, date=day, start_time__gte=time(10, 0), is_available=True,
+            ).order_by('start_time').values_list('pk', flat=True)[:required])
+            taken = TimeSlot.objects.filter(pk__in=ids, is_available=True).update(is_available=False)
+            TimeSlot.objects.filter(pk__in=ids).update(is_available=True)
+            return taken
+
+        def bitmap_book():
+            taken = bitmaps.reserve(employee_id, day, 600, required * step)
+            bitmaps.release(employee_id, day, 600, required * step)
+            return taken
+
+        month = (start, start + timedelta(days=30))
+
+        def slot_month():
+            days = {}
+            for date_, start_time, end_time in TimeSlot.objects.filter(
+                shift__employee_id=employee_id, date__range=month, is_available=True,
+            ).order_by('date', 'start_time').values_list('date', 'start_time', 'end_time'):
+                days.setdefault(date_, []).append((start_time, end_time))
+            return {date_: bitmaps.slot_fit_starts(rows, required) for date_, rows in days.items()}
+
+        def bitmap_month():
+            return {
+                date_: bitmaps.fit_starts(bitmaps.decode(free), required * step, step)
+                for date_, free in DayAvailability.objects.filter(
+                    employee_id=employee_id, date__range=month,
+                ).values_list('date', 'free')
+            }
+
+        assert slot_month() == bitmap_month()
+
+        for name, slot_func, bitmap_func in (
+            (f'fit {SERVICE_MINUTES} min (one day)', slot_fit, bitmap_fit),
+            ('book + release (one day)', slot_book, bitmap_book),
+            (f'fit {SERVICE_MINUTES} min (one month)', slot_month, bitmap_month),
+        ):
+            slot_time, bitmap_time = (
+                min(timeit.repeat(func, number=1, repeat=args.repeat)) * 1000
+                for func in (slot_func, bitmap_func)
+            )
+            print(f"{name:28} {slot_time:>9.2f} ms {bitmap_time:>9.2f} ms")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Microbenchmark: cost of serializing 1,000 time slots and 1,000 bookings.
+
+Compares the old paths (schema re-validation + stdlib encoder for Ninja,
+JsonResponse for the DRF views) with the fast renderer and pre-validated
+responses.
+
+Usage: python benchmarks/bench_serialization.py [--rows 1000] [--repeat 50]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django
+django.setup()
+
+from django.core.serializers.json import DjangoJSONEncoder
+from ninja.responses import NinjaJSONEncoder
+from pydantic import TypeAdapter
+
+from api.renderers import JSON_BACKEND, json_dumps
+from api.views import TimeSlotSchema
+
+
+def make_slots(rows):
+    start = datetime(2025, 3, 10, 9, 0)
+    return [
+        {
+            "id": i,
+            "date": date(2025, 3, 10) + timedelta(days=i // 16),
+            "start_time": (start + timedelta(minutes=30 * (i % 16))).strftime("%H:%M"),
+            "end_time": (start + timedelta(minutes=30 * (i % 16 + 1))).strftime("%H:%M"),
+            "is_available": i % 3 != 0,
+            "shift_id": i // 16,
+            "employee_id": i % 7,
+            "business_id": 1,
+        }
+        for i in range(rows)
+    ]
+
+
+def make_bookings(rows):
+    created = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+    return [
+        {
+            'id': i,
+            'customer': {'id': i % 50, 'name': f'Customer {i % 50}', 'email': f'c{i % 50}@example.com'},
+            'services': [
+                {'id': 1, 'name': 'Haircut', 'duration': 30, 'price': Decimal('25.00')},
+                {'id': 2, 'name': 'Beard Trim', 'duration': 20, 'price': Decimal('15.00')},
+            ],
+            'date': '2025-03-10',
+            'start_time': time(10, 0).strftime('%H:%M'),
+            'end_time': time(11, 0).strftime('%H:%M'),
+            'employee': {'id': i % 7, 'name': f'Employee {i % 7}'},
+            'total_duration': 50,
+            'status': 'confirmed',
+            'created_at': created,
+            'notes': None,
+        }
+        for i in range(rows)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    slots = make_slots(args.rows)
+    bookings = make_bookings(args.rows)
+    slot_list = TypeAdapter(List[TimeSlotSchema])
+
+    def ninja_validated_stdlib():
+        validated = slot_list.validate_python(slots)
+        data = slot_list.dump_python(validated)
+        return json.dumps(data, cls=NinjaJSONEncoder)
+
+    def ninja_prevalidated_fast():
+        return json_dumps(slots)
+
+    def drf_stdlib():
+        return json.dumps({'bookings': bookings}, cls=DjangoJSONEncoder)
+
+    def drf_fast():
+        return json_dumps({'bookings': bookings})
+
+    cases = [
+        ('slots: validate + stdlib (old Ninja path)', ninja_validated_stdlib),
+        (f'slots: pre-validated + {JSON_BACKEND}', ninja_prevalidated_fast),
+        ('bookings: stdlib JsonResponse (old DRF path)', drf_stdlib),
+        (f'bookings: {JSON_BACKEND}', drf_fast),
+    ]
+
+    print(f"JSON backend: {JSON_BACKEND}, rows: {args.rows}, repeat: {args.repeat}")
+    for label, func in cases:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        per_thousand = best * 1000 / args.rows * 1000
+        print(f"{label:<48} {per_thousand:8.3f} ms / 1,000 rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Benchmark: singleflight coalescing of identical concurrent computations.
+
+A burst of threads asks for the same key at once, standing in for
+customers opening the same business and day; the computation sleeps for
+--compute-ms, standing in for the availability queries. Reported with and
+without coalescing:
+
+- executions of the computation and the coalescing ratio
+- wall time of the burst
+
+plus the overhead of Group.do() for a call that has nobody to share with.
+
+Usage: python benchmarks/bench_singleflight.py [--threads 32] [--bursts 20] [--compute-ms 20]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from businesses.singleflight import Group
+
+
+def burst(threads, call):
+    start = threading.Barrier(threads)
+
+    def worker():
+        start.wait()
+        call()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    began = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - began
+
+
+def run(label, threads, bursts, compute_ms, coalesce):
+    flights = Group('bench')
+    executions = 0
+    lock = threading.Lock()
+
+    def compute():
+        nonlocal executions
+        with lock:
+            executions += 1
+        time.sleep(compute_ms / 1000)
+        return []
+
+    call = (lambda: flights.do(('business', 1, 'day'), compute)) if coalesce else compute
+    wall = sum(burst(threads, call) for _ in range(bursts))
+    calls = threads * bursts
+    print(label)
+    print(f"  {'calls':28} {calls:>8}")
+    print(f"  {'executions':28} {executions:>8}")
+    print(f"  {'coalescing ratio':28} {(calls - executions) / calls:>8.2f}")
+    print(f"  {'wall time per burst':28} {wall / bursts * 1000:>8.1f} ms\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--bursts', type=int, default=20)
+    parser.add_argument('--compute-ms', type=float, default=20)
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    run('no coalescing', args.threads, args.bursts, args.compute_ms, coalesce=False)
+    run('singleflight', args.threads, args.bursts, args.compute_ms, coalesce=True)
+
+    flights = Group('overhead')
+    direct = min(timeit.repeat(lambda: None, number=args.number, repeat=5)) / args.number * 1e6
+    shared = min(timeit.repeat(lambda: flights.do('key', lambda: None), number=args.number, repeat=5)) / args.number * 1e6
+    print('uncontended do()')
+    print(f"  {'added per call':28} {shared - direct:>8.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Benchmark: storage and query cost of 5/10/15/30-minute slot grids.
+
+For each granularity a business with --employees staff working 09:00-17:00
+six days a week gets --days of slots generated into a throwaway test
+database. Reported per granularity:
+
+- rows and approximate table + index size (SQLite pages used)
+- time of the hot queries: one day of a business's available slots (the
+  public available-slots endpoint) and a month of one employee's slots
+- time of the consecutive-run scan get_available_slots does for a service
+- minutes held but not used by a mix of 15/20/45/60-minute services
+
+Usage: python benchmarks/bench_slot_granularity.py [--employees 10] [--days 90] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import date, time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from businesses.models import Business, Employee, Shift, TimeSlot
+
+GRANULARITIES = (30, 15, 10, 5)
+SERVICE_MINUTES = (15, 20, 45, 60)
+
+
+def used_bytes():
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA page_count')
+        pages = cursor.fetchone()[0]
+        cursor.execute('PRAGMA freelist_count')
+        pages -= cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        return pages * cursor.fetchone()[0]
+
+
+def make_business(granularity, employees):
+    owner = User.objects.create_user(f'bench-{granularity}')
+    business = Business.objects.create(
+        owner=owner, name=f'Bench {granularity}', description='', main_image='bench.jpg',
+        address='', phone='', email='bench@example.com', slot_granularity=granularity,
+    )
+    staff = [Employee.objects.create(business=business, name=f'Employee {i}') for i in range(employees)]
+    # bulk_create skips Shift.save(), which generates this week's slots
+    shifts = Shift.objects.bulk_create(
+        Shift(business=business, employee=employee, day_of_week=day,
+              start_time=time(9, 0), end_time=time(17, 0))
+        for employee in staff
+        for day in range(6)
+    )
+    return business, staff, shifts
+
+
+def generate(shifts, start, days):
+    slots = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        for shift in shifts:
+            if shift.day_of_week == day.weekday():
+                slots.extend(shift.build_time_slots(day))
+    TimeSlot.objects.bulk_create(slots, batch_size=1000)
+    return len(slots)
+
+
+def fits(slots, required):
+    """Start times of every run of `required` consecutive slots"""
+    starts = []
+    run = 0
+    previous_end = None
+    for start_time, end_time in slots:
+        run = run + 1 if start_time == previous_end else 1
+        if run >= required:
+            starts.append(start_time)
+        previous_end = end_time
+    return starts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, default=10)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        start = date(2025, 3, 3)  # a Monday
+        print(f"{args.employees} employees, {args.days} days, 09:00-17:00 Mon-Sat\n")
+        print(f"{'grid':>5} {'rows':>9} {'size':>9} {'day (business)':>15} "
+              f"{'month (employee)':>17} {'fit scan':>9} {'idle min':>9}")
+        for granularity in GRANULARITIES:
+            business, staff, shifts = make_business(granularity, args.employees)
+            before = used_bytes()
+            rows = generate(shifts, start, args.days)
+            size = used_bytes() - before
+
+            day = start + timedelta(days=7)
+            day_query = lambda: list(TimeSlot.objects.filter(
+                shift__business=business, date=day, is_available=True,
+            ).order_by('date', 'start_time').values_list(
+                'id', 'date', 'start_time', 'end_time', 'is_available', 'shift_id', 'shift__employee_id'
+            ))
+            month_query = lambda: list(TimeSlot.objects.filter(
+                shift__employee=staff[0], date__range=(start, start + timedelta(days=30)),
+            ).values_list('date', 'start_time', 'is_available'))
+            employee_day = list(TimeSlot.objects.filter(
+                shift__employee=staff[0], date=day, is_available=True,
+            ).order_by('start_time').values_list('start_time', 'end_time'))
+            fit_scan = lambda: fits(employee_day, business.slots_needed(45))
+
+            timings = [
+                min(timeit.repeat(func, number=1, repeat=args.repeat)) * 1000
+                for func in (day_query, month_query, fit_scan)
+            ]
+            idle = sum(business.slots_needed(m) * granularity - m for m in SERVICE_MINUTES)
+            print(f"{granularity:>4}m {rows:>9,} {size / 1024 / 1024:>7.1f}MB "
+                  f"{timings[0]:>12.2f} ms {timings[1]:>14.2f} ms {timings[2]:>6.3f} ms {idle:>9}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
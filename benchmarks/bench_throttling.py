@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Benchmark: cost of the token-bucket throttle per request.
+
+Reported per cache backend (in-process locmem, and the file-based cache as
+a stand-in for a cache outside the process):
+
+- take() with the user, ip and endpoint buckets of a scope, allowed and
+  denied
+- a trivial DRF view with and without AvailabilityThrottle, so the
+  difference is what throttling adds to a request
+
+The budget is under 1 ms per request.
+
+Usage: python benchmarks/bench_throttling.py [--number 2000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django
+django.setup()
+
+from django.core.cache import caches
+from django.test.utils import override_settings
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from api import throttling
+
+BUDGET_US = 1000
+ALLOW_ALL = {
+    'bench.user': '1000000000/s',
+    'bench.ip': '1000000000/s',
+    'bench.endpoint': '1000000000/s',
+    'availability.user': '1000000000/s',
+    'availability.ip': '1000000000/s',
+    'availability.endpoint': '1000000000/s',
+}
+DENY_ALL = {'bench.user': '1/day', 'bench.ip': '1/day', 'bench.endpoint': '1/day'}
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([])
+def plain_view(request):
+    return Response({'ok': True})
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([])
+@throttle_classes([throttling.AvailabilityThrottle])
+def throttled_view(request):
+    return Response({'ok': True})
+
+
+def per_call_us(func, number, repeat):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def run(label, number, repeat):
+    factory = APIRequestFactory()
+    results = []
+
+    with override_settings(TOKEN_BUCKET_RATES=ALLOW_ALL):
+        results.append(('take(), allowed', per_call_us(lambda: throttling.take('bench', 1, '10.0.0.1'), number, repeat)))
+    with override_settings(TOKEN_BUCKET_RATES=DENY_ALL):
+        throttling.take('bench', 1, '10.0.0.1')
+        results.append(('take(), denied', per_call_us(lambda: throttling.take('bench', 1, '10.0.0.1'), number, repeat)))
+
+    with override_settings(TOKEN_BUCKET_RATES=ALLOW_ALL):
+        plain = per_call_us(lambda: plain_view(factory.get('/')), number, repeat)
+        throttled = per_call_us(lambda: throttled_view(factory.get('/')), number, repeat)
+    results.append(('DRF view, no throttle', plain))
+    results.append(('DRF view, throttled', throttled))
+    results.append(('added by throttling', throttled - plain))
+
+    print(label)
+    for name, us in results:
+        print(f"  {name:28} {us:>8.1f} us")
+    added = throttled - plain
+    print(f"  {'within 1 ms budget':28} {'yes' if added < BUDGET_US else 'NO':>8}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        backends = {
+            'locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-throttle'},
+            'filebased': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory},
+        }
+        for name, config in backends.items():
+            with override_settings(CACHES={'default': config}, THROTTLE_CACHE='default'):
+                caches['default'].clear()
+                run(name, args.number, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,32 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
-from .models import Business, Service, Employee, Booking, BusinessRequest, Shift, TimeSlot
+from .models import Business, Service, Employee, Booking, BusinessRequest, Shift, ShiftException, TimeSlot, SlotGenerationJob, TimeOff, OutboxEvent, Notification
+from . import outbox
+from .jobs import enqueue_slot_generation, next_week_range, next_month_range
+from .paginators import EstimatedCountPaginator
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib import messages
+from django.db import router
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 import hashlib
 import base64
 import uuid
 
+def count_subquery(queryset, group_by, field='pk'):
+    """
+    Correlated COUNT for a queryset filtered on OuterRef('pk') and grouped by
+    that same column, so a changelist can annotate per-row counts in its
+    own query instead of joining every relation.
+    """
+    counts = queryset.order_by().values(group_by).annotate(
+        count=Count(field, distinct=True)
+    ).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
 # Register custom filters
 class BookingStatusFilter(admin.SimpleListFilter):
     title = 'Booking Status'
@@ -31,12 +48,14 @@ class BookingStatusFilter(admin.SimpleListFilter):
         tomorrow = today + timedelta(days=1)
         week_end = today + timedelta(days=7)
         
+        # Bookings are dated by their first time slot (start_date), the
+        # legacy date field is empty
         if self.value() == 'today':
-            return queryset.filter(date=today)
+            return queryset.filter(start_date=today)
         if self.value() == 'tomorrow':
-            return queryset.filter(date=tomorrow)
+            return queryset.filter(start_date=tomorrow)
         if self.value() == 'this_week':
-            return queryset.filter(date__gte=today, date__lte=week_end)
+            return queryset.filter(start_date__gte=today, start_date__lte=week_end)
         if self.value() == 'pending':
             return queryset.filter(status='pending')
         if self.value() == 'confirmed':
@@ -46,6 +65,44 @@ class BookingStatusFilter(admin.SimpleListFilter):
         if self.value() == 'completed':
             return queryset.filter(status='completed')
 
+class SlotBusinessFilter(admin.SimpleListFilter):
+    title = 'Business'
+    parameter_name = 'business'
+
+    def lookups(self, request, model_admin):
+        return Business.objects.order_by('name').values_list('id', 'name')
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(shift__business_id=self.value())
+
+class SlotDateRangeFilter(admin.SimpleListFilter):
+    title = 'Date'
+    parameter_name = 'date_range'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('today', 'Today'),
+            ('tomorrow', 'Tomorrow'),
+            ('next_7_days', 'Next 7 days'),
+            ('next_30_days', 'Next 30 days'),
+            ('past_7_days', 'Past 7 days'),
+        )
+
+    def queryset(self, request, queryset):
+        # Every choice is a bounded range on date so it can use
+        # timeslot_date_start_idx
+        today = timezone.now().date()
+        ranges = {
+            'today': (today, today),
+            'tomorrow': (today + timedelta(days=1), today + timedelta(days=1)),
+            'next_7_days': (today, today + timedelta(days=7)),
+            'next_30_days': (today, today + timedelta(days=30)),
+            'past_7_days': (today - timedelta(days=7), today),
+        }
+        if self.value() in ranges:
+            return queryset.filter(date__range=ranges[self.value()])
+
 class ServiceInline(admin.TabularInline):
     model = Service
     extra = 0
@@ -90,75 +147,57 @@ class TimeSlotInline(admin.TabularInline):
     readonly_fields = ('date', 'start_time', 'end_time')
     can_delete = False
     max_num = 0  # Don't allow adding time slots directly
+    
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        # Only show the upcoming two weeks, a long-running shift has
+        # slots going back months
+        today = timezone.now().date()
+        return qs.filter(date__gte=today, date__lte=today + timedelta(days=14))
+
+class ShiftExceptionInline(admin.TabularInline):
+    model = ShiftException
+    extra = 0
+    fields = ('date', 'is_cancelled', 'start_time', 'end_time', 'note')
+    
+    def get_queryset(self, request):
+        # Past exceptions no longer affect the schedule
+        return super().get_queryset(request).filter(date__gte=timezone.now().date())
 
 class ShiftAdmin(admin.ModelAdmin):
     list_display = ('employee', 'get_day_display', 'start_time', 'end_time', 'is_active')
     list_filter = ('is_active', 'day_of_week', 'business')
     search_fields = ('employee__name', 'business__name')
+    # Employee.__str__ includes the business name
+    list_select_related = ('employee__business',)
+    inlines = [ShiftExceptionInline, TimeSlotInline]
+    actions = ['generate_time_slots_for_next_week', 'generate_time_slots_for_next_month']
     
     def get_day_display(self, obj):
         return obj.get_day_of_week_display()
     get_day_display.short_description = 'Day'
     
+    def _enqueue_slot_generation(self, request, queryset, start_date, end_date, label):
+        shift_ids = list(queryset.filter(is_active=True).values_list('pk', flat=True))
+        if not shift_ids:
+            self.message_user(request, "None of the selected shifts are active.", messages.WARNING)
+            return
+        job = enqueue_slot_generation(shift_ids, start_date, end_date, requested_by=request.user, shard=router.db_for_write(Shift))
+        url = reverse('admin:businesses_slotgenerationjob_change', args=[job.pk])
+        self.message_user(
+            request,
+            format_html('Queued <a href="{}">slot generation job #{}</a> for {} shifts ({}).', url, job.pk, len(shift_ids), label),
+        )
+    
     def generate_time_slots_for_next_week(self, request, queryset):
-        from datetime import datetime, timedelta
-        
-        # Get the start of next week (Monday)
-        today = datetime.now().date()
-        days_until_monday = (7 - today.weekday()) % 7
-        if days_until_monday == 0:
-            days_until_monday = 7  # If today is Monday, get next Monday
-        next_monday = today + timedelta(days=days_until_monday)
-        
-        slots_created = 0
-        for shift in queryset:
-            if not shift.is_active:
-                continue
-                
-            if shift.shift_type == 'recurring':
-                # Generate slots for the appropriate day next week
-                target_date = next_monday + timedelta(days=shift.day_of_week)
-                slots = shift.generate_time_slots(date=target_date)
-                slots_created += len(slots)
-            elif shift.shift_type == 'one_time':
-                # Only generate slots if the specific date is within the next week
-                if next_monday <= shift.specific_date < next_monday + timedelta(days=7):
-                    slots = shift.generate_time_slots()
-                    slots_created += len(slots)
-        
-        self.message_user(request, f"Generated {slots_created} time slots for next week.")
+        start_date, end_date = next_week_range()
+        self._enqueue_slot_generation(request, queryset, start_date, end_date, 'next week')
     
     generate_time_slots_for_next_week.short_description = "Generate time slots for next week"
     
     def generate_time_slots_for_next_month(self, request, queryset):
-        from datetime import datetime, timedelta
-        
-        # Get the start of next month
-        today = datetime.now().date()
-        next_month = today.replace(day=1) + timedelta(days=32)
-        next_month_start = next_month.replace(day=1)
-        next_month_end = (next_month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        
-        slots_created = 0
-        for shift in queryset:
-            if not shift.is_active:
-                continue
-                
-            if shift.shift_type == 'recurring':
-                # Generate slots for all occurrences of this day of week in the next month
-                current_date = next_month_start
-                while current_date <= next_month_end:
-                    if current_date.weekday() == shift.day_of_week:
-                        slots = shift.generate_time_slots(date=current_date)
-                        slots_created += len(slots)
-                    current_date += timedelta(days=1)
-            elif shift.shift_type == 'one_time':
-                # Only generate slots if the specific date is within the next month
-                if next_month_start <= shift.specific_date <= next_month_end:
-                    slots = shift.generate_time_slots()
-                    slots_created += len(slots)
-        
-        self.message_user(request, f"Generated {slots_created} time slots for next month.")
+        start_date, end_date = next_month_range()
+        self._enqueue_slot_generation(request, queryset, start_date, end_date, 'next month')
     
     generate_time_slots_for_next_month.short_description = "Generate time slots for next month"
     
@@ -169,14 +208,32 @@ class ShiftAdmin(admin.ModelAdmin):
         }
 
 class TimeSlotAdmin(admin.ModelAdmin):
-    list_display = ('shift', 'date', 'start_time', 'end_time', 'is_available')
-    list_filter = ('is_available', 'date')
+    list_display = ('get_employee', 'get_business', 'date', 'start_time', 'end_time', 'is_available')
+    list_filter = ('is_available', SlotDateRangeFilter, SlotBusinessFilter)
+    list_select_related = ('shift__employee', 'shift__business')
     search_fields = ('shift__employee__name',)
+    # Avoid an exact COUNT(*) over the whole table on every page
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        # __str__ walks shift.employee, also used by the booking autocomplete
+        return super().get_queryset(request).select_related('shift__employee')
+    
+    def get_employee(self, obj):
+        return obj.shift.employee.name
+    get_employee.short_description = 'Employee'
+    get_employee.admin_order_field = 'shift__employee__name'
+    
+    def get_business(self, obj):
+        return obj.shift.business.name
+    get_business.short_description = 'Business'
 
 @admin.register(Business)
 class BusinessAdmin(admin.ModelAdmin):
     list_display = ('name', 'owner', 'phone', 'email', 'is_active', 'services_count', 'employees_count', 'today_bookings', 'account_setup_link')
     list_filter = ('is_active',)
+    list_select_related = ('owner',)
     search_fields = ('name', 'owner__username', 'phone', 'email')
     inlines = [ServiceInline, EmployeeInline]
     fieldsets = (
@@ -193,7 +250,7 @@ class BusinessAdmin(admin.ModelAdmin):
             'fields': ('address', 'latitude', 'longitude')
         }),
         ('Business Hours', {
-            'fields': ('opening_hours',)
+            'fields': ('opening_hours', 'slot_granularity')
         }),
         ('Images', {
             'fields': ('main_image', 'image1', 'image2', 'image3', 'image4'),
@@ -209,29 +266,37 @@ class BusinessAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
+        today = timezone.now().date()
+        qs = qs.annotate(
+            services_total=count_subquery(Service.objects.filter(business=OuterRef('pk')), 'business'),
+            employees_total=count_subquery(Employee.objects.filter(business=OuterRef('pk')), 'business'),
+            today_bookings_total=count_subquery(
+                Booking.objects.filter(business=OuterRef('pk'), start_date=today), 'business'
+            ),
+        )
         if not request.user.is_superuser:
             return qs.filter(owner=request.user)
         return qs
     
     def services_count(self, obj):
-        count = obj.services.count()
         url = reverse('admin:businesses_service_changelist') + f'?business__id__exact={obj.id}'
-        return format_html('<a href="{}">{} Services</a>', url, count)
+        return format_html('<a href="{}">{} Services</a>', url, obj.services_total)
     services_count.short_description = "Services"
+    services_count.admin_order_field = 'services_total'
     
     def employees_count(self, obj):
-        count = obj.employees.count()
         url = reverse('admin:businesses_employee_changelist') + f'?business__id__exact={obj.id}'
-        return format_html('<a href="{}">{} Staff</a>', url, count)
+        return format_html('<a href="{}">{} Staff</a>', url, obj.employees_total)
     employees_count.short_description = "Staff"
+    employees_count.admin_order_field = 'employees_total'
     
     def today_bookings(self, obj):
-        today = timezone.now().date()
-        count = obj.bookings.filter(date=today).count()
-        url = reverse('admin:businesses_booking_changelist') + f'?business__id__exact={obj.id}&date__exact={today}'
+        count = obj.today_bookings_total
+        url = reverse('admin:businesses_booking_changelist') + f'?business__id__exact={obj.id}&booking_status=today'
         color = "red" if count > 0 else "inherit"
         return format_html('<a href="{}" style="color: {};">{} Today</a>', url, color, count)
     today_bookings.short_description = "Today's Bookings"
+    today_bookings.admin_order_field = 'today_bookings_total'
     
     def account_setup_link(self, obj):
         """
@@ -307,23 +372,40 @@ class EmployeeAdmin(admin.ModelAdmin):
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ('customer', 'get_services', 'get_date', 'get_time', 'status')
-    list_filter = ('status', 'business')
+    list_filter = (BookingStatusFilter, 'status', 'business')
+    list_select_related = ('customer',)
     search_fields = ('customer__username',)
-    filter_horizontal = ('services', 'time_slots')
+    date_hierarchy = 'start_date'
+    filter_horizontal = ('services',)
+    # Time slots are searched on demand instead of loading every slot into the form
+    autocomplete_fields = ('customer', 'business', 'time_slots')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('services')
     
     def get_services(self, obj):
         return ", ".join([service.name for service in obj.services.all()])
     get_services.short_description = 'Services'
     
     def get_date(self, obj):
-        first_slot = obj.time_slots.order_by('date', 'start_time').first()
-        return first_slot.date if first_slot else obj.date
+        return obj.start_date or obj.date
     get_date.short_description = 'Date'
+    get_date.admin_order_field = 'start_date'
     
     def get_time(self, obj):
-        first_slot = obj.time_slots.order_by('date', 'start_time').first()
-        return first_slot.start_time if first_slot else obj.time
+        return obj.start_time or obj.time
     get_time.short_description = 'Time'
+    get_time.admin_order_field = 'start_time'
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # The admin saves the booking and its slots in one transaction
+        booking = form.instance
+        if not change:
+            outbox.booking_event(outbox.BOOKING_CREATED, booking)
+        elif 'status' in form.changed_data:
+            topic = outbox.BOOKING_CANCELLED if booking.status == 'cancelled' else outbox.BOOKING_STATUS_CHANGED
+            outbox.booking_event(topic, booking)
 
 @admin.register(BusinessRequest)
 class BusinessRequestAdmin(admin.ModelAdmin):
@@ -332,6 +414,67 @@ class BusinessRequestAdmin(admin.ModelAdmin):
     search_fields = ('business_name', 'email', 'phone')
     readonly_fields = ('created_at', 'updated_at')
 
+@admin.register(TimeOff)
+class TimeOffAdmin(admin.ModelAdmin):
+    list_display = ('business', 'employee', 'kind', 'start_date', 'end_date', 'start_time', 'end_time', 'reason')
+    list_filter = ('kind', 'business')
+    list_select_related = ('business', 'employee')
+    search_fields = ('business__name', 'employee__name', 'reason')
+    autocomplete_fields = ('business', 'employee')
+    date_hierarchy = 'start_date'
+
+@admin.register(SlotGenerationJob)
+class SlotGenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'get_progress', 'slots_created', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    list_select_related = ('requested_by',)
+    readonly_fields = ('shift_ids', 'start_date', 'end_date', 'status', 'get_progress', 'total_shifts',
+                       'processed_shifts', 'slots_created', 'error', 'requested_by', 'created_at',
+                       'started_at', 'finished_at')
+    
+    def has_add_permission(self, request):
+        # Jobs are queued from the Shift admin actions
+        return False
+    
+    def get_progress(self, obj):
+        return format_html(
+            '<progress value="{}" max="100"></progress> {}/{} shifts',
+            obj.progress, obj.processed_shifts, obj.total_shifts,
+        )
+    get_progress.short_description = 'Progress'
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'business', 'status', 'attempts', 'created_at', 'delivered_at')
+    list_filter = ('status', 'topic')
+    list_select_related = ('business',)
+    readonly_fields = ('business', 'topic', 'payload', 'status', 'attempts', 'available_at', 'locked_until',
+                       'last_error', 'created_at', 'delivered_at')
+    actions = ['retry_events']
+    
+    def has_add_permission(self, request):
+        # Events are written with the booking changes they describe
+        return False
+    
+    def retry_events(self, request, queryset):
+        updated = queryset.filter(status='failed').update(status='pending', attempts=0, available_at=timezone.now())
+        self.message_user(request, f"{updated} failed events queued for delivery again.")
+    
+    retry_events.short_description = "Retry failed events"
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'business', 'status', 'attempts', 'send_after', 'sent_at')
+    list_filter = ('status', 'kind')
+    list_select_related = ('business',)
+    search_fields = ('recipient',)
+    readonly_fields = ('recipient', 'business', 'event_id', 'kind', 'context', 'status', 'send_after', 'attempts',
+                       'last_error', 'created_at', 'sent_at')
+    
+    def has_add_permission(self, request):
+        # Queued from booking events
+        return False
+
 # Register the models
 admin.site.register(Shift, ShiftAdmin)
 admin.site.register(TimeSlot, TimeSlotAdmin)
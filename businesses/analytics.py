@@ -0,0 +1,202 @@
+"""
+Occupancy analytics for the owner dashboard.
+
+Slots are read in one query as (employee, date, start_time, is_available)
+columns and packed into boolean NumPy matrices shaped
+employee x day x slot-of-day. Every report (utilisation, hour-of-week
+heatmap, peak hours, idle gaps) is then a handful of array reductions
+rather than a loop over TimeSlot rows.
+
+NumPy is optional: without it ``np`` is None and the endpoint reports that
+analytics are unavailable.
+"""
+from datetime import timedelta
+
+from .models import Employee, TimeSlot
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+SLOT_MINUTES = 30
+DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+def _ratio(numerator, denominator):
+    """Elementwise numerator / denominator, 0 where denominator is 0"""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+class Occupancy:
+    """
+    capacity[e, d, s] is True where employee e has a slot starting at slot
+    s of day d, booked[e, d, s] where that slot is taken.
+    """
+
+    def __init__(self, employee_ids, date_from, capacity, booked, slot_minutes=SLOT_MINUTES):
+        self.employee_ids = list(employee_ids)
+        self.date_from = date_from
+        self.capacity = capacity
+        self.booked = booked
+        self.slot_minutes = slot_minutes
+
+    @classmethod
+    def from_rows(cls, rows, date_from, date_to, employee_ids=None, slot_minutes=SLOT_MINUTES):
+        """Build the matrices from (employee_id, date, start_time, is_available) rows"""
+        rows = list(rows)
+        if employee_ids is None:
+            employee_ids = sorted({row[0] for row in rows})
+        employee_index = {employee_id: i for i, employee_id in enumerate(employee_ids)}
+        days = (date_to - date_from).days + 1
+        slots_per_day = 24 * 60 // slot_minutes
+
+        capacity = np.zeros((len(employee_ids), days, slots_per_day), dtype=bool)
+        booked = np.zeros_like(capacity)
+        if rows:
+            employees, dates, times, available = zip(*rows)
+            e = np.fromiter((employee_index[employee_id] for employee_id in employees), dtype=np.intp, count=len(rows))
+            d = np.fromiter((day.toordinal() for day in dates), dtype=np.intp, count=len(rows)) - date_from.toordinal()
+            s = np.fromiter((t.hour * 60 + t.minute for t in times), dtype=np.intp, count=len(rows)) // slot_minutes
+            taken = ~np.fromiter(available, dtype=bool, count=len(rows))
+            capacity[e, d, s] = True
+            booked[e[taken], d[taken], s[taken]] = True
+        return cls(employee_ids, date_from, capacity, booked, slot_minutes)
+
+    @property
+    def days(self):
+        return self.capacity.shape[1]
+
+    def _weekdays(self):
+        return (np.arange(self.days) + self.date_from.weekday()) % 7
+
+    def utilisation(self):
+        """Booked share of each employee's slots over the whole range"""
+        booked = self.booked.sum(axis=(1, 2))
+        capacity = self.capacity.sum(axis=(1, 2))
+        rates = _ratio(booked, capacity)
+        return {
+            employee_id: {
+                'booked_minutes': int(booked[i]) * self.slot_minutes,
+                'available_minutes': int(capacity[i]) * self.slot_minutes,
+                'utilisation': round(float(rates[i]), 3),
+            }
+            for i, employee_id in enumerate(self.employee_ids)
+        }
+
+    def monthly_utilisation(self):
+        """Per employee utilisation for each calendar month in the range"""
+        dates = [self.date_from + timedelta(days=i) for i in range(self.days)]
+        starts = [0] + [i for i in range(1, self.days) if dates[i].day == 1]
+        # reduceat sums each [start, next start) block of days
+        booked = np.add.reduceat(self.booked.sum(axis=2), starts, axis=1)
+        capacity = np.add.reduceat(self.capacity.sum(axis=2), starts, axis=1)
+        rates = _ratio(booked, capacity)
+        months = [dates[start].strftime('%Y-%m') for start in starts]
+        return {
+            employee_id: {month: round(float(rates[i, m]), 3) for m, month in enumerate(months)}
+            for i, employee_id in enumerate(self.employee_ids)
+        }
+
+    def hour_of_week(self):
+        """7 x 24 arrays of booked and available slot counts over all employees"""
+        slots_per_hour = 60 // self.slot_minutes
+        hours = np.arange(self.capacity.shape[2]) // slots_per_hour
+        weekdays = self._weekdays()
+        booked = np.zeros((7, 24))
+        capacity = np.zeros((7, 24))
+        # Collapse employees, then scatter each (day, slot) cell onto its
+        # (weekday, hour) bucket
+        np.add.at(booked, (weekdays[:, None], hours[None, :]), self.booked.sum(axis=0))
+        np.add.at(capacity, (weekdays[:, None], hours[None, :]), self.capacity.sum(axis=0))
+        return booked, capacity
+
+    def heatmap(self):
+        booked, capacity = self.hour_of_week()
+        return np.round(_ratio(booked, capacity), 3)
+
+    def peak_hours(self, top=5):
+        booked, capacity = self.hour_of_week()
+        rates = _ratio(booked, capacity)
+        order = np.argsort(rates, axis=None, kind='stable')[::-1]
+        peaks = []
+        for flat in order:
+            weekday, hour = divmod(int(flat), 24)
+            if not capacity[weekday, hour] or len(peaks) == top:
+                break
+            peaks.append({
+                'day': DAY_NAMES[weekday],
+                'hour': hour,
+                'utilisation': round(float(rates[weekday, hour]), 3),
+                'booked_slots': int(booked[weekday, hour]),
+            })
+        return peaks
+
+    def idle_gaps(self):
+        """
+        Runs of free slots with a booking directly before and after them on
+        the same day, the fragmentation that can't be sold as a long service.
+        """
+        employees, days, slots = self.capacity.shape
+        free = (self.capacity & ~self.booked).reshape(employees * days, slots)
+        booked = self.booked.reshape(employees * days, slots)
+        # Pad every day with a column on each side so runs can't cross days
+        free = np.pad(free, ((0, 0), (1, 1)))
+        booked = np.pad(booked, ((0, 0), (1, 1)))
+
+        starts = free[:, 1:-1] & ~free[:, :-2]
+        ends = free[:, 1:-1] & ~free[:, 2:]
+        start_rows, start_cols = np.nonzero(starts)
+        _, end_cols = np.nonzero(ends)
+        # Padded column c + 1 is slot c, so the neighbours are c and c + 2
+        enclosed = booked[start_rows, start_cols] & booked[start_rows, end_cols + 2]
+        lengths = (end_cols - start_cols + 1)[enclosed]
+        owners = (start_rows // days)[enclosed]
+
+        count = np.bincount(owners, minlength=employees)
+        minutes = np.bincount(owners, weights=lengths, minlength=employees) * self.slot_minutes
+        return {
+            employee_id: {
+                'gaps': int(count[i]),
+                'idle_minutes': int(minutes[i]),
+                'average_gap_minutes': round(float(minutes[i] / count[i]), 1) if count[i] else 0,
+            }
+            for i, employee_id in enumerate(self.employee_ids)
+        }
+
+
+def load_occupancy(business, date_from, date_to, employee_ids):
+    """Occupancy of the given employees' slots between date_from and date_to (inclusive)"""
+    rows = TimeSlot.objects.filter(
+        shift__business=business,
+        date__range=(date_from, date_to),
+    ).values_list('shift__employee_id', 'date', 'start_time', 'is_available')
+    return Occupancy.from_rows(
+        rows, date_from, date_to, employee_ids=employee_ids, slot_minutes=business.slot_granularity
+    )
+
+
+def build_report(business, date_from, date_to):
+    names = dict(Employee.objects.filter(business=business).order_by('id').values_list('id', 'name'))
+    occupancy = load_occupancy(business, date_from, date_to, list(names))
+    utilisation = occupancy.utilisation()
+    monthly = occupancy.monthly_utilisation()
+    gaps = occupancy.idle_gaps()
+    heatmap = occupancy.heatmap()
+
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'slot_minutes': occupancy.slot_minutes,
+        'employees': [{
+            'id': employee_id,
+            'name': names.get(employee_id),
+            **utilisation[employee_id],
+            'monthly_utilisation': monthly[employee_id],
+            'idle_gaps': gaps[employee_id],
+        } for employee_id in occupancy.employee_ids],
+        'heatmap': {DAY_NAMES[day]: heatmap[day].tolist() for day in range(7)},
+        'peak_hours': occupancy.peak_hours(),
+    }
@@ -5,3 +5,6 @@ class BusinessesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'businesses'
     verbose_name = 'Businesses'  # This will be displayed in the admin panel
+
+    def ready(self):
+        from . import notifications, signals  # noqa: F401
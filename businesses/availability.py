@@ -0,0 +1,110 @@
+"""
+Blocked time (TimeOff) subtracted from availability as interval sets.
+
+Times are handled as minutes since midnight and every (employee, date)
+gets a sorted list of non-overlapping blocked intervals. Business-wide
+closures and holidays are stored once under employee None and merged into
+each employee's list when it is first asked for, so closing a business is
+one TimeOff row rather than an update to every slot.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Q
+
+from .models import TimeOff
+
+WHOLE_DAY = (0, 24 * 60)
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def merge(intervals):
+    """Sort intervals and merge the ones that overlap or touch"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract(intervals, blocked):
+    """The parts of merged intervals not covered by merged blocked intervals"""
+    result = []
+    i = 0
+    for start, end in intervals:
+        # Skip blocked intervals that end before this one starts
+        while i < len(blocked) and blocked[i][1] <= start:
+            i += 1
+        j = i
+        while j < len(blocked) and blocked[j][0] < end:
+            if blocked[j][0] > start:
+                result.append((start, blocked[j][0]))
+            start = max(start, blocked[j][1])
+            j += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def overlaps(start, end, blocked):
+    """Whether [start, end) intersects any of the merged blocked intervals"""
+    i = bisect_right(blocked, (start, 24 * 60 + 1)) - 1
+    if i >= 0 and blocked[i][1] > start:
+        return True
+    return i + 1 < len(blocked) and blocked[i + 1][0] < end
+
+
+class BlockedTime:
+    """
+    Blocked intervals for a business between date_from and date_to, loaded
+    with one query. employee_ids limits the employee time off that is read;
+    business-wide entries are always included.
+    """
+
+    def __init__(self, business_id, date_from, date_to, employee_ids=None):
+        self.date_from = date_from
+        self.date_to = date_to
+        entries = TimeOff.objects.filter(
+            business_id=business_id,
+            start_date__lte=date_to,
+            end_date__gte=date_from,
+        )
+        if employee_ids is not None:
+            entries = entries.filter(Q(employee__isnull=True) | Q(employee_id__in=employee_ids))
+
+        self._raw = defaultdict(list)
+        for employee_id, start_date, end_date, start_time, end_time in entries.values_list(
+            'employee_id', 'start_date', 'end_date', 'start_time', 'end_time'
+        ):
+            interval = (to_minutes(start_time), to_minutes(end_time)) if start_time else WHOLE_DAY
+            day = max(start_date, date_from)
+            last = min(end_date, date_to)
+            while day <= last:
+                self._raw[employee_id, day].append(interval)
+                day += timedelta(days=1)
+        self._merged = {}
+
+    def __bool__(self):
+        return bool(self._raw)
+
+    def intervals(self, employee_id, day):
+        """Merged blocked intervals for the employee on the day, business-wide ones included"""
+        key = (employee_id, day)
+        if key not in self._merged:
+            self._merged[key] = merge(self._raw.get((None, day), []) + self._raw.get(key, []))
+        return self._merged[key]
+
+    def is_blocked(self, employee_id, day, start_time, end_time):
+        blocked = self.intervals(employee_id, day)
+        return bool(blocked) and overlaps(to_minutes(start_time), to_minutes(end_time), blocked)
+
+    def free(self, employee_id, day, intervals):
+        """Subtract the blocked time from (start, end) minute intervals"""
+        return subtract(merge(intervals), self.intervals(employee_id, day))
@@ -0,0 +1,288 @@
+"""
+Day availability stored as bitsets.
+
+A DayAvailability row holds one bit per 5-minute step of an employee's day,
+set while that time is free. Fitting a service is a bit scan: ANDing the
+bitset with itself shifted leaves the steps where a long enough run starts.
+Reserving or releasing time is a compare-and-swap on the one row, so two
+bookings racing for the same minutes cannot both win.
+
+During the migration the TimeSlot rows stay the source of truth: build()
+copies them into bitsets, and with DAY_AVAILABILITY_BITMAPS on, every
+TimeSlot save or delete is mirrored into its day's bitset (see signals.py),
+slot regeneration rebuilds the day, and bookings take their time with
+reserve_slots() so a racing booking for the same minutes is turned away.
+compare() is the parity check between the two.
+"""
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import to_minutes
+from .models import DayAvailability, Shift, TimeSlot
+
+STEP_MINUTES = 5
+DAY_MINUTES = 24 * 60
+DAY_BITS = DAY_MINUTES // STEP_MINUTES
+DAY_BYTES = DAY_BITS // 8
+RETRIES = 5
+
+
+def encode(bits):
+    return bits.to_bytes(DAY_BYTES, 'little')
+
+
+def decode(value):
+    # Postgres returns memoryview, SQLite bytes
+    return int.from_bytes(bytes(value), 'little')
+
+
+def span(start_minute, end_minute):
+    """Bits covering [start_minute, end_minute), widened to whole steps"""
+    first = start_minute // STEP_MINUTES
+    last = -(-end_minute // STEP_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def slot_span(start_time, end_time):
+    start = to_minutes(start_time)
+    end = to_minutes(end_time)
+    # A slot ending at midnight
+    return span(start, end if end > start else DAY_MINUTES)
+
+
+@lru_cache(maxsize=None)
+def _aligned(step, origin=0):
+    """Bits of the steps a start time may fall on, every `step` minutes counted from `origin`"""
+    stride = max(step // STEP_MINUTES, 1)
+    return sum(1 << i for i in range(origin // STEP_MINUTES % stride, DAY_BITS, stride))
+
+
+def shift_starts(shifts, step):
+    """
+    Bits a start time may fall on within the shifts, given (start_time,
+    end_time) pairs: every `step` minutes from each shift's start, the way
+    its slots are generated.
+    """
+    starts = 0
+    for start_time, end_time in shifts:
+        starts |= _aligned(step, to_minutes(start_time)) & slot_span(start_time, end_time)
+    return starts
+
+
+def fit_starts(free, minutes, step=STEP_MINUTES, starts=None):
+    """
+    Minutes from midnight at which `minutes` of free time start, trying a
+    start every `step` minutes, or only on the `starts` bits when given.
+    """
+    width = -(-minutes // STEP_MINUTES)
+    if width <= 0:
+        return []
+    # After each round bit i is set when bits i .. i + covered - 1 are free
+    run = free
+    covered = 1
+    while covered < width:
+        shift = min(covered, width - covered)
+        run &= run >> shift
+        covered += shift
+    run &= _aligned(step) if starts is None else starts
+
+    starts = []
+    while run:
+        lowest = run & -run
+        starts.append((lowest.bit_length() - 1) * STEP_MINUTES)
+        run ^= lowest
+    return starts
+
+
+def get_free(employee_id, day):
+    """The employee's free bits for the day, None if the day has no row"""
+    value = DayAvailability.objects.filter(employee_id=employee_id, date=day).values_list('free', flat=True).first()
+    return None if value is None else decode(value)
+
+
+def _swap(employee_id, day, change):
+    """
+    Replace the day's bits with change(bits), retrying when another write
+    gets in between. change returns None to give up. Returns whether the
+    row ended up changed (or already matched), None when the day has no row.
+    """
+    for _ in range(RETRIES):
+        row = DayAvailability.objects.filter(employee_id=employee_id, date=day).values_list('pk', 'free').first()
+        if row is None:
+            return None
+        pk, value = row
+        value = bytes(value)
+        free = decode(value)
+        new = change(free)
+        if new is None:
+            return False
+        if new == free:
+            return True
+        # Only applies if the row still holds what was read
+        if DayAvailability.objects.filter(pk=pk, free=value).update(free=encode(new), updated_at=timezone.now()):
+            return True
+    return False
+
+
+def _take(employee_id, day, mask):
+    return _swap(employee_id, day, lambda free: free & ~mask if free & mask == mask else None)
+
+
+def _give(employee_id, day, mask):
+    return _swap(employee_id, day, lambda free: free | mask)
+
+
+def reserve(employee_id, day, start_minute, minutes):
+    """Take [start, start + minutes) if all of it is free; returns whether it did, None without a bitset"""
+    return _take(employee_id, day, span(start_minute, start_minute + minutes))
+
+
+def release(employee_id, day, start_minute, minutes):
+    """Give back [start, start + minutes), e.g. when a booking is cancelled"""
+    return _give(employee_id, day, span(start_minute, start_minute + minutes))
+
+
+def _slot_masks(slots):
+    masks = defaultdict(int)
+    for slot in slots:
+        masks[slot.date] |= slot_span(slot.start_time, slot.end_time)
+    return masks
+
+
+def reserve_slots(employee_id, slots):
+    """
+    Take the time of a booking's slots. False when any of it is already
+    taken, None when the day has no bitset yet (the TimeSlot rows decide).
+    """
+    taken = []
+    for day, mask in _slot_masks(slots).items():
+        result = _take(employee_id, day, mask)
+        if result is False:
+            # A booking spans one day in practice, undo any other just in case
+            for taken_day, taken_mask in taken:
+                _give(employee_id, taken_day, taken_mask)
+            return False
+        if result:
+            taken.append((day, mask))
+    return True if taken else None
+
+
+def release_slots(employee_id, slots):
+    """Give back the time of a cancelled booking's slots"""
+    for day, mask in _slot_masks(slots).items():
+        _give(employee_id, day, mask)
+
+
+def apply_slot(slot, deleted=False):
+    """Mirror a saved or deleted TimeSlot into its day's bitset, if the day has one"""
+    shift = slot._state.fields_cache.get('shift')
+    if shift is not None:
+        employee_id = shift.employee_id
+    else:
+        employee_id = Shift.objects.filter(pk=slot.shift_id).values_list('employee_id', flat=True).first()
+    if employee_id is None:
+        return False
+    mask = slot_span(slot.start_time, slot.end_time)
+    if slot.is_available and not deleted:
+        return _swap(employee_id, slot.date, lambda free: free | mask)
+    return _swap(employee_id, slot.date, lambda free: free & ~mask)
+
+
+def _slot_bits(business_id, date_from, date_to, employee_ids=None):
+    """{(employee_id, date): free bits} from the TimeSlot rows, days with only booked slots included"""
+    slots = TimeSlot.objects.filter(shift__business_id=business_id, date__range=(date_from, date_to))
+    if employee_ids is not None:
+        slots = slots.filter(shift__employee_id__in=employee_ids)
+    bits = defaultdict(int)
+    for employee_id, day, start_time, end_time, is_available in slots.values_list(
+        'shift__employee_id', 'date', 'start_time', 'end_time', 'is_available'
+    ).iterator(chunk_size=2000):
+        # Booked slots still create the day, with their bits clear
+        bits[employee_id, day] |= slot_span(start_time, end_time) if is_available else 0
+    return bits
+
+
+def rebuild_if_enabled(business_id, dates, employee_ids=None):
+    """
+    build() the days with DAY_AVAILABILITY_BITMAPS on, for writes that skip
+    the TimeSlot signals (bulk_create).
+    """
+    if settings.DAY_AVAILABILITY_BITMAPS and dates:
+        build(business_id, min(dates), max(dates), employee_ids)
+
+
+def build(business_id, date_from, date_to, employee_ids=None):
+    """Rewrite the business's bitsets between the dates from its TimeSlot rows, returns rows written"""
+    bits = _slot_bits(business_id, date_from, date_to, employee_ids)
+    rows = DayAvailability.objects.filter(business_id=business_id, date__range=(date_from, date_to))
+    if employee_ids is not None:
+        rows = rows.filter(employee_id__in=employee_ids)
+    with transaction.atomic():
+        rows.delete()
+        DayAvailability.objects.bulk_create(
+            (DayAvailability(business_id=business_id, employee_id=employee_id, date=day, free=encode(free))
+             for (employee_id, day), free in bits.items()),
+            batch_size=500,
+        )
+    return len(bits)
+
+
+def slot_fit_starts(slots, required):
+    """
+    The TimeSlot way: start minutes of every run of `required` consecutive
+    available slots, given (start_time, end_time) rows in start order.
+    """
+    starts = []
+    run = []
+    for start_time, end_time in slots:
+        if not run or run[-1][1] != start_time:
+            run = []
+        run.append((start_time, end_time))
+        if len(run) >= required:
+            starts.append(to_minutes(run[-required][0]))
+    return sorted(starts)
+
+
+def compare(business, date_from, date_to, durations):
+    """
+    Parity check between the TimeSlot rows and the bitsets: for every
+    employee day and service duration, the start times each one offers.
+    Returns the (employee_id, date, minutes, slot_starts, bitmap_starts)
+    that differ. Bitmap starts are counted from each shift's start, as
+    its slots are.
+    """
+    step = business.slot_granularity
+    shifts = defaultdict(list)
+    for employee_id, day_of_week, start_time, end_time in Shift.objects.filter(business=business).values_list(
+        'employee_id', 'day_of_week', 'start_time', 'end_time'
+    ):
+        shifts[employee_id, day_of_week].append((start_time, end_time))
+    slots = defaultdict(list)
+    for employee_id, day, start_time, end_time in TimeSlot.objects.filter(
+        shift__business=business, date__range=(date_from, date_to), is_available=True,
+    ).order_by('date', 'start_time').values_list('shift__employee_id', 'date', 'start_time', 'end_time'):
+        slots[employee_id, day].append((start_time, end_time))
+    bitsets = {
+        (employee_id, day): decode(free)
+        for employee_id, day, free in DayAvailability.objects.filter(
+            business=business, date__range=(date_from, date_to),
+        ).values_list('employee_id', 'date', 'free')
+    }
+
+    mismatches = []
+    for key in sorted(set(slots) | set(bitsets)):
+        employee_id, day = key
+        starts = shift_starts(shifts[employee_id, day.weekday()], step)
+        for minutes in durations:
+            required = business.slots_needed(minutes)
+            expected = slot_fit_starts(slots.get(key, []), required)
+            actual = fit_starts(bitsets.get(key, 0), required * step, step, starts)
+            if expected != actual:
+                mismatches.append((*key, minutes, expected, actual))
+    return mismatches
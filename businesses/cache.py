@@ -0,0 +1,65 @@
+"""
+Per-business cache keys that are invalidated by bumping a version.
+
+Every key built by business_cache_key() embeds the business's current
+version, so bump_business_version() retires all of them at once and the
+old entries simply expire. The version is bumped from businesses/signals.py
+whenever bookings, slots, services or employees change. Slots created with
+bulk_create don't send signals, so slot generation bumps it itself.
+
+Results computed on a read replica are cached separately and only for
+REPLICA_STICKY_SECONDS, since the replica may lag behind the bump.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .replicas import current_read_db
+
+
+def _version_key(business_id):
+    return f'business-version:{business_id}'
+
+
+def get_business_version(business_id):
+    version = cache.get(_version_key(business_id))
+    if version is None:
+        # Start from the clock rather than 1 so an evicted version can't
+        # come back as a value that old keys were built with
+        cache.add(_version_key(business_id), time.time_ns(), None)
+        version = cache.get(_version_key(business_id))
+    return version
+
+
+def bump_business_version(business_id):
+    try:
+        cache.incr(_version_key(business_id))
+    except ValueError:
+        # Not cached yet, the next get_business_version() starts a new one
+        pass
+
+
+def business_cache_key(business_id, name, *parts):
+    suffix = ':'.join(str(part) for part in parts)
+    key = f'business:{business_id}:v{get_business_version(business_id)}:{name}'
+    return f'{key}:{suffix}' if suffix else key
+
+
+def cached_for_business(business_id, name, *parts, timeout, compute):
+    """Return compute() through the cache, or compute it directly if timeout is 0"""
+    alias = current_read_db()
+    if alias is not None:
+        # A lagging replica can compute stale data under a version that was
+        # already bumped. Keep it apart from primary results, for no longer
+        # than a writer reads from the primary (not at all without that window)
+        timeout = min(timeout, settings.REPLICA_STICKY_SECONDS)
+        parts = (*parts, alias)
+    if not timeout:
+        return compute()
+    key = business_cache_key(business_id, name, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
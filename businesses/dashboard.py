@@ -0,0 +1,174 @@
+"""
+Owner dashboard data for /api/my-business/dashboard.
+
+Everything is computed with a fixed number of queries regardless of how
+many employees or bookings the business has: employees, per-employee slot
+totals, per-employee booking counts, the upcoming bookings with their
+services, and the next free slot per employee.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.expressions import Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .cache import cached_for_business
+from .models import Booking, Employee, TimeSlot
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+UPCOMING_DAYS = 7
+UPCOMING_LIMIT = 50
+
+
+def _utilisation(booked, total):
+    return round(booked / total, 3) if total else 0.0
+
+
+def _bookings(business, today, window_end):
+    first_slot = TimeSlot.objects.filter(bookings=OuterRef('pk')).order_by('date', 'start_time')
+    last_slot = TimeSlot.objects.filter(bookings=OuterRef('pk')).order_by('-date', '-start_time')
+    bookings = list(
+        Booking.objects.filter(
+            business=business,
+            start_date__range=(today, window_end),
+            status__in=ACTIVE_STATUSES,
+        )
+        .annotate(
+            slot_employee_id=Subquery(first_slot.values('shift__employee_id')[:1]),
+            end_time=Subquery(last_slot.values('end_time')[:1]),
+        )
+        .order_by('start_date', 'start_time')
+        .values(
+            'id', 'status', 'start_date', 'start_time', 'end_time', 'slot_employee_id',
+            'customer_id', 'customer__username', 'customer__first_name', 'customer__last_name',
+        )[:UPCOMING_LIMIT]
+    )
+
+    services = {}
+    for booking_id, name in Booking.services.through.objects.filter(
+        booking_id__in=[booking['id'] for booking in bookings]
+    ).values_list('booking_id', 'service__name'):
+        services.setdefault(booking_id, []).append(name)
+
+    return [{
+        'id': booking['id'],
+        'status': booking['status'],
+        'date': booking['start_date'],
+        'start_time': booking['start_time'].strftime('%H:%M'),
+        'end_time': booking['end_time'].strftime('%H:%M') if booking['end_time'] else None,
+        'employee_id': booking['slot_employee_id'],
+        'customer': {
+            'id': booking['customer_id'],
+            'name': f"{booking['customer__first_name']} {booking['customer__last_name']}".strip()
+                    or booking['customer__username'],
+        },
+        'services': services.get(booking['id'], []),
+    } for booking in bookings]
+
+
+def build_dashboard(business, now=None):
+    now = timezone.localtime(now)
+    today = now.date()
+    window_end = today + timedelta(days=UPCOMING_DAYS)
+
+    employees = list(
+        Employee.objects.filter(business=business).order_by('name').values('id', 'name', 'is_active')
+    )
+
+    slot_totals = {
+        row['shift__employee_id']: row
+        for row in TimeSlot.objects.filter(shift__business=business, date__range=(today, window_end))
+        .values('shift__employee_id')
+        .annotate(
+            total=Count('id'),
+            booked=Count('id', filter=Q(is_available=False)),
+            today_total=Count('id', filter=Q(date=today)),
+            today_booked=Count('id', filter=Q(date=today, is_available=False)),
+        )
+        .order_by()
+    }
+
+    booking_counts = {
+        row['timeslot__shift__employee_id']: row
+        for row in Booking.time_slots.through.objects.filter(
+            timeslot__shift__business=business,
+            timeslot__date__range=(today, window_end),
+            booking__status__in=ACTIVE_STATUSES,
+        )
+        .values('timeslot__shift__employee_id')
+        .annotate(
+            today=Count('booking_id', distinct=True, filter=Q(timeslot__date=today)),
+            upcoming=Count('booking_id', distinct=True),
+        )
+        .order_by()
+    }
+
+    # First free slot per employee from now on
+    next_free = {
+        row['employee_id']: {
+            'id': row['id'],
+            'employee_id': row['employee_id'],
+            'date': row['date'],
+            'start_time': row['start_time'].strftime('%H:%M'),
+        }
+        for row in TimeSlot.objects.filter(shift__business=business, is_available=True, date__lte=window_end)
+        .filter(Q(date__gt=today) | Q(date=today, start_time__gte=now.time()))
+        .annotate(
+            employee_id=F('shift__employee_id'),
+            position=Window(RowNumber(), partition_by=F('shift__employee_id'), order_by=[F('date'), F('start_time')]),
+        )
+        .filter(position=1)
+        .values('id', 'employee_id', 'date', 'start_time')
+    }
+
+    bookings = _bookings(business, today, window_end)
+
+    employee_rows = []
+    for employee in employees:
+        slots = slot_totals.get(employee['id'], {})
+        counts = booking_counts.get(employee['id'], {})
+        employee_rows.append({
+            'id': employee['id'],
+            'name': employee['name'],
+            'is_active': employee['is_active'],
+            'today_bookings': counts.get('today', 0),
+            'upcoming_bookings': counts.get('upcoming', 0),
+            'utilisation_today': _utilisation(slots.get('today_booked', 0), slots.get('today_total', 0)),
+            'utilisation_week': _utilisation(slots.get('booked', 0), slots.get('total', 0)),
+            'next_free_slot': next_free.get(employee['id']),
+        })
+
+    total_slots = sum(row['total'] for row in slot_totals.values())
+    booked_slots = sum(row['booked'] for row in slot_totals.values())
+    today_total = sum(row['today_total'] for row in slot_totals.values())
+    today_booked = sum(row['today_booked'] for row in slot_totals.values())
+
+    return {
+        'business_id': business.id,
+        'generated_at': now,
+        'date_from': today,
+        'date_to': window_end,
+        'summary': {
+            'today_bookings': sum(row['today'] for row in booking_counts.values()),
+            'upcoming_bookings': sum(row['upcoming'] for row in booking_counts.values()),
+            'utilisation_today': _utilisation(today_booked, today_total),
+            'utilisation_week': _utilisation(booked_slots, total_slots),
+        },
+        'today': [booking for booking in bookings if booking['date'] == today],
+        'upcoming': [booking for booking in bookings if booking['date'] > today],
+        'employees': employee_rows,
+        'next_free_slots': sorted(
+            next_free.values(), key=lambda slot: (slot['date'], slot['start_time'])
+        ),
+    }
+
+
+def get_dashboard(business):
+    """build_dashboard() through the per-business cache (DASHBOARD_CACHE_TIMEOUT)"""
+    return cached_for_business(
+        business.id, 'dashboard',
+        timeout=getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 0),
+        compute=lambda: build_dashboard(business),
+    )
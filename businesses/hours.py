@@ -0,0 +1,111 @@
+"""
+Opening hours compiled to weekly minutes.
+
+Business.opening_hours is edited as JSON keyed by weekday ("0" is Monday):
+
+    {"0": {"open": "09:00", "close": "18:00"}, "6": {"open": "00:00", "close": "00:00"}}
+
+A day may also hold a list of such ranges. compile_opening_hours() turns
+that into sorted, merged [start, end) intervals counted in minutes from
+Monday 00:00, so "open at T" is a range check. A day is closed when it is
+missing, null, marked "closed" or has equal open and close times; a close
+before the open runs past midnight, and "24:00" is the end of the day.
+"""
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+
+
+def parse_hhmm(value):
+    """Minutes since midnight for an "HH:MM" string"""
+    try:
+        hours, minutes = str(value).split(':')
+        hours, minutes = int(hours), int(minutes)
+    except (TypeError, ValueError):
+        raise ValidationError(f"Invalid time '{value}', expected HH:MM")
+    if not (0 <= minutes < 60 and (0 <= hours < 24 or (hours == 24 and minutes == 0))):
+        raise ValidationError(f"Invalid time '{value}', expected HH:MM")
+    return hours * 60 + minutes
+
+
+def week_minute(value):
+    """Minutes from Monday 00:00 for a datetime"""
+    return value.weekday() * DAY_MINUTES + value.hour * 60 + value.minute
+
+
+def _is_closed(value):
+    return value is None or str(value).strip().lower() in ('', 'closed')
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def compile_opening_hours(opening_hours):
+    """
+    Validate opening hours and return them as merged weekly minute
+    intervals. Raises ValidationError for malformed input.
+    """
+    if not opening_hours:
+        return []
+    if not isinstance(opening_hours, dict):
+        raise ValidationError('Opening hours must be an object keyed by weekday (0-6)')
+
+    intervals = []
+    for day, ranges in opening_hours.items():
+        try:
+            weekday = int(day)
+        except (TypeError, ValueError):
+            weekday = -1
+        if not 0 <= weekday <= 6:
+            raise ValidationError(f"Invalid weekday '{day}', expected 0 (Monday) to 6 (Sunday)")
+        if ranges is None:
+            continue
+        for hours in ranges if isinstance(ranges, list) else [ranges]:
+            if not isinstance(hours, dict) or 'open' not in hours or 'close' not in hours:
+                raise ValidationError(f"Day {day} needs 'open' and 'close' times")
+            if _is_closed(hours['open']) or _is_closed(hours['close']):
+                continue
+            opens = parse_hhmm(hours['open'])
+            closes = parse_hhmm(hours['close'])
+            if opens == closes:
+                continue
+            if closes < opens:
+                closes += DAY_MINUTES
+            start = weekday * DAY_MINUTES + opens
+            end = weekday * DAY_MINUTES + closes
+            if end > WEEK_MINUTES:
+                # Sunday night into Monday morning
+                intervals.append([0, end - WEEK_MINUTES])
+                end = WEEK_MINUTES
+            intervals.append([start, end])
+    return _merge(intervals)
+
+
+def is_open(intervals, minute):
+    return any(start <= minute < end for start, end in intervals)
+
+
+def open_business_ids(when):
+    """
+    Subquery of the ids of businesses open at the given datetime, in the
+    current time zone. Naive datetimes are taken to be in that zone.
+    """
+    # Imported here so migrations can use the parsing helpers
+    from .models import OpeningInterval
+
+    if timezone.is_aware(when):
+        when = timezone.localtime(when)
+    minute = week_minute(when)
+    return OpeningInterval.objects.filter(
+        start_minute__lte=minute,
+        end_minute__gt=minute,
+    ).values('business_id')
@@ -0,0 +1,156 @@
+"""
+Idempotency-Key support for endpoints that create things.
+
+A client sends a unique Idempotency-Key header with a request and the same
+key with its retries. The first request inserts an IdempotencyKey row for
+(user, key) before the view runs, and the unique constraint makes it the
+only one that runs the view. Its response is stored on the row and in the
+cache for IDEMPOTENCY_KEY_TTL seconds; retries get it back verbatim, with
+an Idempotent-Replayed header, without running the view again.
+
+A retry that arrives while the first request is still running waits for it,
+up to IDEMPOTENCY_WAIT_SECONDS, and then gets a 409. A request that raises
+or returns a server error stores nothing, so it can be retried. Reusing a
+key for a different request is rejected with 422.
+"""
+import hashlib
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from api.renderers import FastJsonResponse
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+POLL_INTERVAL = 0.05
+
+
+def _cache_key(user_id, key):
+    return f'idempotency:{user_id}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def request_hash(request):
+    """Fingerprint of the method, path and body the key was first used with"""
+    body = getattr(request, '_request', request).body
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _start(user_id, key, fingerprint):
+    """
+    Insert the in-flight row. Returns (True, None) when this request owns the
+    key, else (False, the existing row), whose row may have gone in between.
+    """
+    now = timezone.now()
+    IdempotencyKey.objects.filter(user_id=user_id, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                user_id=user_id, key=key, request_hash=fingerprint,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+            )
+        return True, None
+    except IntegrityError:
+        return False, IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+
+
+def _store(user_id, key, fingerprint, response):
+    body = response.content
+    IdempotencyKey.objects.filter(user_id=user_id, key=key).update(
+        status_code=response.status_code,
+        content_type=response.get('Content-Type', ''),
+        body=body,
+    )
+    cache.set(_cache_key(user_id, key), {
+        'request_hash': fingerprint,
+        'status_code': response.status_code,
+        'content_type': response.get('Content-Type', ''),
+        'body': body,
+    }, settings.IDEMPOTENCY_KEY_TTL)
+
+
+def _release(user_id, key):
+    IdempotencyKey.objects.filter(user_id=user_id, key=key, status_code__isnull=True).delete()
+
+
+def _key_reused():
+    return FastJsonResponse({'error': f'{HEADER} was already used for a different request'}, status=422)
+
+
+def _replay(status_code, content_type, body):
+    response = HttpResponse(bytes(body), status=status_code, content_type=content_type)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _run(view_func, request, args, kwargs, user_id, key, fingerprint):
+    try:
+        response = view_func(request, *args, **kwargs)
+    except BaseException:
+        _release(user_id, key)
+        raise
+    if response.status_code >= 500 or response.streaming or not getattr(response, 'is_rendered', True):
+        # Server errors can be retried; unrendered DRF responses have no content to store yet
+        _release(user_id, key)
+    else:
+        _store(user_id, key, fingerprint, response)
+    return response
+
+
+def idempotent(view_func):
+    """
+    Replay the stored response for requests repeating an Idempotency-Key.
+    Goes below @api_view on DRF views, so request.user is authenticated.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_func(request, *args, **kwargs)
+        if len(key) > 255:
+            return FastJsonResponse({'error': f'{HEADER} must be at most 255 characters'}, status=400)
+
+        user_id = request.user.pk
+        fingerprint = request_hash(request)
+        stored = cache.get(_cache_key(user_id, key))
+        if stored is not None:
+            if stored['request_hash'] != fingerprint:
+                return _key_reused()
+            return _replay(stored['status_code'], stored['content_type'], stored['body'])
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            started, record = _start(user_id, key, fingerprint)
+            if started:
+                return _run(view_func, request, args, kwargs, user_id, key, fingerprint)
+            if record is not None:
+                if record.request_hash != fingerprint:
+                    return _key_reused()
+                if record.status_code is not None:
+                    return _replay(record.status_code, record.content_type, record.body)
+                if timezone.now() - record.created_at > timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS):
+                    # The first request died without releasing the key
+                    IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+                    continue
+            if time.monotonic() >= deadline:
+                response = FastJsonResponse(
+                    {'error': f'A request with this {HEADER} is still in progress'}, status=409,
+                )
+                response['Retry-After'] = '1'
+                return response
+            time.sleep(POLL_INTERVAL)
+    return wrapper
+
+
+def prune_expired():
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,215 @@
+"""
+Background time slot generation.
+
+The Shift admin actions only queue a SlotGenerationJob; the run_slot_jobs
+management command claims pending jobs and generates the slots on a thread
+or process pool, recording progress on the job as chunks of shifts finish.
+Generation only adds missing slots, so slots that are already booked are
+left alone and a job can safely be run again.
+"""
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .bitmaps import rebuild_if_enabled
+from .cache import bump_business_version
+from .models import Shift, SlotGenerationJob, TimeSlot, minutes_between
+from .recurrence import weekly_dates
+from .sharding import for_shard
+from .snapshots import mark_dirty
+
+CHUNK_SIZE = 25
+
+
+def next_week_range(today=None):
+    """Monday to Sunday of next week"""
+    today = today or timezone.now().date()
+    days_until_monday = (7 - today.weekday()) % 7 or 7
+    start = today + timedelta(days=days_until_monday)
+    return start, start + timedelta(days=6)
+
+
+def next_month_range(today=None):
+    """First to last day of next month"""
+    today = today or timezone.now().date()
+    start = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def enqueue_slot_generation(shift_ids, start_date, end_date, requested_by=None, shard=DEFAULT_DB_ALIAS):
+    shift_ids = list(shift_ids)
+    return SlotGenerationJob.objects.create(
+        shift_ids=shift_ids,
+        shard=shard,
+        start_date=start_date,
+        end_date=end_date,
+        total_shifts=len(shift_ids),
+        requested_by=requested_by,
+    )
+
+
+def shift_dates(shift, start_date, end_date):
+    """Dates between start_date and end_date (inclusive) the shift works on"""
+    return weekly_dates(shift.day_of_week, start_date, end_date)
+
+
+def generate_missing_slots(shift, start_date, end_date):
+    """Insert the shift's missing slots in the date range, returns how many were created"""
+    dates = list(shift_dates(shift, start_date, end_date))
+    if not dates:
+        return 0
+    # Slots made before a granularity change don't line up with the new
+    # ones, so any candidate overlapping an existing slot is skipped
+    existing = defaultdict(list)
+    for date, start_time, end_time in TimeSlot.objects.filter(shift=shift, date__in=dates).values_list(
+            'date', 'start_time', 'end_time'):
+        existing[date].append(_interval(start_time, end_time))
+    slots = [
+        slot
+        for date in dates
+        for slot in shift.build_time_slots(date)
+        if not _overlaps(_interval(slot.start_time, slot.end_time), existing[date])
+    ]
+    created = _insert_new(slots)
+    if created:
+        bump_business_version(shift.business_id)
+        mark_dirty(shift.business_id, {slot.date for slot in slots})
+        rebuild_if_enabled(shift.business_id, {slot.date for slot in slots}, [shift.employee_id])
+    return created
+
+
+def _interval(start_time, end_time):
+    start = start_time.hour * 60 + start_time.minute
+    return start, start + minutes_between(start_time, end_time)
+
+
+def _overlaps(interval, intervals):
+    start, end = interval
+    return any(start < other_end and other_start < end for other_start, other_end in intervals)
+
+
+def _insert_new(slots, batch_size=500):
+    """
+    Insert the slots, skipping the ones a concurrent job created first, and
+    return how many were inserted. ignore_conflicts can't tell which rows it
+    skipped, so a batch that conflicts is retried a row at a time.
+    """
+    using = router.db_for_write(TimeSlot)
+    created = 0
+    for i in range(0, len(slots), batch_size):
+        batch = slots[i:i + batch_size]
+        try:
+            with transaction.atomic(using=using):
+                TimeSlot.objects.bulk_create(batch)
+            created += len(batch)
+            continue
+        except IntegrityError:
+            pass
+        for slot in batch:
+            try:
+                with transaction.atomic(using=using):
+                    TimeSlot.objects.bulk_create([slot])
+                created += 1
+            except IntegrityError:
+                pass
+    return created
+
+
+def generate_chunk(shift_ids, start_date, end_date, close_connection=True, shard=DEFAULT_DB_ALIAS):
+    """
+    Generate slots for a chunk of shifts on the shard. Runs on a pool
+    worker, so it returns plain values and closes the worker's connection
+    when done. Returns (shifts processed, slots created, errors).
+    """
+    created = 0
+    errors = []
+    try:
+        with for_shard(shard):
+            for shift in Shift.objects.filter(pk__in=shift_ids, is_active=True).select_related('business'):
+                try:
+                    created += generate_missing_slots(shift, start_date, end_date)
+                except Exception as exc:
+                    errors.append(f"Shift {shift.pk}: {exc}")
+    finally:
+        if close_connection:
+            connections.close_all()
+    return len(shift_ids), created, errors
+
+
+def _init_process_worker():
+    # Spawned workers need Django configured, forked ones must not share
+    # the parent's database connections
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def make_executor(workers, pool='thread'):
+    """Pool for run_job(), or None to generate in the calling thread"""
+    if workers <= 0:
+        return None
+    if pool == 'process':
+        connections.close_all()
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker)
+    if pool == 'thread':
+        return ThreadPoolExecutor(max_workers=workers)
+    raise ValueError(f"Unknown pool type: {pool}")
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None"""
+    pending = SlotGenerationJob.objects.filter(status='pending').order_by('created_at')
+    for job_id in pending.values_list('pk', flat=True)[:10]:
+        # The conditional update makes the claim safe between workers
+        claimed = SlotGenerationJob.objects.filter(pk=job_id, status='pending').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            return SlotGenerationJob.objects.get(pk=job_id)
+    return None
+
+
+def _record_progress(job, processed, created):
+    SlotGenerationJob.objects.filter(pk=job.pk).update(
+        processed_shifts=F('processed_shifts') + processed,
+        slots_created=F('slots_created') + created,
+    )
+
+
+def run_job(job, executor=None):
+    """Generate the job's slots, in chunks on the executor if one is given"""
+    chunks = [job.shift_ids[i:i + CHUNK_SIZE] for i in range(0, len(job.shift_ids), CHUNK_SIZE)]
+    errors = []
+
+    if executor is None:
+        for chunk in chunks:
+            processed, created, chunk_errors = generate_chunk(
+                chunk, job.start_date, job.end_date, close_connection=False, shard=job.shard
+            )
+            _record_progress(job, processed, created)
+            errors.extend(chunk_errors)
+    else:
+        futures = {
+            executor.submit(generate_chunk, chunk, job.start_date, job.end_date, shard=job.shard): chunk
+            for chunk in chunks
+        }
+        for future in as_completed(futures):
+            try:
+                processed, created, chunk_errors = future.result()
+            except Exception as exc:
+                processed, created, chunk_errors = len(futures[future]), 0, [str(exc)]
+            _record_progress(job, processed, created)
+            errors.extend(chunk_errors)
+
+    SlotGenerationJob.objects.filter(pk=job.pk).update(
+        status='failed' if errors else 'completed',
+        error='\n'.join(errors),
+        finished_at=timezone.now(),
+    )
+    job.refresh_from_db()
+    return job
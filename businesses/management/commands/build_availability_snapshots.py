@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from businesses import snapshots
+
+
+class Command(BaseCommand):
+    help = 'Write the public availability JSON files, only the dirty days unless --full'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rewrite every day in the window')
+        parser.add_argument('--business', type=int, action='append', help='With --full, only this business (repeatable)')
+        parser.add_argument('--limit', type=int, help='Dirty days handled per pass')
+        parser.add_argument('--watch', action='store_true', help='Keep building dirty days until interrupted')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between --watch passes')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Writing to {settings.AVAILABILITY_SNAPSHOT_DIR}")
+        if options['full']:
+            self.report(snapshots.build_all(options['business']))
+            return
+
+        while True:
+            stats = snapshots.build_dirty(options['limit'])
+            if stats.files or not options['watch']:
+                self.report(stats)
+            if not options['watch']:
+                return
+            time.sleep(options['interval'])
+
+    def report(self, stats):
+        self.stdout.write(self.style.SUCCESS(f"Built {stats}"))
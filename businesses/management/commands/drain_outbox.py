@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from businesses.outbox import DrainStats, drain, prune
+from businesses.sharding import shard_aliases
+
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending booking events from the outbox to their handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--once', action='store_true', help='Exit when no events are due')
+        parser.add_argument('--poll-interval', type=float, default=1, help='Seconds between checks for new events')
+
+    def handle(self, *args, **options):
+        last_pruned = None
+        try:
+            while True:
+                if last_pruned is None or time.monotonic() - last_pruned > PRUNE_INTERVAL:
+                    pruned = sum(prune(using=alias) for alias in shard_aliases())
+                    if pruned:
+                        self.stdout.write(f"Pruned {pruned} delivered events")
+                    last_pruned = time.monotonic()
+
+                stats = DrainStats()
+                started = time.monotonic()
+                for alias in shard_aliases():
+                    drain(options['batch_size'], using=alias, stats=stats)
+                if stats:
+                    style = self.style.SUCCESS if not (stats.retried or stats.failed) else self.style.WARNING
+                    self.stdout.write(style(f"{stats} in {time.monotonic() - started:.2f}s"))
+                    # A full batch likely means more events are due
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from businesses.cache import bump_business_version
+from businesses.models import Business
+from businesses.sharding import move_business, shard_aliases, shard_for
+
+
+class Command(BaseCommand):
+    help = "Move a business's rows to another database shard"
+
+    def add_arguments(self, parser):
+        parser.add_argument('business', type=int, help='Business id')
+        parser.add_argument('target', help='Target shard alias')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            business = Business.objects.using('default').get(pk=options['business'])
+        except Business.DoesNotExist:
+            raise CommandError(f"Business {options['business']} not found")
+        if options['target'] not in shard_aliases():
+            raise CommandError(f"Unknown shard '{options['target']}', configured: {', '.join(shard_aliases())}")
+
+        source = shard_for(business.pk)
+        self.stdout.write(f"Moving {business.name} from {source} to {options['target']}")
+        started = time.monotonic()
+        try:
+            moved = move_business(business, options['target'], options['batch_size'], log=self.stdout.write)
+        except ValueError as e:
+            raise CommandError(str(e))
+        bump_business_version(business.pk)
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {sum(moved.values())} rows in {time.monotonic() - started:.1f}s"
+        ))
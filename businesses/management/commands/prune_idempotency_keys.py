@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from businesses.idempotency import prune_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses past their TTL'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Deleted {prune_expired()} expired idempotency keys"))
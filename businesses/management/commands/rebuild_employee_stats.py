@@ -0,0 +1,60 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from businesses.sharding import for_business, for_shard, shard_aliases
+from businesses.stats import CHUNK_SIZE, booked_date_range, rebuild_stats
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = 'Recompute EmployeeDailyStats from the booking history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, help='Only rebuild this business')
+        parser.add_argument('--date-from', type=_date, help='Defaults to the first booked date')
+        parser.add_argument('--date-to', type=_date, help='Defaults to the last booked date')
+        parser.add_argument('--chunk-days', type=int, default=31, help='Days recomputed per transaction')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched per round trip')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = 0
+        if options['business']:
+            with for_business(options['business']):
+                total += self.rebuild(options)
+        else:
+            for alias in shard_aliases():
+                with for_shard(alias):
+                    total += self.rebuild(options)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {total} stats rows in {time.monotonic() - started:.1f}s"
+        ))
+
+    def rebuild(self, options):
+        """Rebuild the stats on the active shard, returns the rows written"""
+        first, last = booked_date_range(options['business'])
+        date_from = options['date_from'] or first
+        date_to = options['date_to'] or last
+        if date_from is None or date_to is None:
+            self.stdout.write('No bookings to rebuild stats from')
+            return 0
+
+        total = 0
+        for chunk_start, chunk_end, rows in rebuild_stats(
+            date_from, date_to,
+            business_id=options['business'],
+            chunk_days=options['chunk_days'],
+            chunk_size=options['chunk_size'],
+        ):
+            total += rows
+            self.stdout.write(f"{chunk_start} - {chunk_end}: {rows} rows")
+        return total
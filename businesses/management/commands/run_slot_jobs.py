@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from businesses.jobs import claim_next_job, make_executor, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run queued time slot generation jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'SLOT_JOB_WORKERS', 4),
+            help='Pool size, 0 generates slots in this process',
+        )
+        parser.add_argument(
+            '--pool', choices=['thread', 'process'], default=getattr(settings, 'SLOT_JOB_POOL', 'thread'),
+        )
+        parser.add_argument('--once', action='store_true', help='Exit when no jobs are pending')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds between checks for new jobs')
+
+    def handle(self, *args, **options):
+        executor = make_executor(options['workers'], options['pool'])
+        try:
+            while True:
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f"Running job #{job.pk} for {job.total_shifts} shifts")
+                started = time.monotonic()
+                job = run_job(job, executor)
+                elapsed = time.monotonic() - started
+                style = self.style.SUCCESS if job.status == 'completed' else self.style.ERROR
+                self.stdout.write(style(
+                    f"Job #{job.pk} {job.status}: {job.slots_created} slots in {elapsed:.1f}s"
+                ))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if executor is not None:
+                executor.shutdown()
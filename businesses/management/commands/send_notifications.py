@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from businesses.notifications import send_pending
+
+
+class Command(BaseCommand):
+    help = 'Send queued booking notification emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_BATCH_SIZE,
+                            help='Recipients emailed per connection')
+        parser.add_argument('--once', action='store_true', help='Exit when no notifications are due')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds between checks for due notifications')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started = time.monotonic()
+                stats = send_pending(options['batch_size'])
+                if stats:
+                    style = self.style.SUCCESS if not stats.failed else self.style.WARNING
+                    self.stdout.write(style(f"{stats} in {time.monotonic() - started:.2f}s"))
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,66 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from businesses import bitmaps
+from businesses.models import Business
+from businesses.sharding import for_business
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def _durations(value):
+    try:
+        return [int(minutes) for minutes in value.split(',') if minutes]
+    except ValueError:
+        raise CommandError(f"Invalid durations '{value}', expected minutes like 15,30,60")
+
+
+class Command(BaseCommand):
+    help = 'Build the DayAvailability bitsets from the TimeSlot rows and check they agree'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, help='Only sync this business')
+        parser.add_argument('--date-from', type=_date, help='Defaults to today')
+        parser.add_argument('--date-to', type=_date, help='Defaults to 30 days after date-from')
+        parser.add_argument('--check', action='store_true', help='Compare start times offered by both after building')
+        parser.add_argument('--durations', type=_durations, default=[15, 30, 60, 90],
+                            help='Service minutes compared by --check')
+
+    def handle(self, *args, **options):
+        date_from = options['date_from'] or timezone.now().date()
+        date_to = options['date_to'] or date_from + timedelta(days=30)
+        businesses = Business.objects.filter(is_active=True)
+        if options['business']:
+            businesses = businesses.filter(pk=options['business'])
+
+        started = time.monotonic()
+        total = 0
+        mismatched = 0
+        for business in businesses:
+            with for_business(business.pk):
+                rows = bitmaps.build(business.pk, date_from, date_to)
+                total += rows
+                self.stdout.write(f"{business.name}: {rows} days")
+                if options['check']:
+                    for employee_id, day, minutes, expected, actual in bitmaps.compare(
+                        business, date_from, date_to, options['durations']
+                    ):
+                        mismatched += 1
+                        self.stdout.write(self.style.WARNING(
+                            f"  employee {employee_id} {day} {minutes} min: slots {expected}, bitmap {actual}"
+                        ))
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {total} days in {elapsed:.1f}s ({total / elapsed if elapsed else total:.0f} days/s)"
+        ))
+        if mismatched:
+            raise CommandError(f"{mismatched} parity mismatches")
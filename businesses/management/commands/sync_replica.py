@@ -0,0 +1,44 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Copy the default SQLite database over the local read replica'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help='Keep copying until interrupted')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between --watch copies')
+
+    def handle(self, *args, **options):
+        alias = settings.REPLICA_DATABASE_ALIAS
+        if alias not in connections.settings:
+            raise CommandError('No replica configured, set REPLICA_DATABASE_PATH')
+        source, target = connections.settings[DEFAULT_DB_ALIAS], connections.settings[alias]
+        if not (source['ENGINE'].endswith('sqlite3') and target['ENGINE'].endswith('sqlite3')):
+            raise CommandError('sync_replica only copies SQLite databases, use real replication otherwise')
+
+        while True:
+            started = time.monotonic()
+            self.copy(str(source['NAME']), str(target['NAME']))
+            self.stdout.write(f"Copied {source['NAME']} to {target['NAME']} in {time.monotonic() - started:.2f}s")
+            if not options['watch']:
+                return
+            time.sleep(options['interval'])
+
+    def copy(self, source_path, target_path):
+        # The backup API gives a consistent copy even while the primary is
+        # being written; swapping the file in keeps readers off a partial one
+        tmp_path = f'{target_path}.tmp'
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        os.replace(tmp_path, target_path)
@@ -0,0 +1,47 @@
+from .owner import OwnerContext
+from .replicas import SAFE_METHODS, mark_sticky
+from .sharding import activate_business, deactivate
+
+
+class OwnerBusinessMiddleware:
+    """
+    Attach a lazy OwnerContext as request.owner. Nothing is queried until a
+    view reads request.owner.business.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.owner = OwnerContext(request)
+        return self.get_response(request)
+
+
+class ReplicaStickyMiddleware:
+    """
+    After a successful write, keep the client on the primary database for
+    REPLICA_STICKY_SECONDS so it reads its own changes (businesses/replicas.py).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and request.method != 'OPTIONS' and response.status_code < 400:
+            mark_sticky(request, response)
+        return response
+
+
+class ShardContextMiddleware:
+    """Start every request without an active business shard (businesses/sharding.py)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = activate_business(None)
+        try:
+            return self.get_response(request)
+        finally:
+            deactivate(token)
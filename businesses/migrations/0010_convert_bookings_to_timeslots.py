@@ -9,9 +9,10 @@ def convert_bookings_to_timeslots(apps, schema_editor):
     Booking = apps.get_model('businesses', 'Booking')
     Shift = apps.get_model('businesses', 'Shift')
     TimeSlot = apps.get_model('businesses', 'TimeSlot')
+    db_alias = schema_editor.connection.alias
     
     # Get all bookings that don't have a time_slot yet
-    bookings = Booking.objects.filter(time_slot__isnull=True)
+    bookings = Booking.objects.using(db_alias).filter(time_slot__isnull=True)
     
     for booking in bookings:
         # Skip if missing required data
@@ -26,7 +27,7 @@ def convert_bookings_to_timeslots(apps, schema_editor):
         
         # Get or create a shift for this employee on this day of week
         day_of_week = booking.date.weekday()
-        shift, created = Shift.objects.get_or_create(
+        shift, created = Shift.objects.using(db_alias).get_or_create(
             business=booking.business,
             employee=booking.employee,
             day_of_week=day_of_week,
@@ -38,7 +39,7 @@ def convert_bookings_to_timeslots(apps, schema_editor):
         )
         
         # Create a time slot for this booking
-        time_slot = TimeSlot.objects.create(
+        time_slot = TimeSlot.objects.using(db_alias).create(
             shift=shift,
             date=booking.date,
             start_time=booking.time,
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_content_updated_at(apps, schema_editor):
+    """
+    Existing businesses start with their last known modification time.
+    """
+    Business = apps.get_model('businesses', 'Business')
+    Business.objects.using(schema_editor.connection.alias).update(content_updated_at=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0015_remove_booking_internal_notes_booking_notes_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='business',
+            name='content_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='business',
+            name='content_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(backfill_content_updated_at, migrations.RunPython.noop),
+    ]
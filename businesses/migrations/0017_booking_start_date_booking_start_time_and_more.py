@@ -0,0 +1,44 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_booking_start(apps, schema_editor):
+    """
+    Copy the first time slot's date and start time onto existing bookings.
+    """
+    Booking = apps.get_model('businesses', 'Booking')
+    TimeSlot = apps.get_model('businesses', 'TimeSlot')
+    db_alias = schema_editor.connection.alias
+    first_slot = TimeSlot.objects.using(db_alias).filter(bookings=models.OuterRef('pk')).order_by('date', 'start_time')
+    Booking.objects.using(db_alias).update(
+        start_date=models.Subquery(first_slot.values('date')[:1]),
+        start_time=models.Subquery(first_slot.values('start_time')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0016_business_content_updated_at_business_content_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='start_date',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='start_time',
+            field=models.TimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['business', 'start_date'], name='booking_business_start_idx'),
+        ),
+        migrations.RunPython(backfill_booking_start, migrations.RunPython.noop),
+    ]
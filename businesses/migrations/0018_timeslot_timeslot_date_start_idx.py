@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0017_booking_start_date_booking_start_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['date', 'start_time'], name='timeslot_date_start_idx'),
+        ),
+    ]
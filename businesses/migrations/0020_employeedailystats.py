@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0019_slotgenerationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('cancelled', models.PositiveIntegerField(default=0)),
+                ('booked_minutes', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='employee_stats', to='businesses.business')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='businesses.employee')),
+            ],
+            options={
+                'verbose_name': 'Employee Daily Stats',
+                'verbose_name_plural': 'Employee Daily Stats',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['business', 'date'], name='employee_stats_business_idx')],
+                'constraints': [models.UniqueConstraint(fields=('employee', 'date'), name='unique_employee_daily_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0020_employeedailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShiftException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('is_cancelled', models.BooleanField(default=False)),
+                ('start_time', models.TimeField(blank=True, help_text="Leave empty to keep the shift's hours", null=True)),
+                ('end_time', models.TimeField(blank=True, help_text="Leave empty to keep the shift's hours", null=True)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('shift', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='businesses.shift')),
+            ],
+            options={
+                'verbose_name': 'Shift Exception',
+                'verbose_name_plural': 'Shift Exceptions',
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('shift', 'date'), name='unique_shift_exception')],
+            },
+        ),
+    ]
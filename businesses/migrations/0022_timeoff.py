@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0021_shiftexception'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeOff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('time_off', 'Time Off'), ('closure', 'Closure'), ('holiday', 'Holiday')], default='time_off', max_length=20)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('start_time', models.TimeField(blank=True, help_text='Leave both times empty to block whole days', null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_off', to='businesses.business')),
+                ('employee', models.ForeignKey(blank=True, help_text='Leave empty to block the whole business', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='time_off', to='businesses.employee')),
+            ],
+            options={
+                'verbose_name': 'Time Off',
+                'verbose_name_plural': 'Time Off',
+                'ordering': ['start_date'],
+                'indexes': [models.Index(fields=['business', 'end_date'], name='timeoff_business_end_idx')],
+            },
+        ),
+    ]
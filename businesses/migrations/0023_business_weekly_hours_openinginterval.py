@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:27
+
+import django.db.models.deletion
+from django.core.exceptions import ValidationError
+from django.db import migrations, models
+
+from businesses.hours import compile_opening_hours
+
+
+def compile_existing_hours(apps, schema_editor):
+    """
+    Compile the opening hours of existing businesses and index them.
+    """
+    Business = apps.get_model('businesses', 'Business')
+    OpeningInterval = apps.get_model('businesses', 'OpeningInterval')
+    db_alias = schema_editor.connection.alias
+    intervals = []
+    for business in Business.objects.using(db_alias).only('id', 'opening_hours'):
+        try:
+            weekly_hours = compile_opening_hours(business.opening_hours)
+        except ValidationError:
+            weekly_hours = []
+        Business.objects.using(db_alias).filter(pk=business.pk).update(weekly_hours=weekly_hours)
+        intervals.extend(
+            OpeningInterval(business_id=business.pk, start_minute=start, end_minute=end)
+            for start, end in weekly_hours
+        )
+    OpeningInterval.objects.using(db_alias).bulk_create(intervals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0022_timeoff'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='business',
+            name='weekly_hours',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.CreateModel(
+            name='OpeningInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_minute', models.PositiveIntegerField()),
+                ('end_minute', models.PositiveIntegerField()),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_intervals', to='businesses.business')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start_minute', 'end_minute'], name='opening_interval_minute_idx')],
+            },
+        ),
+        migrations.RunPython(compile_existing_hours, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0023_business_weekly_hours_openinginterval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='business',
+            name='slot_granularity',
+            field=models.PositiveSmallIntegerField(choices=[(5, '5 minutes'), (10, '10 minutes'), (15, '15 minutes'), (30, '30 minutes')], default=30, help_text='Length of time slots in minutes. Applies to slots generated after a change.'),
+        ),
+    ]
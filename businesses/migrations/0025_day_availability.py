@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0024_business_slot_granularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('free', models.BinaryField(max_length=36)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_availability', to='businesses.business')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_availability', to='businesses.employee')),
+            ],
+            options={
+                'verbose_name': 'Day Availability',
+                'verbose_name_plural': 'Day Availability',
+                'indexes': [models.Index(fields=['business', 'date'], name='day_availability_business_idx')],
+                'constraints': [models.UniqueConstraint(fields=('employee', 'date'), name='unique_employee_day_availability')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0025_day_availability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot_dirty_days', to='businesses.business')),
+            ],
+            options={
+                'verbose_name': 'Snapshot Dirty Day',
+                'verbose_name_plural': 'Snapshot Dirty Days',
+                'constraints': [models.UniqueConstraint(fields=('business', 'date'), name='unique_snapshot_dirty_day')],
+            },
+        ),
+    ]
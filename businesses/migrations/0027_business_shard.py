@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0026_snapshot_dirty_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusinessShard',
+            fields=[
+                ('business', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shard', serialize=False, to='businesses.business')),
+                ('alias', models.CharField(max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Business Shard',
+                'verbose_name_plural': 'Business Shards',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 05:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0030_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slotgenerationjob',
+            name='shard',
+            field=models.CharField(default='default', max_length=100),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-19 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0031_slotgenerationjob_shard'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['business', 'status', 'id'], name='outbox_business_head_idx'),
+        ),
+    ]
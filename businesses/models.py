@@ -1,6 +1,8 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from datetime import datetime, timedelta, time
 
@@ -43,26 +45,103 @@ class Business(models.Model):
         ...
     }
     """)
+    # opening_hours compiled to [start, end) minutes from Monday 00:00 on
+    # every save, mirrored into OpeningInterval rows for filtering
+    weekly_hours = models.JSONField(default=list, editable=False)
+    
+    # Length of generated time slots; bookings take as many slots as their
+    # services need, so a finer grid wastes less time on short services
+    SLOT_GRANULARITY_CHOICES = [
+        (5, _('5 minutes')),
+        (10, _('10 minutes')),
+        (15, _('15 minutes')),
+        (30, _('30 minutes')),
+    ]
+    slot_granularity = models.PositiveSmallIntegerField(
+        choices=SLOT_GRANULARITY_CHOICES,
+        default=30,
+        help_text="Length of time slots in minutes. Applies to slots generated after a change.",
+    )
     
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    
+    # Bumped whenever the business or anything shown in its public profile
+    # (services, employees) changes. Used for ETag/Last-Modified validators.
+    content_version = models.PositiveIntegerField(default=1, editable=False)
+    content_updated_at = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         return self.name
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .hours import compile_opening_hours
+        
+        try:
+            compile_opening_hours(self.opening_hours)
+        except ValidationError as e:
+            raise ValidationError({'opening_hours': e.messages})
+    
+    def save(self, *args, **kwargs):
+        from django.core.exceptions import ValidationError
+        from .hours import compile_opening_hours
+        
+        try:
+            weekly_hours = compile_opening_hours(self.opening_hours)
+        except ValidationError:
+            # clean() reports it in forms; unparseable hours never match "open at"
+            weekly_hours = []
+        hours_changed = self._state.adding or weekly_hours != self.weekly_hours
+        self.weekly_hours = weekly_hours
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'opening_hours' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'weekly_hours'}
+        super().save(*args, **kwargs)
+        
+        if hours_changed:
+            self.sync_opening_intervals()
+    
+    def sync_opening_intervals(self):
+        """Replace the business's OpeningInterval rows with its weekly_hours"""
+        self.opening_intervals.all().delete()
+        OpeningInterval.objects.bulk_create(
+            OpeningInterval(business=self, start_minute=start, end_minute=end)
+            for start, end in self.weekly_hours
+        )
+    
+    def slots_needed(self, minutes):
+        """
+        Number of slots at the current granularity needed to cover the given
+        minutes, rounded up. Slots generated before a granularity change keep
+        their length, so fit existing slots with TimeSlot.covering().
+        """
+        return (minutes + self.slot_granularity - 1) // self.slot_granularity
+    
+    @classmethod
+    def touch_content(cls, business_id):
+        """Bump the content version of a business without going through save()"""
+        from .owner import invalidate_owner_business
+        cls.objects.filter(pk=business_id).update(
+            content_version=models.F('content_version') + 1,
+            content_updated_at=timezone.now()
+        )
+        # update() skips post_save, drop the cached copy here
+        invalidate_owner_business(business_id)
 
     class Meta:
         verbose_name = "Business"
         verbose_name_plural = "Businesses"
         app_label = "businesses"
         
-    def generate_all_time_slots(self, days=7, slot_duration=30):
+    def generate_all_time_slots(self, days=7, slot_duration=None):
         """
         Generate time slots for all employees for the next X days.
         
         Args:
             days: Number of days to generate slots for
-            slot_duration: Duration of each slot in minutes
+            slot_duration: Duration of each slot in minutes (default: slot_granularity)
             
         Returns:
             Dictionary with employee names and number of slots created
@@ -78,6 +157,25 @@ class Business(models.Model):
         
         return result
 
+class OpeningInterval(models.Model):
+    """
+    One weekly opening interval of a business in minutes from Monday 00:00,
+    kept in sync with Business.weekly_hours so "open at" is an indexed
+    range lookup.
+    """
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='opening_intervals')
+    start_minute = models.PositiveIntegerField()
+    end_minute = models.PositiveIntegerField()
+    
+    class Meta:
+        app_label = "businesses"
+        indexes = [
+            models.Index(fields=['start_minute', 'end_minute'], name='opening_interval_minute_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.business_id}: {self.start_minute}-{self.end_minute}"
+
 class Service(models.Model):
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='services')
     name = models.CharField(max_length=255)
@@ -141,13 +239,13 @@ class Employee(models.Model):
         
         return created_shifts
     
-    def generate_time_slots_for_next_days(self, days=7, slot_duration=30):
+    def generate_time_slots_for_next_days(self, days=7, slot_duration=None):
         """
         Generate time slots for this employee for the next X days.
         
         Args:
             days: Number of days to generate slots for
-            slot_duration: Duration of each slot in minutes
+            slot_duration: Duration of each slot in minutes (default: the business's slot_granularity)
             
         Returns:
             Number of slots created
@@ -206,41 +304,55 @@ class Shift(models.Model):
     def __str__(self):
         return f"{self.employee.name} - {self.get_day_of_week_display()} ({self.start_time.strftime('%H:%M')} - {self.end_time.strftime('%H:%M')})"
         
-    def generate_time_slots(self, slot_duration=30, date=None):
+    def generate_time_slots(self, slot_duration=None, date=None):
         """
         Generate time slots for this shift.
         
         Args:
-            slot_duration: Duration of each slot in minutes (default: 30)
+            slot_duration: Duration of each slot in minutes (default: the business's slot_granularity)
             date: The specific date to generate slots for (required)
             
         Returns:
             List of created TimeSlot objects
         """
-        from datetime import datetime, timedelta
-        
         if not date:
             raise ValueError("Date is required to generate time slots")
             
+        from .bitmaps import rebuild_if_enabled
+        from .cache import bump_business_version
+        from .snapshots import mark_dirty
+        
         # Delete existing slots for this shift and date
         TimeSlot.objects.filter(shift=self, date=date).delete()
         
-        created_slots = []
+        slots = TimeSlot.objects.bulk_create(self.build_time_slots(date, slot_duration))
+        # bulk_create sends no signals, retire cached availability here
+        bump_business_version(self.business_id)
+        mark_dirty(self.business_id, [date])
+        # The deletes cleared the day's bits, the new slots never set them
+        rebuild_if_enabled(self.business_id, [date], [self.employee_id])
+        return slots
+    
+    def build_time_slots(self, date, slot_duration=None):
+        """Unsaved TimeSlot objects covering this shift on the given date"""
+        from datetime import datetime, timedelta
+        
+        slot_duration = slot_duration or self.business.slot_granularity
+        slots = []
         current_time = datetime.combine(date, self.start_time)
         end_time = datetime.combine(date, self.end_time)
         
         while current_time + timedelta(minutes=slot_duration) <= end_time:
-            slot = TimeSlot.objects.create(
+            slots.append(TimeSlot(
                 shift=self,
                 date=date,
                 start_time=current_time.time(),
                 end_time=(current_time + timedelta(minutes=slot_duration)).time(),
                 is_available=True
-            )
-            created_slots.append(slot)
+            ))
             current_time += timedelta(minutes=slot_duration)
             
-        return created_slots
+        return slots
         
     def save(self, *args, **kwargs):
         """Override save to automatically generate time slots for the next 7 days"""
@@ -257,9 +369,17 @@ class Shift(models.Model):
                 if target_date.weekday() == self.day_of_week:
                     self.generate_time_slots(date=target_date)
 
+def minutes_between(start_time, end_time):
+    """Minutes from start_time to end_time, an end at midnight counting as the end of the day"""
+    return (end_time.hour * 60 + end_time.minute - start_time.hour * 60 - start_time.minute) % (24 * 60) or 24 * 60
+
 class TimeSlot(models.Model):
     """
     Represents a bookable time slot within a shift.
+    
+    A slot keeps the length it was generated with when the business's
+    slot_granularity changes later, so durations are fitted with the
+    slots' own lengths (covering()) rather than a slot count.
     """
     shift = models.ForeignKey(Shift, on_delete=models.CASCADE, related_name='time_slots')
     date = models.DateField()
@@ -281,6 +401,10 @@ class TimeSlot(models.Model):
                 name='unique_shift_timeslot'
             )
         ]
+        indexes = [
+            # Default ordering and the admin's date range filter
+            models.Index(fields=['date', 'start_time'], name='timeslot_date_start_idx'),
+        ]
     
     def __str__(self):
         return f"{self.shift.employee.name} - {self.date} {self.start_time.strftime('%H:%M')} to {self.end_time.strftime('%H:%M')}"
@@ -292,6 +416,123 @@ class TimeSlot(models.Model):
     @property
     def business(self):
         return self.shift.business
+    
+    @property
+    def minutes(self):
+        return minutes_between(self.start_time, self.end_time)
+    
+    @staticmethod
+    def covering(slots, minutes):
+        """
+        The consecutive slots from the first of ``slots`` (ordered by start
+        time) that together last at least the minutes, or None when a gap or
+        the end of the slots comes first.
+        """
+        covered = []
+        for slot in slots:
+            if covered and covered[-1].end_time != slot.start_time:
+                return None
+            covered.append(slot)
+            if minutes_between(covered[0].start_time, slot.end_time) >= minutes:
+                return covered
+        return None
+
+class ShiftException(models.Model):
+    """
+    A one-off change to a recurring shift on a single date.
+    
+    On a date the shift normally works the exception either cancels it or
+    replaces its hours. On any other date it adds a one-off occurrence,
+    using the given hours or the shift's own. See businesses/recurrence.py.
+    """
+    shift = models.ForeignKey(Shift, on_delete=models.CASCADE, related_name='exceptions')
+    date = models.DateField()
+    is_cancelled = models.BooleanField(default=False)
+    start_time = models.TimeField(null=True, blank=True, help_text="Leave empty to keep the shift's hours")
+    end_time = models.TimeField(null=True, blank=True, help_text="Leave empty to keep the shift's hours")
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Shift Exception"
+        verbose_name_plural = "Shift Exceptions"
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['shift', 'date'], name='unique_shift_exception'),
+        ]
+    
+    def __str__(self):
+        change = 'cancelled' if self.is_cancelled else 'changed'
+        return f"{self.shift} - {self.date} ({change})"
+
+class TimeOff(models.Model):
+    """
+    A period when bookings can't be taken: an employee's time off, or a
+    closure or holiday for the whole business when no employee is set.
+    
+    Covers start_date to end_date, all day unless start_time and end_time
+    are given, in which case that window is blocked on each of the days.
+    Availability subtracts these periods (businesses/availability.py);
+    time slots are never deleted or regenerated for them.
+    """
+    KIND_CHOICES = [
+        ('time_off', 'Time Off'),
+        ('closure', 'Closure'),
+        ('holiday', 'Holiday'),
+    ]
+    
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='time_off')
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, null=True, blank=True, related_name='time_off',
+                                 help_text="Leave empty to block the whole business")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='time_off')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True, help_text="Leave both times empty to block whole days")
+    end_time = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Time Off"
+        verbose_name_plural = "Time Off"
+        ordering = ['start_date']
+        indexes = [
+            # Overlap lookups filter on business and end_date >= window start
+            models.Index(fields=['business', 'end_date'], name='timeoff_business_end_idx'),
+        ]
+    
+    def __str__(self):
+        who = self.employee.name if self.employee_id else self.business.name
+        return f"{who} - {self.get_kind_display()} ({self.start_date} - {self.end_date})"
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        
+        if self.start_date and self.end_date and self.end_date < self.start_date:
+            raise ValidationError({'end_date': 'End date cannot be before the start date'})
+        if (self.start_time is None) != (self.end_time is None):
+            raise ValidationError('Set both start and end time, or neither for whole days')
+        if self.start_time and self.end_time and self.end_time <= self.start_time:
+            raise ValidationError({'end_time': 'End time must be after the start time'})
+        if self.employee_id and self.business_id and self.employee.business_id != self.business_id:
+            raise ValidationError({'employee': 'Employee does not belong to this business'})
+    
+    @classmethod
+    def add_holidays(cls, business, holidays):
+        """
+        Block a list of holidays for the whole business in one insert.
+        holidays is an iterable of dates or (date, name) pairs.
+        """
+        entries = []
+        for holiday in holidays:
+            day, name = holiday if isinstance(holiday, tuple) else (holiday, '')
+            entries.append(cls(business=business, kind='holiday', start_date=day, end_date=day, reason=name))
+        created = cls.objects.bulk_create(entries)
+        
+        # bulk_create sends no post_save, invalidate cached availability here
+        from .cache import bump_business_version
+        bump_business_version(business.pk)
+        return created
 
 class Booking(models.Model):
     STATUS_CHOICES = [
@@ -313,15 +554,18 @@ class Booking(models.Model):
     # New fields for multiple time slots
     time_slots = models.ManyToManyField(TimeSlot, related_name='bookings')
     
+    # Date and time of the first time slot, kept in sync by sync_start()
+    start_date = models.DateField(null=True, blank=True, db_index=True, editable=False)
+    start_time = models.TimeField(null=True, blank=True, editable=False)
+    
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     notes = models.TextField(blank=True, null=True)
 
     def __str__(self):
-        if self.time_slots.exists():
-            first_slot = self.time_slots.order_by('start_time').first()
-            return f"{self.customer.username} - Multiple Services - {first_slot.date}"
+        if self.start_date:
+            return f"{self.customer.username} - Multiple Services - {self.start_date}"
         elif self.date:
             return f"{self.customer.username} - Multiple Services - {self.date}"
         else:
@@ -334,8 +578,8 @@ class Booking(models.Model):
     
     @property
     def required_slots(self):
-        """Calculate number of 30-minute slots needed"""
-        return (self.total_duration + 29) // 30  # Rounds up to nearest slot
+        """Number of slots needed at the business's current slot granularity"""
+        return self.business.slots_needed(self.total_duration)
     
     def save(self, *args, **kwargs):
         is_new = self._state.adding
@@ -350,30 +594,38 @@ class Booking(models.Model):
         if not self.time_slots.exists():
             return
         
-        required_slots = self.required_slots
+        minutes = self.total_duration
         current_slots = list(self.time_slots.order_by('start_time'))
         
-        # If we have the wrong number of slots
-        if len(current_slots) != required_slots:
+        # If the slots don't cover the services exactly
+        if TimeSlot.covering(current_slots, minutes) != current_slots:
             # Start with the first slot
             first_slot = current_slots[0]
             shift = first_slot.shift
             date = first_slot.date
             
             # Get all available consecutive slots from this point
-            available_slots = TimeSlot.objects.filter(
+            candidates = TimeSlot.objects.filter(
                 shift=shift,
                 date=date,
                 start_time__gte=first_slot.start_time,
                 is_available=True
-            ).order_by('start_time')[:required_slots]
+            ).order_by('start_time')
+            # The booking's own slots are not available any more
+            available_slots = TimeSlot.covering(
+                sorted({*current_slots, *candidates}, key=lambda slot: slot.start_time), minutes
+            )
             
             # Verify we have enough consecutive slots
-            if len(available_slots) < required_slots:
+            if available_slots is None:
                 raise ValueError("Not enough consecutive time slots available")
             
             # Clear existing slots
             self.time_slots.clear()
+            for slot in current_slots:
+                if slot not in available_slots:
+                    slot.is_available = True
+                    slot.save()
             
             # Add new slots and mark them as unavailable
             for slot in available_slots:
@@ -381,21 +633,41 @@ class Booking(models.Model):
                 slot.is_available = False
                 slot.save()
     
+    def sync_start(self):
+        """Copy the date and start time of the first time slot onto the booking"""
+        first_slot = self.time_slots.order_by('date', 'start_time').values('date', 'start_time').first()
+        self.start_date = first_slot['date'] if first_slot else None
+        self.start_time = first_slot['start_time'] if first_slot else None
+        Booking.objects.filter(pk=self.pk).update(start_date=self.start_date, start_time=self.start_time)
+    
     def cancel(self):
         """Cancel the booking and free up the slots"""
+        from django.conf import settings
+        from .bitmaps import release_slots
+        from .outbox import BOOKING_CANCELLED, atomic, booking_event
+        from .snapshots import mark_dirty
         if self.status != 'cancelled':
-            self.status = 'cancelled'
-            # Make all slots available again
-            for slot in self.time_slots.all():
-                slot.is_available = True
-                slot.save()
-            self.save()
+            with atomic(using=self._state.db):
+                self.status = 'cancelled'
+                slots = list(self.time_slots.select_related('shift'))
+                if settings.DAY_AVAILABILITY_BITMAPS:
+                    for employee_id in {slot.shift.employee_id for slot in slots}:
+                        release_slots(employee_id, [slot for slot in slots if slot.shift.employee_id == employee_id])
+                # Make all slots available again, in one UPDATE; saving
+                # the booking bumps the business version afterwards
+                TimeSlot.objects.using(self._state.db).filter(pk__in=[slot.pk for slot in slots]).update(is_available=True)
+                mark_dirty(self.business_id, {slot.date for slot in slots})
+                self.save()
+                booking_event(BOOKING_CANCELLED, self)
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Booking"
         verbose_name_plural = "Bookings"
         app_label = "businesses"
+        indexes = [
+            models.Index(fields=['business', 'start_date'], name='booking_business_start_idx'),
+        ]
 
 class BusinessRequest(models.Model):
     BUSINESS_TYPES = [
@@ -458,3 +730,263 @@ class BusinessRequest(models.Model):
         verbose_name = "Business Request"
         verbose_name_plural = "Business Requests"
         ordering = ['-created_at']
+
+
+class SlotGenerationJob(models.Model):
+    """
+    Time slot generation for a set of shifts over a date range. Queued from
+    the Shift admin and run by the run_slot_jobs management command.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    shift_ids = models.JSONField(default=list)
+    # Database alias the shifts live on
+    shard = models.CharField(max_length=100, default='default')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    
+    # Progress
+    total_shifts = models.PositiveIntegerField(default=0)
+    processed_shifts = models.PositiveIntegerField(default=0)
+    slots_created = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Slot generation #{self.pk} ({self.start_date} - {self.end_date}) - {self.get_status_display()}"
+    
+    @property
+    def progress(self):
+        """Percentage of shifts processed"""
+        if not self.total_shifts:
+            return 100 if self.status == 'completed' else 0
+        return int(self.processed_shifts * 100 / self.total_shifts)
+    
+    class Meta:
+        verbose_name = "Slot Generation Job"
+        verbose_name_plural = "Slot Generation Jobs"
+        ordering = ['-created_at']
+
+
+class EmployeeDailyStats(models.Model):
+    """
+    Per employee, per day booking totals, maintained by businesses/stats.py
+    whenever a booking's slots, services or status change. Rebuild with the
+    rebuild_employee_stats management command.
+    A booking counts towards the employee and date of its time slots;
+    booked minutes and revenue leave out cancelled bookings.
+    """
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='employee_stats')
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    bookings = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    booked_minutes = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.employee.name} - {self.date}: {self.bookings} bookings"
+    
+    class Meta:
+        verbose_name = "Employee Daily Stats"
+        verbose_name_plural = "Employee Daily Stats"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'date'], name='unique_employee_daily_stats'),
+        ]
+        indexes = [
+            models.Index(fields=['business', 'date'], name='employee_stats_business_idx'),
+        ]
+
+
+class DayAvailability(models.Model):
+    """
+    The free time of an employee on one day as a bitset, one bit per
+    5-minute step from midnight (bit 0 is 00:00-00:05), kept by
+    businesses/bitmaps.py. An alternative to one TimeSlot row per slot:
+    finding a start time is a bit scan and booking is a conditional update
+    of this row. Built from the TimeSlot rows with sync_day_availability.
+    """
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='day_availability')
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='day_availability')
+    date = models.DateField()
+    free = models.BinaryField(max_length=36)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.employee.name} - {self.date}"
+    
+    class Meta:
+        verbose_name = "Day Availability"
+        verbose_name_plural = "Day Availability"
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'date'], name='unique_employee_day_availability'),
+        ]
+        indexes = [
+            models.Index(fields=['business', 'date'], name='day_availability_business_idx'),
+        ]
+
+
+class SnapshotDirtyDay(models.Model):
+    """
+    A business day whose public availability snapshot is out of date.
+    Marked from businesses/signals.py when slots, bookings, shifts or time
+    off change, and cleared by businesses/snapshots.py once the day's file
+    has been rewritten.
+    """
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='snapshot_dirty_days')
+    date = models.DateField()
+    marked_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.business.name} - {self.date}"
+    
+    class Meta:
+        verbose_name = "Snapshot Dirty Day"
+        verbose_name_plural = "Snapshot Dirty Days"
+        constraints = [
+            models.UniqueConstraint(fields=['business', 'date'], name='unique_snapshot_dirty_day'),
+        ]
+
+
+class BusinessShard(models.Model):
+    """
+    Which database alias holds a business's rows (businesses/sharding.py).
+    Lives on default with the Business itself; businesses without a row are
+    on DEFAULT_BUSINESS_SHARD. Changed by the move_business_shard command.
+    """
+    business = models.OneToOneField(Business, on_delete=models.CASCADE, primary_key=True, related_name='shard')
+    alias = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.business_id} -> {self.alias}"
+    
+    class Meta:
+        verbose_name = "Business Shard"
+        verbose_name_plural = "Business Shards"
+
+
+class OutboxEvent(models.Model):
+    """
+    A booking event waiting to be delivered to its handlers. Written in the
+    same transaction as the booking change (businesses/outbox.py) and
+    delivered by the drain_outbox command, in order per business.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ]
+    
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='outbox_events')
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Delivery
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.topic} #{self.pk} ({self.get_status_display()})"
+    
+    class Meta:
+        verbose_name = "Outbox Event"
+        verbose_name_plural = "Outbox Events"
+        indexes = [
+            models.Index(fields=['status', 'id'], name='outbox_status_idx'),
+            # Each business's oldest pending event
+            models.Index(fields=['business', 'status', 'id'], name='outbox_business_head_idx'),
+            models.Index(fields=['status', 'delivered_at'], name='outbox_delivered_idx'),
+        ]
+
+
+class Notification(models.Model):
+    """
+    An email waiting to be sent, queued by the booking outbox handlers in
+    businesses/notifications.py. The send_notifications command sends a
+    recipient's pending notifications together, as one digest when there
+    are several.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    recipient = models.EmailField()
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='notifications')
+    event_id = models.PositiveBigIntegerField(null=True, blank=True)
+    kind = models.CharField(max_length=50)
+    context = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Delivery
+    send_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.kind} to {self.recipient} ({self.get_status_display()})"
+    
+    class Meta:
+        verbose_name = "Notification"
+        verbose_name_plural = "Notifications"
+        indexes = [
+            models.Index(fields=['status', 'send_after'], name='notification_due_idx'),
+            models.Index(fields=['recipient', 'status'], name='notification_recipient_idx'),
+        ]
+        constraints = [
+            # Redelivered outbox events don't queue the same email twice
+            models.UniqueConstraint(fields=['business', 'event_id', 'recipient'], name='unique_notification_event'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response to a request sent with an Idempotency-Key header, replayed
+    to retries of the same request (businesses/idempotency.py). Without a
+    status code the first request is still running.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    
+    # Stored response
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    body = models.BinaryField(blank=True)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.key}"
+    
+    class Meta:
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
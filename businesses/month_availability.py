@@ -0,0 +1,110 @@
+"""
+Per-day availability of a month for the booking date picker.
+
+Instead of one get_available_slots call per day, the month's available
+slots are read with a single query ordered by employee, date and start
+time, and grouped while streaming: every slot of a run of consecutive
+slots is a start time if the run lasts the service duration from it. Runs
+are measured in minutes rather than slots, since slots keep the length they
+were generated with. A day's count is the number of distinct start times
+any employee can take. Results are cached per business, month and service
+duration; booking, slot and time off changes bump the
+business's cache version (businesses/cache.py). Concurrent cache misses for
+the same month share one computation (businesses/singleflight.py).
+"""
+import calendar
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .availability import BlockedTime
+from .cache import cached_for_business
+from .models import TimeSlot, minutes_between
+from .replicas import current_read_db
+from .singleflight import group
+
+MONTHS = group('month-availability')
+
+
+def month_bounds(year, month):
+    """First and last day of the month"""
+    first = date(year, month, 1)
+    return first, first.replace(day=calendar.monthrange(year, month)[1])
+
+
+def start_times_by_day(rows, minutes, blocked=None):
+    """
+    {date: set of start times} from (employee_id, date, start_time, end_time)
+    rows of available slots ordered by employee, date and start time. A start
+    time counts when the run of consecutive slots from it lasts the minutes,
+    going by the slots' own lengths.
+    """
+    starts = {}
+    run = []
+    # Index of the first slot in the run whose start does not fit yet
+    unfit = 0
+    previous = None
+    for employee_id, day, start_time, end_time in rows:
+        if blocked and blocked.is_blocked(employee_id, day, start_time, end_time):
+            # A blocked slot breaks the run like a booked one
+            run = []
+            previous = None
+            continue
+        if previous != (employee_id, day) or run[-1][1] != start_time:
+            run = []
+            unfit = 0
+        run.append((start_time, end_time))
+        previous = (employee_id, day)
+        while unfit < len(run) and minutes_between(run[unfit][0], end_time) >= minutes:
+            starts.setdefault(day, set()).add(run[unfit][0])
+            unfit += 1
+    return starts
+
+
+def build_month(business, year, month, duration, employee_id=None, today=None):
+    today = today or timezone.now().date()
+    first, last = month_bounds(year, month)
+    date_from = max(first, today)
+    days = []
+    if date_from <= last:
+        slots = TimeSlot.objects.filter(
+            shift__business=business,
+            date__range=(date_from, last),
+            is_available=True,
+        )
+        if employee_id:
+            slots = slots.filter(shift__employee_id=employee_id)
+        rows = slots.order_by('shift__employee_id', 'date', 'start_time').values_list(
+            'shift__employee_id', 'date', 'start_time', 'end_time'
+        )
+        blocked = BlockedTime(business.id, date_from, last, employee_ids=[employee_id] if employee_id else None)
+        starts = start_times_by_day(rows.iterator(chunk_size=2000), duration, blocked)
+    else:
+        starts = {}
+
+    day = first
+    while day <= last:
+        count = len(starts.get(day, ()))
+        days.append({'date': day, 'start_times': count, 'available': count > 0})
+        day += timedelta(days=1)
+
+    return {
+        'month': f'{year:04d}-{month:02d}',
+        'duration': duration,
+        'slots_needed': business.slots_needed(duration),
+        'days': days,
+    }
+
+
+def get_month_availability(business, year, month, duration, employee_id=None):
+    today = timezone.now().date()
+    # Today is part of the key because earlier days are reported as full
+    return cached_for_business(
+        business.id, 'month-availability', f'{year:04d}-{month:02d}', duration, employee_id or 'all', today,
+        timeout=settings.MONTH_AVAILABILITY_CACHE_TIMEOUT,
+        compute=lambda: MONTHS.do(
+            (business.id, year, month, duration, employee_id or None, today, current_read_db()),
+            lambda: build_month(business, year, month, duration, employee_id, today),
+        ),
+    )
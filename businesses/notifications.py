@@ -0,0 +1,159 @@
+"""
+Booking notification emails.
+
+The booking outbox handlers below queue a Notification for the customer
+and for the business when a booking is created, cancelled or changes
+status; nothing is sent on the request path. Notifications wait
+NOTIFICATION_COALESCE_SECONDS before they are due, and send_pending() sends
+all of a recipient's pending notifications as one email, so a burst of
+changes becomes a single digest. A batch of emails goes out over one
+connection to the mail server, reopened after a failed send; when the
+server can't be reached, every notification in the batch backs off.
+
+Run one send_notifications worker. Locally, point EMAIL_HOST/EMAIL_PORT at
+an SMTP stand-in such as `python -m aiosmtpd -n -l localhost:1025`.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Min
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import outbox
+from .models import Business, Notification
+
+logger = logging.getLogger(__name__)
+
+SUBJECTS = {
+    outbox.BOOKING_CREATED: "Booking received",
+    outbox.BOOKING_CANCELLED: "Booking cancelled",
+    outbox.BOOKING_STATUS_CHANGED: "Booking updated",
+}
+
+
+@outbox.handler(outbox.BOOKING_CREATED, outbox.BOOKING_CANCELLED, outbox.BOOKING_STATUS_CHANGED)
+def queue_booking_notifications(event):
+    """Queue the customer's and the business's emails for a booking event"""
+    payload = event.payload
+    business = Business.objects.filter(pk=event.business_id).values('name', 'email').first()
+    customer = User.objects.filter(pk=payload['customer_id']).values('username', 'email').first()
+    if business is None or customer is None:
+        return
+
+    context = {
+        'booking_id': payload['booking_id'],
+        'business': business['name'],
+        'customer': customer['username'],
+        'status': payload['status'],
+        'start_date': payload['start_date'],
+        'start_time': (payload['start_time'] or '')[:5],
+    }
+    send_after = timezone.now() + timedelta(seconds=settings.NOTIFICATION_COALESCE_SECONDS)
+    recipients = [(customer['email'], 'customer'), (business['email'], 'business')]
+    Notification.objects.bulk_create([
+        Notification(
+            recipient=email, business_id=event.business_id, event_id=event.pk, kind=event.topic,
+            context={**context, 'role': role}, send_after=send_after,
+        )
+        for email, role in recipients
+        if email
+    ], ignore_conflicts=True)
+
+
+def build_message(recipient, notifications):
+    """One email for the recipient's notifications, oldest first"""
+    if len(notifications) == 1:
+        subject = f"{SUBJECTS.get(notifications[0].kind, 'Booking update')} - {notifications[0].context['business']}"
+    else:
+        subject = f"{len(notifications)} booking updates"
+    body = render_to_string('businesses/email/booking_notifications.txt', {
+        'items': [{**notification.context, 'kind': notification.kind} for notification in notifications],
+    })
+    return EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [recipient])
+
+
+class SendStats:
+    def __init__(self):
+        self.emails = 0
+        self.notifications = 0
+        self.failed = 0
+
+    def __bool__(self):
+        return bool(self.emails or self.failed)
+
+    def __str__(self):
+        return f"{self.emails} emails for {self.notifications} notifications, {self.failed} failed"
+
+
+def _record_failure(notifications, exc, stats):
+    stats.failed += 1
+    error = f"{type(exc).__name__}: {exc}"
+    attempts = max(notification.attempts for notification in notifications) + 1
+    pending = Notification.objects.filter(pk__in=[notification.pk for notification in notifications])
+    if attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        pending.update(status='failed', attempts=attempts, last_error=error)
+        logger.error("Notification email to %s failed after %s attempts: %s", notifications[0].recipient, attempts, exc)
+    else:
+        retry_at = timezone.now() + timedelta(seconds=settings.NOTIFICATION_RETRY_SECONDS * 2 ** (attempts - 1))
+        pending.update(attempts=attempts, last_error=error, send_after=retry_at)
+        logger.warning("Notification email to %s attempt %s failed: %s", notifications[0].recipient, attempts, exc)
+
+
+def send_pending(batch_size=None, connection=None):
+    """
+    Send one email to each of up to batch_size recipients with due
+    notifications, including their notifications that are not due yet.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    stats = SendStats()
+    recipients = list(
+        Notification.objects.filter(status='pending', send_after__lte=timezone.now())
+        .values('recipient').annotate(due=Min('send_after')).order_by('due')
+        .values_list('recipient', flat=True)[:batch_size]
+    )
+    if not recipients:
+        return stats
+
+    by_recipient = defaultdict(list)
+    for notification in Notification.objects.filter(status='pending', recipient__in=recipients).order_by('pk'):
+        by_recipient[notification.recipient].append(notification)
+
+    connection = connection or get_connection()
+    batch = list(by_recipient.values())
+    try:
+        connection.open()
+    except Exception as exc:
+        # The mail server is unreachable, the whole batch backs off
+        for notifications in batch:
+            _record_failure(notifications, exc, stats)
+        return stats
+
+    try:
+        for i, notifications in enumerate(batch):
+            try:
+                connection.send_messages([build_message(notifications[0].recipient, notifications)])
+            except Exception as exc:
+                _record_failure(notifications, exc, stats)
+                # The session may be unusable after an error, start a new
+                # one rather than fail the rest of the batch on it
+                connection.close()
+                try:
+                    connection.open()
+                except Exception as exc:
+                    for rest in batch[i + 1:]:
+                        _record_failure(rest, exc, stats)
+                    break
+                continue
+            Notification.objects.filter(pk__in=[notification.pk for notification in notifications]).update(
+                status='sent', sent_at=timezone.now(),
+            )
+            stats.emails += 1
+            stats.notifications += len(notifications)
+    finally:
+        connection.close()
+    return stats
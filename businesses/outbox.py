@@ -0,0 +1,221 @@
+"""
+Transactional outbox for booking events.
+
+Views that change a booking write an OutboxEvent in the same transaction:
+
+    with outbox.atomic():
+        booking.save()
+        outbox.booking_event(outbox.BOOKING_CANCELLED, booking)
+
+so an event exists if and only if the change was committed. The
+drain_outbox command delivers pending events to the handlers registered
+for their topic:
+
+    @outbox.handler(outbox.BOOKING_CREATED)
+    def notify_owner(event):
+        ...
+
+Events of one business are delivered in the order they were written. A
+handler that raises stops its business's delivery for the round; the event
+is retried after OUTBOX_RETRY_SECONDS, doubling with every attempt, and
+marked failed after OUTBOX_MAX_ATTEMPTS so it no longer holds up the
+business. Delivery is at least once: a worker dying between a handler and
+the status update redelivers the event once its lease expires, and all
+handlers of a topic run again when one of them fails, so handlers must be
+idempotent.
+
+OutboxEvent lives on the business's shard, next to its bookings; the drain
+runs over every shard.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import OutboxEvent
+from .sharding import for_business
+
+logger = logging.getLogger(__name__)
+
+BOOKING_CREATED = 'booking.created'
+BOOKING_CANCELLED = 'booking.cancelled'
+BOOKING_STATUS_CHANGED = 'booking.status_changed'
+
+_handlers = defaultdict(list)
+
+
+def register(topic, func):
+    if func not in _handlers[topic]:
+        _handlers[topic].append(func)
+
+
+def unregister(topic, func):
+    if func in _handlers[topic]:
+        _handlers[topic].remove(func)
+
+
+def handler(*topics):
+    """Register the decorated function for the topics"""
+    def decorator(func):
+        for topic in topics:
+            register(topic, func)
+        return func
+    return decorator
+
+
+def handlers_for(topic):
+    return list(_handlers.get(topic, ()))
+
+
+def atomic(using=None):
+    """
+    A transaction on the database the outbox and the active business's
+    bookings are written to, or on the database of a loaded booking
+    """
+    return transaction.atomic(using=using or router.db_for_write(OutboxEvent))
+
+
+def publish(topic, business_id, payload, using=None):
+    return OutboxEvent.objects.using(using or router.db_for_write(OutboxEvent)).create(
+        business_id=business_id, topic=topic, payload=payload,
+    )
+
+
+def booking_event(topic, booking):
+    """Write an event for the booking on the database the booking was saved to"""
+    return publish(topic, booking.business_id, {
+        'booking_id': booking.pk,
+        'customer_id': booking.customer_id,
+        'status': booking.status,
+        'start_date': booking.start_date,
+        'start_time': booking.start_time,
+    }, using=booking._state.db)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1))
+
+
+class DrainStats:
+    def __init__(self):
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+
+    def __bool__(self):
+        return bool(self.delivered or self.retried or self.failed)
+
+    def __str__(self):
+        return f"{self.delivered} delivered, {self.retried} to retry, {self.failed} failed"
+
+
+def _claim(events, using, now):
+    """
+    Lease a business's due events, oldest first. Claiming the oldest with a
+    conditional update makes the business this worker's until the lease runs
+    out; workers that lose the race skip it.
+    """
+    lease = now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+    unlocked = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    pending = OutboxEvent.objects.using(using).filter(status='pending')
+    head = events[0]
+    if not pending.filter(unlocked, pk=head.pk, available_at__lte=now).update(locked_until=lease):
+        return []
+    pending.filter(pk__in=[event.pk for event in events[1:]]).update(locked_until=lease)
+    return events
+
+
+def _deliver(event):
+    with for_business(event.business_id):
+        for func in handlers_for(event.topic):
+            func(event)
+
+
+def _deliver_business(events, using, stats):
+    delivered = []
+    try:
+        for event in events:
+            try:
+                _deliver(event)
+            except Exception as exc:
+                _record_failure(event, exc, using, stats)
+                break
+            delivered.append(event.pk)
+    finally:
+        now = timezone.now()
+        OutboxEvent.objects.using(using).filter(pk__in=delivered).update(
+            status='delivered', delivered_at=now, locked_until=None,
+        )
+        stats.delivered += len(delivered)
+        # The rest waits for the next round, behind the failed event
+        OutboxEvent.objects.using(using).filter(
+            pk__in=[event.pk for event in events], status='pending',
+        ).update(locked_until=None)
+
+
+def _record_failure(event, exc, using, stats):
+    attempts = event.attempts + 1
+    update = {'attempts': attempts, 'last_error': f"{type(exc).__name__}: {exc}"}
+    if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        update['status'] = 'failed'
+        stats.failed += 1
+        logger.error("Outbox event %s (%s) failed after %s attempts: %s", event.pk, event.topic, attempts, exc)
+    else:
+        update['available_at'] = timezone.now() + retry_delay(attempts)
+        stats.retried += 1
+        logger.warning("Outbox event %s (%s) attempt %s failed: %s", event.pk, event.topic, attempts, exc)
+    OutboxEvent.objects.using(using).filter(pk=event.pk).update(**update)
+
+
+def _due_heads(using, now, limit):
+    """
+    Ids of the businesses whose oldest pending event is due and not leased,
+    oldest head first
+    """
+    head = OutboxEvent.objects.using(using).filter(
+        status='pending', business_id=OuterRef('business_id'),
+    ).order_by('pk').values('pk')[:1]
+    unlocked = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    return list(
+        OutboxEvent.objects.using(using)
+        .filter(unlocked, status='pending', available_at__lte=now, pk=Subquery(head))
+        .order_by('pk').values_list('business_id', flat=True)[:limit]
+    )
+
+
+def drain(batch_size=None, using=DEFAULT_DB_ALIAS, stats=None):
+    """
+    Deliver up to batch_size pending events on one database. Businesses are
+    picked by their oldest pending event, so one whose head is waiting for
+    a retry, or is leased by another worker, never takes up the batch.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    if stats is None:
+        stats = DrainStats()
+    now = timezone.now()
+    remaining = batch_size
+    for business_id in _due_heads(using, now, batch_size):
+        if remaining <= 0:
+            break
+        events = OutboxEvent.objects.using(using).filter(status='pending', business_id=business_id).order_by('pk')
+        # Only the leading run of due events; a later one in backoff waits its turn
+        due = []
+        for event in events[:remaining]:
+            if event.available_at > now:
+                break
+            due.append(event)
+        if due and _claim(due, using, now):
+            _deliver_business(due, using, stats)
+            remaining -= len(due)
+    return stats
+
+
+def prune(days=None, using=DEFAULT_DB_ALIAS):
+    """Delete delivered events older than OUTBOX_KEEP_DAYS"""
+    cutoff = timezone.now() - timedelta(days=days if days is not None else settings.OUTBOX_KEEP_DAYS)
+    deleted, _ = OutboxEvent.objects.using(using).filter(status='delivered', delivered_at__lt=cutoff).delete()
+    return deleted
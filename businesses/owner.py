@@ -0,0 +1,117 @@
+"""
+Request-scoped resolution of the authenticated owner's business.
+
+OwnerBusinessMiddleware (businesses/middleware.py) attaches an OwnerContext
+as ``request.owner``; the business is loaded on first access and memoized
+for the rest of the request.
+DRF and Ninja authenticate inside the view, so nothing is resolved until a
+view asks for it. When the JWT carries a business id the lookup is by
+primary key and may be served from the cache (OWNER_BUSINESS_CACHE_TIMEOUT),
+which is invalidated whenever the business is saved or deleted or its
+content is touched; anything else updating Business rows with
+QuerySet.update() must call invalidate_owner_business(). Resolving
+the business also activates its database shard (businesses/sharding.py).
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from api.renderers import FastJsonResponse
+from authentication.authentication import ClaimsUser
+from authentication.claims import resolve_role
+from .models import Business
+from .sharding import activate_business
+
+
+def _business_cache_key(business_id):
+    return f'owner-business:{business_id}'
+
+
+def invalidate_owner_business(business_id):
+    cache.delete(_business_cache_key(business_id))
+
+
+class OwnerContext:
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def user(self):
+        # Ninja puts the authenticated principal on request.auth, DRF and
+        # Django on request.user (DRF mirrors it onto the HttpRequest)
+        auth = getattr(self.request, 'auth', None)
+        if isinstance(auth, ClaimsUser):
+            return auth
+        return getattr(self.request, 'user', None)
+
+    @cached_property
+    def is_business_owner(self):
+        user = self.user
+        if user is None or not user.is_authenticated:
+            return False
+        if isinstance(user, ClaimsUser):
+            return user.is_business_owner
+        return resolve_role(user) == 'business_owner'
+
+    @cached_property
+    def business(self):
+        business = self._load_business()
+        if business is not None:
+            # The business's rows are on its shard for the rest of the request;
+            # ShardContextMiddleware resets this afterwards
+            activate_business(business.pk)
+        return business
+
+    def _load_business(self):
+        user = self.user
+        if user is None or not user.is_authenticated:
+            return None
+        if not isinstance(user, ClaimsUser):
+            return Business.objects.filter(owner_id=user.pk).first()
+
+        business_id = user.business_id
+        if business_id is None:
+            return None
+        timeout = getattr(settings, 'OWNER_BUSINESS_CACHE_TIMEOUT', 0)
+        if timeout:
+            business = cache.get(_business_cache_key(business_id))
+            if business is not None:
+                return business
+        business = Business.objects.filter(id=business_id).first()
+        if business is not None and timeout:
+            cache.set(_business_cache_key(business_id), business, timeout)
+        return business
+
+
+def get_owner_context(request):
+    """The request's OwnerContext, created on demand if the middleware isn't installed"""
+    # Keep it on the underlying HttpRequest so DRF's Request and the
+    # HttpRequest share the memoized business
+    http_request = getattr(request, '_request', request)
+    owner = getattr(http_request, 'owner', None)
+    if owner is None:
+        owner = http_request.owner = OwnerContext(http_request)
+    return owner
+
+
+def get_owner_business(request):
+    """Business owned by the authenticated user, or None"""
+    return get_owner_context(request).business
+
+
+def owner_required(view_func):
+    """
+    Resolve the owner's business once and pass it to the view as ``business``.
+    Responds with 404 if the authenticated user has no business.
+    Place it below @api_view/@permission_classes.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        business = get_owner_business(request)
+        if business is None:
+            return FastJsonResponse({'error': 'No business found for this user'}, status=404)
+        return view_func(request, *args, business=business, **kwargs)
+    return wrapper
+
@@ -0,0 +1,45 @@
+"""
+Admin paginators for tables too large for an exact ``COUNT(*)``.
+
+EstimatedCountPaginator asks the database for its row estimate when the
+changelist isn't filtered (PostgreSQL's ``pg_class.reltuples``) and
+otherwise counts at most ADMIN_COUNT_LIMIT rows. Past the limit the
+changelist shows that many results and the remaining pages are reached by
+narrowing the filters.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_table_rows(model, using='default'):
+    """Planner's row estimate for the model's table, or None if unavailable"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 for tables that were never analyzed
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = getattr(settings, 'ADMIN_COUNT_LIMIT', 10000)
+
+        if not queryset.query.where:
+            estimate = estimated_table_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+
+        # COUNT(*) over a LIMIT subquery stops scanning at the limit
+        return queryset.order_by()[:limit].count()
@@ -0,0 +1,118 @@
+"""
+Expansion of weekly shifts into dated occurrences.
+
+Shifts repeat every week on ``day_of_week``. Instead of testing every date
+in a window against every shift, the first matching date is computed
+arithmetically and the generator steps a week at a time, so the work is
+proportional to the number of occurrences. ShiftException rows cancel an
+occurrence, change its hours, or add a one-off date.
+
+Shifts and exceptions may be model instances or ``values()`` dicts.
+"""
+import heapq
+from datetime import timedelta
+from typing import NamedTuple, Optional
+
+from .models import Shift, ShiftException
+
+
+class Occurrence(NamedTuple):
+    date: object
+    start_time: object
+    end_time: object
+    shift_id: int
+    employee_id: int
+    business_id: int
+    day_of_week: int
+    # True for a one-off date added by a ShiftException
+    is_one_off: bool = False
+    # True when a ShiftException changed the hours
+    is_override: bool = False
+    note: Optional[str] = None
+
+
+def _get(obj, name):
+    return obj[name] if isinstance(obj, dict) else getattr(obj, name)
+
+
+def first_weekday_on_or_after(start, weekday):
+    return start + timedelta(days=(weekday - start.weekday()) % 7)
+
+
+def weekly_dates(weekday, date_from, date_to):
+    """Dates between date_from and date_to (inclusive) falling on weekday"""
+    current = first_weekday_on_or_after(date_from, weekday)
+    step = timedelta(days=7)
+    while current <= date_to:
+        yield current
+        current += step
+
+
+def expand_shift(shift, date_from, date_to, exceptions=None):
+    """
+    Yield the shift's occurrences in date order.
+    exceptions maps a date to that date's ShiftException, if any.
+    """
+    exceptions = exceptions or {}
+    base = dict(
+        shift_id=_get(shift, 'id'),
+        employee_id=_get(shift, 'employee_id'),
+        business_id=_get(shift, 'business_id'),
+        day_of_week=_get(shift, 'day_of_week'),
+    )
+    start_time = _get(shift, 'start_time')
+    end_time = _get(shift, 'end_time')
+
+    # One-off dates in the window, merged in date order with the weekly ones
+    one_offs = sorted(
+        day for day in exceptions
+        if date_from <= day <= date_to and day.weekday() != base['day_of_week']
+    )
+    for day in heapq.merge(weekly_dates(base['day_of_week'], date_from, date_to), one_offs):
+        exception = exceptions.get(day)
+        if exception is None:
+            yield Occurrence(day, start_time, end_time, **base)
+            continue
+        if _get(exception, 'is_cancelled'):
+            continue
+        override_start = _get(exception, 'start_time')
+        override_end = _get(exception, 'end_time')
+        yield Occurrence(
+            day,
+            override_start or start_time,
+            override_end or end_time,
+            is_one_off=day.weekday() != base['day_of_week'],
+            is_override=bool(override_start or override_end),
+            note=_get(exception, 'note') or None,
+            **base,
+        )
+
+
+def expand(shifts, date_from, date_to, exceptions=None):
+    """
+    Yield the occurrences of all shifts ordered by date and start time.
+    exceptions maps shift id to {date: ShiftException}.
+    """
+    exceptions = exceptions or {}
+    return heapq.merge(
+        *(expand_shift(shift, date_from, date_to, exceptions.get(_get(shift, 'id'))) for shift in shifts),
+        key=lambda occurrence: (occurrence.date, occurrence.start_time, occurrence.employee_id),
+    )
+
+
+def business_occurrences(business, date_from, date_to, employee_id=None):
+    """Occurrences of the business's active shifts, with their exceptions applied"""
+    shifts = Shift.objects.filter(business=business, is_active=True)
+    if employee_id is not None:
+        shifts = shifts.filter(employee_id=employee_id)
+    shifts = list(shifts.values('id', 'employee_id', 'business_id', 'day_of_week', 'start_time', 'end_time'))
+
+    exceptions = {}
+    for exception in ShiftException.objects.filter(
+        shift__business=business,
+        shift__is_active=True,
+        date__range=(date_from, date_to),
+    ).values('shift_id', 'date', 'is_cancelled', 'start_time', 'end_time', 'note'):
+        exceptions.setdefault(exception['shift_id'], {})[exception['date']] = exception
+
+    return expand(shifts, date_from, date_to, exceptions)
@@ -0,0 +1,115 @@
+"""
+Read replica routing.
+
+Every query goes to ``default`` unless a view opts in with @replica_reads.
+For GET and HEAD requests those views read from the REPLICA_DATABASE_ALIAS
+connection; writes go to ``default`` or the business's shard. The hint
+lives in a context variable, so it covers exactly one request and nothing
+else in the process.
+
+A client that has just written reads from the primary for
+REPLICA_STICKY_SECONDS, so it sees its own booking even if the replica
+lags. ReplicaStickyMiddleware marks the client after a successful write,
+by its bearer token (in the cache) and by a cookie, since the user is only
+authenticated inside the view. Code that must read its own write within a
+replica-routed view can wrap the query in use_primary().
+
+Locally the replica is a second SQLite file refreshed with the
+sync_replica management command.
+"""
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD')
+STICKY_COOKIE = 'use_primary'
+
+_read_db = ContextVar('read_db', default=None)
+
+
+def current_read_db():
+    """The alias reads are routed to in this context, None for the default"""
+    return _read_db.get()
+
+
+def replica_configured():
+    return settings.REPLICA_DATABASE_ALIAS in connections.settings
+
+
+@contextmanager
+def reading_from(alias):
+    token = _read_db.set(alias)
+    try:
+        yield
+    finally:
+        _read_db.reset(token)
+
+
+def use_primary():
+    return reading_from(None)
+
+
+def _sticky_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    return 'replica-sticky:' + hashlib.sha256(authorization.encode()).hexdigest()
+
+
+def is_sticky(request):
+    """Whether the client wrote recently and should read from the primary"""
+    if STICKY_COOKIE in request.COOKIES:
+        return True
+    key = _sticky_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+def mark_sticky(request, response):
+    timeout = settings.REPLICA_STICKY_SECONDS
+    if not timeout:
+        return
+    key = _sticky_key(request)
+    if key is not None:
+        cache.set(key, 1, timeout)
+    response.set_cookie(STICKY_COOKIE, '1', max_age=timeout, httponly=True, samesite='Lax')
+
+
+def replica_reads(view_func):
+    """
+    Route the view's reads to the replica for GET/HEAD requests from
+    clients that haven't written recently. Works on Django and DRF views
+    and, through decorate_view, on Ninja operations.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or not replica_configured() or is_sticky(request):
+            return view_func(request, *args, **kwargs)
+        with reading_from(settings.REPLICA_DATABASE_ALIAS):
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Reads follow the request's hint; writes keep Django's default choice"""
+
+    def db_for_read(self, model, **hints):
+        return _read_db.get()
+
+    def db_for_write(self, model, **hints):
+        # default, or the database the instance came from (its shard)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of default, objects from either may be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary when it is synced
+        if db == settings.REPLICA_DATABASE_ALIAS:
+            return False
+        return None
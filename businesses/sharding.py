@@ -0,0 +1,312 @@
+"""
+Business-keyed sharding.
+
+Business, its opening hours, users and the operational tables stay on
+``default``, which acts as the directory. The rows that belong to one
+business (services, employees, shifts, slots, bookings, time off, the
+rollups built from them and the booking outbox) live on the alias
+BusinessShard maps the business to, one of BUSINESS_SHARDS. A shard also
+holds copies of the Business and User rows its foreign keys point at;
+move_business() creates them, and copy_user() adds a customer's row before
+their first booking on the shard.
+
+ShardRouter sends business-owned models to the shard of the business the
+request is working on. That business is set with activate_business() or
+for_business(): owner_required and OwnerContext do it once they know the
+owner's business, and @business_shard does it for views that take a
+``business_id``. Endpoints keyed by a shift or booking id find the row
+with locate() and activate its business; background workers wrap each
+business's work in for_business(). ShardContextMiddleware clears it after
+every request. Without an active business, instances keep the database they
+were loaded from and anything else goes to ``default``.
+
+Ids are only unique within a shard, so a row looked up by id alone can
+exist on several shards; locate() prefers the one the caller may access.
+
+With a single shard configured none of this queries anything.
+"""
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from itertools import chain, islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .models import (
+    Booking, Business, BusinessShard, DayAvailability, Employee, EmployeeDailyStats, OutboxEvent, Service,
+    Shift, ShiftException, TimeOff, TimeSlot,
+)
+
+SHARDED_MODELS = {
+    'service', 'employee', 'shift', 'shiftexception', 'timeslot', 'booking', 'timeoff',
+    'employeedailystats', 'dayavailability', 'outboxevent',
+}
+
+_shard = ContextVar('business_shard', default=None)
+
+
+def shard_aliases():
+    return list(settings.BUSINESS_SHARDS)
+
+
+def _map_cache_key(business_id):
+    return f'business-shard:{business_id}'
+
+
+def shard_for(business_id):
+    """The alias holding the business's rows"""
+    if len(settings.BUSINESS_SHARDS) == 1:
+        return settings.BUSINESS_SHARDS[0]
+    key = _map_cache_key(business_id)
+    alias = cache.get(key)
+    if alias is None:
+        alias = (
+            BusinessShard.objects.using(DEFAULT_DB_ALIAS).filter(business_id=business_id)
+            .values_list('alias', flat=True).first()
+            or settings.DEFAULT_BUSINESS_SHARD
+        )
+        cache.set(key, alias, settings.BUSINESS_SHARD_CACHE_TIMEOUT)
+    return alias
+
+
+def set_shard(business_id, alias):
+    if alias not in settings.BUSINESS_SHARDS:
+        raise ValueError(f"Unknown shard '{alias}', expected one of {', '.join(settings.BUSINESS_SHARDS)}")
+    BusinessShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(business_id=business_id, defaults={'alias': alias})
+    cache.delete(_map_cache_key(business_id))
+
+
+def current_shard():
+    return _shard.get()
+
+
+def activate_business(business_id):
+    """Route business-owned models to this business's shard for the rest of the request"""
+    return _shard.set(shard_for(business_id) if business_id is not None else None)
+
+
+def deactivate(token):
+    _shard.reset(token)
+
+
+@contextmanager
+def for_business(business_id):
+    token = activate_business(business_id)
+    try:
+        yield
+    finally:
+        deactivate(token)
+
+
+@contextmanager
+def for_shard(alias):
+    """Route business-owned models to the alias, for work over all of a shard's businesses"""
+    token = _shard.set(alias)
+    try:
+        yield
+    finally:
+        deactivate(token)
+
+
+def business_shard(view_func):
+    """Run the view on the shard of its ``business_id`` argument"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        business_id = kwargs.get('business_id')
+        if business_id is None:
+            return view_func(request, *args, **kwargs)
+        try:
+            business_id = int(business_id)
+        except (TypeError, ValueError):
+            return view_func(request, *args, **kwargs)
+        with for_business(business_id):
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def is_sharded_model(model):
+    meta = model._meta
+    if meta.app_label != 'businesses':
+        return False
+    if meta.auto_created:
+        # Many-to-many tables between business-owned models
+        return any(
+            field.related_model is not None and is_sharded_model(field.related_model)
+            for field in meta.fields if field.is_relation
+        )
+    return meta.model_name in SHARDED_MODELS
+
+
+class ShardRouter:
+    """
+    Business-owned models go to the active business's shard. Reads on the
+    default shard return None so ReplicaRouter can still pick the replica.
+    """
+
+    def _route(self, model, hints, write):
+        if not is_sharded_model(model):
+            return None
+        alias = _shard.get()
+        if alias is None:
+            instance = hints.get('instance')
+            alias = instance._state.db if instance is not None else None
+        if alias == DEFAULT_DB_ALIAS and not write:
+            return None
+        return alias
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints, write=False)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints, write=True)
+
+
+def _evaluate(queryset, alias):
+    try:
+        return list(queryset.using(alias))
+    finally:
+        # Pool threads open their own connections
+        connections[alias].close()
+
+
+def fan_out(queryset, key=None, reverse=False, limit=None):
+    """
+    Evaluate the queryset on every shard in parallel and merge the results,
+    one shard after the other inside a transaction. With a key, each shard's rows must already be ordered by it (matching
+    the queryset's order_by) and the merge keeps that order.
+    """
+    aliases = shard_aliases()
+    if len(aliases) == 1:
+        rows = queryset.using(aliases[0])
+        return list(rows[:limit] if limit else rows)
+    if limit:
+        queryset = queryset[:limit]
+    if any(connections[alias].in_atomic_block for alias in aliases):
+        # Pool threads have connections of their own, which can't see (and
+        # on SQLite are locked out by) the writes of this open transaction
+        parts = [list(queryset.using(alias)) for alias in aliases]
+    else:
+        with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+            parts = list(pool.map(lambda alias: _evaluate(queryset, alias), aliases))
+    rows = heapq.merge(*parts, key=key, reverse=reverse) if key else chain.from_iterable(parts)
+    return list(islice(rows, limit))
+
+
+def locate(queryset, allowed=None):
+    """
+    The row the queryset matches on any shard, loaded from its shard,
+    preferring one ``allowed`` accepts. None when no shard has one. Meant
+    for lookups by id, so shards are tried one at a time and the search
+    stops at the first accepted row.
+    """
+    fallback = None
+    for alias in shard_aliases():
+        for row in queryset.using(alias):
+            if allowed is None or allowed(row):
+                return row
+            fallback = fallback or row
+    return fallback
+
+
+def copy_user(user_id, using=None):
+    """Copy the user's row from the directory to the active shard, if it is missing there"""
+    alias = using or _shard.get()
+    if alias is None or alias == DEFAULT_DB_ALIAS:
+        return
+    user_model = Business._meta.get_field('owner').related_model
+    if user_model.objects.using(alias).filter(pk=user_id).exists():
+        return
+    user_model.objects.using(alias).bulk_create(
+        list(user_model.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id)), ignore_conflicts=True,
+    )
+
+
+def business_rows(business_id):
+    """(model, queryset) for every business-owned table, parents before children"""
+    return [
+        (Service, Service.objects.filter(business_id=business_id)),
+        (Employee, Employee.objects.filter(business_id=business_id)),
+        (Employee.services.through, Employee.services.through.objects.filter(employee__business_id=business_id)),
+        (Shift, Shift.objects.filter(business_id=business_id)),
+        (ShiftException, ShiftException.objects.filter(shift__business_id=business_id)),
+        (TimeSlot, TimeSlot.objects.filter(shift__business_id=business_id)),
+        (TimeOff, TimeOff.objects.filter(business_id=business_id)),
+        (Booking, Booking.objects.filter(business_id=business_id)),
+        (Booking.services.through, Booking.services.through.objects.filter(booking__business_id=business_id)),
+        (Booking.time_slots.through, Booking.time_slots.through.objects.filter(booking__business_id=business_id)),
+        (EmployeeDailyStats, EmployeeDailyStats.objects.filter(business_id=business_id)),
+        (DayAvailability, DayAvailability.objects.filter(business_id=business_id)),
+        (OutboxEvent, OutboxEvent.objects.filter(business_id=business_id)),
+    ]
+
+
+def _copy_directory_rows(business, source, target):
+    """Business and User rows the business's foreign keys need on the target"""
+    user_model = Business._meta.get_field('owner').related_model
+    user_ids = {business.owner_id}
+    user_ids.update(Booking.objects.using(source).filter(business_id=business.pk).values_list('customer_id', flat=True))
+    users = user_model.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=user_ids)
+    user_model.objects.using(target).bulk_create(users, ignore_conflicts=True)
+    Business.objects.using(target).bulk_create([business], ignore_conflicts=True)
+
+
+def _remap(model, rows, ids):
+    """Point the rows' foreign keys at the copies already made on the target"""
+    fields = [field for field in model._meta.concrete_fields if field.is_relation and field.related_model in ids]
+    for row in rows:
+        for field in fields:
+            value = getattr(row, field.attname)
+            if value is not None:
+                setattr(row, field.attname, ids[field.related_model][value])
+        if model is OutboxEvent and 'booking_id' in row.payload:
+            row.payload['booking_id'] = ids[Booking][row.payload['booking_id']]
+
+
+def move_business(business, target, batch_size=500, log=None):
+    """
+    Copy the business's rows to the target shard, point the shard map at it
+    and delete them from the source. Writes to the business must be paused
+    while it runs. Returns {model label: rows moved}.
+
+    Ids are only unique within a shard, so the copies get new ids on the
+    target and their foreign keys are remapped to match. Ids kept outside
+    the shard tables (slot generation jobs, sent notifications, idempotent
+    replays) still name the old rows.
+    """
+    source = shard_for(business.pk)
+    if target not in settings.BUSINESS_SHARDS:
+        raise ValueError(f"Unknown shard '{target}'")
+    if source == target:
+        raise ValueError(f"Business {business.pk} is already on '{target}'")
+
+    moved = {}
+    with transaction.atomic(using=target):
+        if target != DEFAULT_DB_ALIAS:
+            _copy_directory_rows(business, source, target)
+        ids = {}
+        for model, queryset in business_rows(business.pk):
+            rows = list(queryset.using(source))
+            _remap(model, rows, ids)
+            old_ids = [row.pk for row in rows]
+            for row in rows:
+                row.pk = None
+            model.objects.using(target).bulk_create(rows, batch_size=batch_size)
+            ids[model] = dict(zip(old_ids, (row.pk for row in rows)))
+            moved[model._meta.label] = len(rows)
+            if log:
+                log(f"{model._meta.label}: {len(rows)} rows copied")
+
+    set_shard(business.pk, target)
+
+    with transaction.atomic(using=source):
+        for model, queryset in reversed(business_rows(business.pk)):
+            # Copied rows are removed without signals: the handlers would
+            # update caches and rollups for data that now lives elsewhere
+            queryset.using(source)._raw_delete(source)
+        if source != DEFAULT_DB_ALIAS:
+            Business.objects.using(source).filter(pk=business.pk)._raw_delete(source)
+    return moved
@@ -0,0 +1,228 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from .bitmaps import apply_slot
+from .cache import bump_business_version
+from .models import Business, Service, Employee, Booking, Shift, TimeSlot, TimeOff
+from .owner import invalidate_owner_business
+from .recurrence import weekly_dates
+from .snapshots import mark_dirty, snapshot_window
+from .stats import BookingSlot, booking_cells, refresh_booking_stats, refresh_cells
+
+
+def _deleting_business(origin):
+    """Whether a post_delete comes from a Business delete cascading"""
+    return isinstance(origin, Business) or getattr(origin, 'model', None) is Business
+
+
+@receiver(post_save, sender=Business)
+def business_saved(sender, instance, created, **kwargs):
+    if not created:
+        # Also drops the owner's cached copy
+        Business.touch_content(instance.pk)
+
+
+@receiver(post_delete, sender=Business)
+def business_deleted(sender, instance, **kwargs):
+    invalidate_owner_business(instance.pk)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def business_content_changed(sender, instance, **kwargs):
+    Business.touch_content(instance.business_id)
+    bump_business_version(instance.business_id)
+
+
+@receiver(pre_save, sender=Service)
+def service_saving(sender, instance, **kwargs):
+    if not instance._state.adding:
+        # Booked minutes and revenue come from the service's duration and price
+        instance._stats_changed = Service.objects.filter(pk=instance.pk).exclude(
+            duration=instance.duration, price=instance.price,
+        ).exists()
+
+
+@receiver(post_save, sender=Service)
+def service_saved(sender, instance, **kwargs):
+    if instance.__dict__.pop('_stats_changed', False):
+        refresh_booking_stats(Booking.objects.filter(services=instance).values('pk'))
+
+
+@receiver(m2m_changed, sender=Employee.services.through)
+def employee_services_changed(sender, instance, action, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # instance is an Employee or, for service.employees.add(...), a Service;
+    # both belong to the same business
+    Business.touch_content(instance.business_id)
+    bump_business_version(instance.business_id)
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, **kwargs):
+    bump_business_version(instance.business_id)
+    if not created:
+        # Status changes; new bookings get their slots afterwards
+        refresh_booking_stats([instance.pk])
+
+
+@receiver(pre_delete, sender=Booking)
+def booking_deleting(sender, instance, **kwargs):
+    instance._stats_cells = booking_cells([instance.pk])
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    bump_business_version(instance.business_id)
+    refresh_cells(instance.__dict__.pop('_stats_cells', set()))
+
+
+def _old_row(instance, *fields):
+    """The saved values of fields before an update, None for a new row"""
+    if instance._state.adding:
+        return None
+    return type(instance).objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(pre_save, sender=TimeOff)
+def time_off_saving(sender, instance, **kwargs):
+    # Days the time off no longer covers need their snapshots rebuilt too
+    instance._old_range = _old_row(instance, 'start_date', 'end_date')
+
+
+@receiver(post_save, sender=TimeOff)
+@receiver(post_delete, sender=TimeOff)
+def time_off_changed(sender, instance, **kwargs):
+    bump_business_version(instance.business_id)
+    if _deleting_business(kwargs.get('origin')):
+        return
+    first, last = snapshot_window()
+    ranges = [(instance.start_date, instance.end_date)]
+    old = instance.__dict__.pop('_old_range', None)
+    if old is not None:
+        ranges.append(old)
+    days = set()
+    for start, end in ranges:
+        start, end = max(start, first), min(end, last)
+        days.update(start + timedelta(days=i) for i in range((end - start).days + 1))
+    mark_dirty(instance.business_id, days)
+
+
+@receiver(pre_save, sender=Shift)
+def shift_saving(sender, instance, **kwargs):
+    instance._old_day_of_week = _old_row(instance, 'day_of_week')
+
+
+@receiver(post_save, sender=Shift)
+@receiver(post_delete, sender=Shift)
+def shift_changed(sender, instance, **kwargs):
+    if _deleting_business(kwargs.get('origin')):
+        return
+    days = set(weekly_dates(instance.day_of_week, *snapshot_window()))
+    old = instance.__dict__.pop('_old_day_of_week', None)
+    if old is not None and old[0] != instance.day_of_week:
+        days.update(weekly_dates(old[0], *snapshot_window()))
+    mark_dirty(instance.business_id, days)
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def time_slot_changed(sender, instance, **kwargs):
+    shift = instance._state.fields_cache.get('shift')
+    if shift is not None:
+        business_id = shift.business_id
+    else:
+        business_id = Shift.objects.filter(pk=instance.shift_id).values_list('business_id', flat=True).first()
+    if business_id is not None:
+        bump_business_version(business_id)
+        if not _deleting_business(kwargs.get('origin')):
+            mark_dirty(business_id, [instance.date])
+
+
+def _sync_booking_starts(booking_ids):
+    for booking in Booking.objects.filter(pk__in=booking_ids):
+        booking.sync_start()
+
+
+@receiver(pre_save, sender=TimeSlot)
+def time_slot_saving(sender, instance, **kwargs):
+    instance._old_start = _old_row(instance, 'date', 'start_time')
+
+
+@receiver(post_save, sender=TimeSlot)
+def time_slot_saved(sender, instance, **kwargs):
+    old = instance.__dict__.pop('_old_start', None)
+    if old is not None and old != (instance.date, instance.start_time):
+        # Moving a slot can move the start of the bookings holding it
+        _sync_booking_starts(BookingSlot.objects.filter(timeslot_id=instance.pk).values('booking_id'))
+
+
+@receiver(pre_delete, sender=TimeSlot)
+def time_slot_deleting(sender, instance, **kwargs):
+    if not _deleting_business(kwargs.get('origin')):
+        # The delete cascades to the booking links without an m2m_changed
+        instance._booking_ids = list(
+            BookingSlot.objects.filter(timeslot_id=instance.pk).values_list('booking_id', flat=True)
+        )
+
+
+@receiver(post_delete, sender=TimeSlot)
+def time_slot_deleted(sender, instance, **kwargs):
+    booking_ids = instance.__dict__.pop('_booking_ids', None)
+    if booking_ids:
+        _sync_booking_starts(booking_ids)
+        employee_id = Shift.objects.filter(pk=instance.shift_id).values_list('employee_id', flat=True).first()
+        refresh_booking_stats(booking_ids, [(employee_id, instance.date)])
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def time_slot_bitmap_changed(sender, instance, signal, **kwargs):
+    if settings.DAY_AVAILABILITY_BITMAPS:
+        apply_slot(instance, deleted=signal is post_delete)
+
+
+@receiver(m2m_changed, sender=Booking.time_slots.through)
+def booking_time_slots_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # booking.time_slots.add/remove/set/clear
+        if action in ('pre_remove', 'pre_clear'):
+            # Cells the booking is leaving still need their stats updated
+            instance._stats_cells = booking_cells([instance.pk])
+        elif action in ('post_add', 'post_remove', 'post_clear'):
+            instance.sync_start()
+            bump_business_version(instance.business_id)
+            refresh_booking_stats([instance.pk], instance.__dict__.pop('_stats_cells', ()))
+        return
+
+    # slot.bookings.add/remove/clear
+    if action == 'pre_clear':
+        instance._cleared_booking_ids = list(instance.bookings.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        booking_ids = pk_set if action != 'post_clear' else instance.__dict__.pop('_cleared_booking_ids', [])
+        for booking in Booking.objects.filter(pk__in=booking_ids):
+            booking.sync_start()
+            bump_business_version(booking.business_id)
+        employee_id = Shift.objects.filter(pk=instance.shift_id).values_list('employee_id', flat=True).first()
+        refresh_booking_stats(booking_ids, [(employee_id, instance.date)])
+
+
+@receiver(m2m_changed, sender=Booking.services.through)
+def booking_services_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Minutes and revenue come from the booking's services
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            refresh_booking_stats([instance.pk])
+        return
+
+    # service.bookings.add/remove/clear
+    if action == 'pre_clear':
+        instance._cleared_booking_ids = list(instance.bookings.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        booking_ids = pk_set if action != 'post_clear' else instance.__dict__.pop('_cleared_booking_ids', [])
+        refresh_booking_stats(booking_ids)
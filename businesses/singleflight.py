@@ -0,0 +1,152 @@
+"""
+Coalescing of identical concurrent computations within a process.
+
+When many customers open the same business for the same day at once, each
+request would compute the same availability. A Group runs one computation
+per key at a time: the first caller computes, callers arriving with the
+same key while it runs wait for it and get the same result (or exception).
+Nothing is kept once the computation finishes, so this is not a cache and
+never serves stale data beyond what was already in flight.
+
+    AVAILABLE_SLOTS = singleflight.group('available-slots')
+    slots = AVAILABLE_SLOTS.do((business_id, employee_id, day, duration), compute)
+
+do() is for threads, and covers the sync availability views under both
+servers: WSGI serves each request on a worker thread, and Django's ASGI
+handler gives each request a ThreadSensitiveContext, so its sync code runs
+on a thread of its own and concurrent requests meet in do() there too.
+Sync code run with sync_to_async outside such a context shares a single
+thread and never overlaps, so it gets nothing from do(). ado() is for
+async views (the project has none yet); it shares a task per event loop
+instead of blocking the loop. Results are shared between callers and must
+not be mutated.
+
+Keys should be normalised (ints, dates, sorted tuples) so equivalent
+requests meet, and include anything that changes the result, such as the
+database the request reads from. stats() reports, per group and per
+process, how many calls shared another call's computation.
+"""
+import asyncio
+import threading
+import weakref
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'error', 'waiting')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiting = 0
+
+
+class _Task:
+    __slots__ = ('task', 'waiting')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiting = 0
+
+
+class Group:
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = weakref.WeakKeyDictionary()
+        self.calls = 0
+        self.executions = 0
+        self.errors = 0
+        self.max_waiting = 0
+
+    def _count(self, call, leader):
+        self.calls += 1
+        if leader:
+            self.executions += 1
+        else:
+            call.waiting += 1
+            self.max_waiting = max(self.max_waiting, call.waiting)
+
+    def do(self, key, func):
+        """Return func(), shared with the calls for the same key in flight in other threads"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self._count(call, leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func()
+        except BaseException as exc:
+            call.error = exc
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    async def ado(self, key, func):
+        """Await func(), shared with the coroutines awaiting the same key on this event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = self._tasks.setdefault(loop, {})
+            flight = tasks.get(key)
+            leader = flight is None
+            if leader:
+                flight = tasks[key] = _Task(loop.create_task(func()))
+                flight.task.add_done_callback(lambda done: self._finished(tasks, key, done))
+            self._count(flight, leader)
+        # A cancelled caller must not cancel the computation the others wait for
+        return await asyncio.shield(flight.task)
+
+    def _finished(self, tasks, key, task):
+        with self._lock:
+            tasks.pop(key, None)
+            if not task.cancelled() and task.exception() is not None:
+                self.errors += 1
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls) + sum(len(tasks) for tasks in self._tasks.values())
+            return {
+                'calls': self.calls,
+                'executions': self.executions,
+                'coalesced': self.calls - self.executions,
+                'coalescing_ratio': (self.calls - self.executions) / self.calls if self.calls else 0.0,
+                'errors': self.errors,
+                'in_flight': in_flight,
+                'max_waiting': self.max_waiting,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls = self.executions = self.errors = self.max_waiting = 0
+
+
+def group(name):
+    """The process-wide group with this name"""
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = Group(name)
+        return _groups[name]
+
+
+def stats():
+    """{group name: counters} for every group in this process"""
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {g.name: g.stats() for g in groups}
@@ -0,0 +1,262 @@
+"""
+Public availability written to disk as static JSON.
+
+Each business gets one file per day under AVAILABILITY_SNAPSHOT_DIR:
+
+    <dir>/<business_id>/<YYYY-MM-DD>.json
+
+holding the day's available slots in the shape of
+/api/businesses/{id}/available-slots, with time off already subtracted, so
+the web tier can serve anonymous availability without reaching Django.
+Files are written to a temporary file in the same directory and moved into
+place with os.replace(), so a reader sees either the old or the new file,
+never a partial one.
+
+Signals mark (business, date) pairs in SnapshotDirtyDay when slots,
+bookings, shifts or time off change; build_dirty() rewrites only those
+days. build_all() rewrites the whole window, AVAILABILITY_SNAPSHOT_DAYS
+days from today.
+
+The window moves every midnight without anything being marked, so the
+last day built for all businesses is kept in <dir>/.window. When the
+window has moved past it, build_dirty() first writes the days that
+entered the window and removes the ones that left it, so running it
+(build_availability_snapshots --watch) is enough to keep the files
+current.
+"""
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from api.renderers import json_dumps
+
+from .availability import BlockedTime
+from .models import Business, SnapshotDirtyDay, TimeSlot
+from .sharding import for_business
+
+
+def snapshot_window(today=None):
+    today = today or timezone.now().date()
+    return today, today + timedelta(days=settings.AVAILABILITY_SNAPSHOT_DAYS - 1)
+
+
+def snapshot_path(business_id, day):
+    return Path(settings.AVAILABILITY_SNAPSHOT_DIR) / str(business_id) / f'{day.isoformat()}.json'
+
+
+def mark_dirty(business_id, dates):
+    """Queue the business's days inside the snapshot window for a rebuild"""
+    first, last = snapshot_window()
+    now = timezone.now()
+    rows = [
+        SnapshotDirtyDay(business_id=business_id, date=day, marked_at=now)
+        for day in set(dates)
+        if first <= day <= last
+    ]
+    if rows:
+        # A day marked again while it is being built keeps its newer mark
+        SnapshotDirtyDay.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['business', 'date'],
+            update_fields=['marked_at'],
+        )
+
+
+def write_atomic(path, data):
+    """Write bytes to path so readers never see a partly written file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def day_payloads(business_id, dates):
+    """{date: snapshot dict} for the business's dates, from one slot query"""
+    dates = sorted(set(dates))
+    payloads = {
+        day: {'business_id': business_id, 'date': day, 'generated_at': timezone.now(), 'slots': []}
+        for day in dates
+    }
+    if not dates:
+        return payloads
+
+    slots = defaultdict(list)
+    rows = TimeSlot.objects.filter(
+        shift__business_id=business_id,
+        date__in=dates,
+        is_available=True,
+    ).order_by('date', 'start_time').values_list(
+        'id', 'date', 'start_time', 'end_time', 'shift_id', 'shift__employee_id'
+    )
+    blocked = BlockedTime(business_id, dates[0], dates[-1])
+    for slot_id, day, start_time, end_time, shift_id, employee_id in rows:
+        if blocked and blocked.is_blocked(employee_id, day, start_time, end_time):
+            continue
+        slots[day].append({
+            'id': slot_id,
+            'date': day,
+            'start_time': start_time.strftime('%H:%M'),
+            'end_time': end_time.strftime('%H:%M'),
+            'is_available': True,
+            'shift_id': shift_id,
+            'employee_id': employee_id,
+            'business_id': business_id,
+        })
+    for day, day_slots in slots.items():
+        payloads[day]['slots'] = day_slots
+    return payloads
+
+
+def build_days(business_id, dates):
+    """Rewrite the business's files for the dates, returns (files, bytes) written"""
+    files = written = 0
+    with for_business(business_id):
+        payloads = day_payloads(business_id, dates)
+    for day, payload in payloads.items():
+        data = json_dumps(payload)
+        write_atomic(snapshot_path(business_id, day), data)
+        files += 1
+        written += len(data)
+    return files, written
+
+
+def prune(business_id, today=None):
+    """Remove the business's files for days before today"""
+    directory = Path(settings.AVAILABILITY_SNAPSHOT_DIR) / str(business_id)
+    cutoff = f'{(today or timezone.now().date()).isoformat()}.json'
+    removed = 0
+    if directory.is_dir():
+        for path in directory.glob('*.json'):
+            if path.name < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+    return removed
+
+
+def _window_file():
+    return Path(settings.AVAILABILITY_SNAPSHOT_DIR) / '.window'
+
+
+def built_through():
+    """The last day of the window built for every business, None before the first build"""
+    try:
+        return date.fromisoformat(_window_file().read_text().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _record_window(last):
+    write_atomic(_window_file(), last.isoformat().encode())
+
+
+class BuildStats:
+    def __init__(self):
+        self.businesses = 0
+        self.files = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+
+    def add(self, files, written):
+        self.businesses += 1
+        self.files += files
+        self.bytes += written
+
+    @property
+    def seconds(self):
+        return time.monotonic() - self.started
+
+    def __str__(self):
+        seconds = self.seconds or 1e-9
+        return (
+            f"{self.files} files for {self.businesses} businesses in {self.seconds:.2f}s "
+            f"({self.files / seconds:.0f} files/s, {self.bytes / seconds / 1024:.0f} KB/s)"
+        )
+
+
+def build_all(business_ids=None):
+    """
+    Rewrite every file in the window for the active businesses. A rebuild
+    of all businesses also removes the files of inactive or deleted ones.
+    """
+    first, last = snapshot_window()
+    dates = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+    businesses = Business.objects.filter(is_active=True)
+    if business_ids is not None:
+        businesses = businesses.filter(pk__in=business_ids)
+
+    stats = BuildStats()
+    marked = timezone.now()
+    built = list(businesses.values_list('pk', flat=True))
+    for business_id in built:
+        stats.add(*build_days(business_id, dates))
+        prune(business_id, first)
+
+    root = Path(settings.AVAILABILITY_SNAPSHOT_DIR)
+    if business_ids is None and root.is_dir():
+        keep = {str(business_id) for business_id in built}
+        for directory in root.iterdir():
+            # Only business directories, in case the setting points somewhere shared
+            if directory.is_dir() and directory.name.isdigit() and directory.name not in keep:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    # Everything marked before the build started is covered by it
+    SnapshotDirtyDay.objects.filter(business_id__in=built, marked_at__lte=marked).delete()
+    if business_ids is None:
+        _record_window(last)
+    return stats
+
+
+def _roll_window(stats):
+    """Write the days that entered the window since the last build, prune the ones that left"""
+    first, last = snapshot_window()
+    through = built_through()
+    if through is not None and through >= last:
+        return
+    start = first if through is None else max(first, through + timedelta(days=1))
+    dates = [start + timedelta(days=i) for i in range((last - start).days + 1)]
+    for business_id in Business.objects.filter(is_active=True).values_list('pk', flat=True):
+        stats.add(*build_days(business_id, dates))
+        prune(business_id, first)
+    _record_window(last)
+
+
+def build_dirty(limit=None):
+    """
+    Rewrite the files of the days marked dirty, clearing their marks, after
+    catching up with the days the window moved onto
+    """
+    first, last = snapshot_window()
+    started = timezone.now()
+    dirty = SnapshotDirtyDay.objects.order_by('marked_at').values_list('pk', 'business_id', 'date')
+    if limit:
+        dirty = dirty[:limit]
+
+    by_business = defaultdict(list)
+    pks = []
+    for pk, business_id, day in dirty:
+        by_business[business_id].append(day)
+        pks.append(pk)
+
+    stats = BuildStats()
+    _roll_window(stats)
+    active = set(Business.objects.filter(pk__in=by_business, is_active=True).values_list('pk', flat=True))
+    for business_id, dates in by_business.items():
+        if business_id in active:
+            stats.add(*build_days(business_id, [day for day in dates if first <= day <= last]))
+    # Days marked again since the build started stay dirty for the next run
+    SnapshotDirtyDay.objects.filter(pk__in=pks, marked_at__lte=started).delete()
+    return stats
@@ -0,0 +1,148 @@
+"""
+EmployeeDailyStats maintenance.
+
+Stats are kept per (employee, date) "cell". When a booking changes, only
+the cells its time slots fall in are recomputed (refresh_cells); the
+rebuild_employee_stats command recomputes whole date ranges with
+rebuild_stats(), streaming the booking rows in chunks. Readers aggregate
+the rollup rows, so their cost depends on the number of days rather than
+the number of bookings.
+"""
+import operator
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+
+from django.db import router, transaction
+from django.db.models import Max, Min, Q, Sum
+
+from .models import Booking, EmployeeDailyStats
+
+BookingSlot = Booking.time_slots.through
+BookingService = Booking.services.through
+
+CHUNK_SIZE = 2000
+
+
+def booking_cells(booking_ids):
+    """(employee_id, date) cells the bookings' time slots fall in"""
+    return set(
+        BookingSlot.objects.filter(booking_id__in=booking_ids)
+        .values_list('timeslot__shift__employee_id', 'timeslot__date')
+        .distinct()
+    )
+
+
+def _cells_q(cells, employee_field, date_field):
+    by_date = defaultdict(set)
+    for employee_id, day in cells:
+        by_date[day].add(employee_id)
+    return reduce(operator.or_, (
+        Q(**{date_field: day, f'{employee_field}__in': employee_ids})
+        for day, employee_ids in by_date.items()
+    ))
+
+
+def compute_stats(slot_filter, chunk_size=CHUNK_SIZE):
+    """
+    Unsaved EmployeeDailyStats keyed by (employee_id, date) for the booked
+    slots matching slot_filter (a Q on the booking/time slot through table).
+    """
+    rows = (
+        BookingSlot.objects.filter(slot_filter)
+        .values_list('booking_id', 'booking__status', 'booking__business_id',
+                     'timeslot__shift__employee_id', 'timeslot__date')
+        .distinct()
+    )
+
+    cells = {}
+    # Minutes and revenue go to the booking's first cell only
+    first_cell = {}
+    for booking_id, status, business_id, employee_id, day in rows.iterator(chunk_size=chunk_size):
+        key = (employee_id, day)
+        stats = cells.get(key)
+        if stats is None:
+            stats = cells[key] = EmployeeDailyStats(business_id=business_id, employee_id=employee_id, date=day)
+        stats.bookings += 1
+        if status == 'completed':
+            stats.completed += 1
+        elif status == 'cancelled':
+            stats.cancelled += 1
+            continue
+        if booking_id not in first_cell or day < first_cell[booking_id][1]:
+            first_cell[booking_id] = key
+
+    booking_ids = list(first_cell)
+    for i in range(0, len(booking_ids), chunk_size):
+        totals = (
+            BookingService.objects.filter(booking_id__in=booking_ids[i:i + chunk_size])
+            .values('booking_id')
+            .annotate(minutes=Sum('service__duration'), revenue=Sum('service__price'))
+            .values_list('booking_id', 'minutes', 'revenue')
+        )
+        for booking_id, minutes, revenue in totals:
+            stats = cells[first_cell[booking_id]]
+            stats.booked_minutes += minutes or 0
+            stats.revenue += revenue or 0
+
+    return cells
+
+
+STAT_FIELDS = ['business', 'bookings', 'completed', 'cancelled', 'booked_minutes', 'revenue', 'updated_at']
+
+
+def refresh_cells(cells):
+    """
+    Recompute the stats rows for the given (employee_id, date) cells. Rows
+    are upserted rather than deleted and recreated, so two refreshes of the
+    same cell racing cannot both insert it.
+    """
+    if not cells:
+        return
+    stats = compute_stats(_cells_q(cells, 'timeslot__shift__employee_id', 'timeslot__date'))
+    empty = set(cells) - set(stats)
+    with transaction.atomic(using=router.db_for_write(EmployeeDailyStats)):
+        if empty:
+            EmployeeDailyStats.objects.filter(_cells_q(empty, 'employee_id', 'date')).delete()
+        EmployeeDailyStats.objects.bulk_create(
+            stats.values(), update_conflicts=True, unique_fields=['employee', 'date'], update_fields=STAT_FIELDS,
+        )
+
+
+def refresh_booking_stats(booking_ids, extra_cells=()):
+    """Recompute the cells of the given bookings, plus cells they were just removed from"""
+    refresh_cells(booking_cells(booking_ids) | set(extra_cells))
+
+
+def booked_date_range(business_id=None):
+    slots = BookingSlot.objects.all()
+    if business_id is not None:
+        slots = slots.filter(booking__business_id=business_id)
+    bounds = slots.aggregate(first=Min('timeslot__date'), last=Max('timeslot__date'))
+    return bounds['first'], bounds['last']
+
+
+def rebuild_stats(date_from, date_to, business_id=None, chunk_days=31, chunk_size=CHUNK_SIZE):
+    """
+    Recompute every stats row between date_from and date_to, chunk_days at
+    a time. Yields (chunk start, chunk end, rows written) after each chunk.
+    """
+    start = date_from
+    while start <= date_to:
+        end = min(start + timedelta(days=chunk_days - 1), date_to)
+        slot_filter = Q(timeslot__date__range=(start, end))
+        existing = EmployeeDailyStats.objects.filter(date__range=(start, end))
+        if business_id is not None:
+            slot_filter &= Q(booking__business_id=business_id)
+            existing = existing.filter(business_id=business_id)
+
+        stats = compute_stats(slot_filter, chunk_size=chunk_size)
+        with transaction.atomic(using=router.db_for_write(EmployeeDailyStats)):
+            existing.delete()
+            # A booking refreshing its cells meanwhile may have written some
+            EmployeeDailyStats.objects.bulk_create(
+                stats.values(), batch_size=chunk_size,
+                update_conflicts=True, unique_fields=['employee', 'date'], update_fields=STAT_FIELDS,
+            )
+        yield start, end, len(stats)
+        start = end + timedelta(days=1)
@@ -1,3 +1,1309 @@
-from django.test import TestCase
+from datetime import date, time, timedelta
+import asyncio
+import json
+import smtplib
+import tempfile
+import threading
+import time as time_module
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection, router as db_router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from api import throttling
+from authentication.authentication import ClaimsJWTAuthentication
+from authentication.claims import BUSINESS_OWNERS_GROUP, ClaimsRefreshToken
+
+from . import analytics, availability, bitmaps, hours, idempotency, notifications, outbox, recurrence, replicas, sharding, singleflight, snapshots
+from .cache import business_cache_key, cached_for_business
+from .middleware import ReplicaStickyMiddleware
+from .owner import OwnerContext
+from .jobs import claim_next_job, enqueue_slot_generation, generate_missing_slots, next_month_range, run_job, shift_dates
+from .models import Business, Service, Employee, Shift, ShiftException, TimeSlot, Booking, SlotGenerationJob, EmployeeDailyStats, TimeOff, DayAvailability, SnapshotDirtyDay, OutboxEvent, Notification, IdempotencyKey
+
+
+def create_business(owner, name, services=2, employees=2, bookings_today=1):
+    business = Business.objects.create(
+        owner=owner,
+        name=name,
+        description='Test business',
+        main_image='business/main/test.jpg',
+        address='123 Test St',
+        phone='123-456-7890',
+        email=f'{name.lower().replace(" ", "")}@example.com',
+    )
+    for i in range(services):
+        Service.objects.create(business=business, name=f'Service {i}', description='', price=10, duration=30)
+    staff = [Employee.objects.create(business=business, name=f'Employee {i}') for i in range(employees)]
+
+    today = timezone.now().date()
+    shift = Shift(business=business, employee=staff[0], day_of_week=(today.weekday() + 1) % 7,
+                  start_time=time(9, 0), end_time=time(17, 0))
+    shift.save()
+    for i in range(bookings_today):
+        slot = TimeSlot.objects.create(shift=shift, date=today, start_time=time(9 + i, 0),
+                                       end_time=time(9 + i, 30), is_available=False)
+        booking = Booking.objects.create(business=business, customer=owner)
+        booking.time_slots.add(slot)
+    return business
+
+
+class BusinessAdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:businesses_business_changelist')
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for i in range(2):
+            owner = User.objects.create_user(f'owner{i}')
+            create_business(owner, f'Business {i}')
+        _, small = self.changelist_queries()
+
+        for i in range(2, 12):
+            owner = User.objects.create_user(f'owner{i}')
+            create_business(owner, f'Business {i}')
+        _, large = self.changelist_queries()
+
+        self.assertEqual(small, large)
+
+    def test_counts_use_slot_dates(self):
+        owner = User.objects.create_user('owner')
+        business = create_business(owner, 'Salon', services=3, employees=2, bookings_today=2)
+        # A booking on another day isn't counted as today's (the shift
+        # generated tomorrow's slots when it was saved)
+        slot = TimeSlot.objects.get(shift__business=business, date=timezone.now().date() + timedelta(days=1),
+                                    start_time=time(15, 0))
+        Booking.objects.create(business=business, customer=owner).time_slots.add(slot)
+
+        response, _ = self.changelist_queries()
+        self.assertContains(response, '3 Services')
+        self.assertContains(response, '2 Staff')
+        self.assertContains(response, '2 Today')
+
+
+class BookingAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+
+    def test_start_date_follows_time_slots(self):
+        business = create_business(self.admin, 'Salon', bookings_today=1)
+        booking = business.bookings.get()
+        self.assertEqual(booking.start_date, timezone.now().date())
+        self.assertEqual(booking.start_time, time(9, 0))
+
+        booking.time_slots.clear()
+        booking.refresh_from_db()
+        self.assertIsNone(booking.start_date)
+
+    def test_start_date_follows_slot_edits_and_deletes(self):
+        business = create_business(self.admin, 'Salon', bookings_today=1)
+        booking = business.bookings.get()
+        first = booking.time_slots.get()
+        later = TimeSlot.objects.create(shift=first.shift, date=first.date, start_time=time(11, 0),
+                                        end_time=time(11, 30), is_available=False)
+        booking.time_slots.add(later)
+
+        first.start_time, first.end_time = time(12, 0), time(12, 30)
+        first.save()
+        booking.refresh_from_db()
+        self.assertEqual(booking.start_time, time(11, 0))
+
+        later.delete()
+        booking.refresh_from_db()
+        self.assertEqual(booking.start_time, time(12, 0))
+
+    def test_changelist_query_count_does_not_grow_with_rows(self):
+        url = reverse('admin:businesses_booking_changelist')
+        create_business(self.admin, 'Salon', bookings_today=2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+
+        owner = User.objects.create_user('owner')
+        create_business(owner, 'Barber', bookings_today=6)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(small), len(large))
+
+    def test_change_form_does_not_render_every_slot(self):
+        business = create_business(self.admin, 'Salon', bookings_today=1)
+        booking = business.bookings.get()
+        response = self.client.get(reverse('admin:businesses_booking_change', args=[booking.pk]))
+        self.assertEqual(response.status_code, 200)
+        # Autocomplete renders only the selected slot, not the shift's
+        # generated slots for the coming week
+        self.assertContains(response, '09:00 to 09:30')
+        self.assertNotContains(response, '15:00 to 15:30')
+
+
+class TimeSlotAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:businesses_timeslot_changelist')
+
+    def test_filters_by_business_and_date_range(self):
+        salon = create_business(self.admin, 'Salon', bookings_today=2)
+        create_business(User.objects.create_user('owner'), 'Barber', bookings_today=3)
+
+        response = self.client.get(self.url, {'business': salon.pk, 'date_range': 'today'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+    @override_settings(ADMIN_COUNT_LIMIT=5)
+    def test_count_stops_at_limit(self):
+        create_business(self.admin, 'Salon')
+        self.assertGreater(TimeSlot.objects.count(), 5)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+
+class SlotGenerationJobTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.business = create_business(self.admin, 'Salon')
+        self.shift = Shift.objects.get(business=self.business)
+
+    def test_admin_action_only_queues_a_job(self):
+        slots_before = TimeSlot.objects.count()
+        response = self.client.post(reverse('admin:businesses_shift_changelist'), {
+            'action': 'generate_time_slots_for_next_month',
+            '_selected_action': [self.shift.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        job = SlotGenerationJob.objects.get()
+        self.assertEqual((job.status, job.shift_ids, job.total_shifts), ('pending', [self.shift.pk], 1))
+        self.assertEqual(TimeSlot.objects.count(), slots_before)
+
+    def test_run_job_adds_missing_slots_only(self):
+        start_date, end_date = next_month_range()
+        job = enqueue_slot_generation([self.shift.pk], start_date, end_date)
+        self.assertEqual(claim_next_job(), job)
+        self.assertIsNone(claim_next_job())
+
+        job = run_job(job)
+        dates = list(shift_dates(self.shift, start_date, end_date))
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual((job.processed_shifts, job.progress), (1, 100))
+        # 09:00-17:00 in 30 minute slots
+        self.assertEqual(job.slots_created, 16 * len(dates))
+        self.assertTrue(all(date.weekday() == self.shift.day_of_week for date in dates))
+
+        # Running it again keeps the existing slots
+        slot_ids = set(TimeSlot.objects.filter(date__in=dates).values_list('pk', flat=True))
+        job = run_job(enqueue_slot_generation([self.shift.pk], start_date, end_date))
+        self.assertEqual(job.slots_created, 0)
+        self.assertEqual(set(TimeSlot.objects.filter(date__in=dates).values_list('pk', flat=True)), slot_ids)
+
+    def test_granularity_change_does_not_overlap_existing_slots(self):
+        start_date, end_date = next_month_range()
+        day = next(shift_dates(self.shift, start_date, end_date))
+        TimeSlot.objects.bulk_create(self.shift.build_time_slots(day))
+        self.business.slot_granularity = 15
+        self.business.save()
+        self.shift.refresh_from_db()
+
+        generate_missing_slots(self.shift, start_date, end_date)
+        # The 30 minute slots stay and nothing is added between them
+        slots = list(TimeSlot.objects.filter(shift=self.shift, date=day).order_by('start_time')
+                     .values_list('start_time', 'end_time'))
+        self.assertEqual(len(slots), 16)
+        self.assertTrue(all(end <= next_start for (_, end), (next_start, _) in zip(slots, slots[1:])))
+        # Days without slots get the new granularity
+        other_day = next(date for date in shift_dates(self.shift, start_date, end_date) if date != day)
+        self.assertEqual(TimeSlot.objects.filter(shift=self.shift, date=other_day).count(), 32)
+
+    def test_slots_a_concurrent_job_created_are_not_counted(self):
+        start_date, end_date = next_month_range()
+        day = next(shift_dates(self.shift, start_date, end_date))
+        build_time_slots = self.shift.build_time_slots
+
+        def build_racing(date):
+            slots = build_time_slots(date)
+            if date == day:
+                # The other job inserts its first slot after the existing ones were read
+                TimeSlot.objects.create(shift=self.shift, date=day, start_time=slots[0].start_time,
+                                        end_time=slots[0].end_time)
+            return slots
+
+        with mock.patch.object(self.shift, 'build_time_slots', build_racing):
+            created = generate_missing_slots(self.shift, start_date, end_date)
+        dates = list(shift_dates(self.shift, start_date, end_date))
+        self.assertEqual(created, 16 * len(dates) - 1)
+        self.assertEqual(TimeSlot.objects.filter(shift=self.shift, date__in=dates).count(), 16 * len(dates))
+
+
+@override_settings(DASHBOARD_CACHE_TIMEOUT=30)
+class OwnerDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner')
+        self.owner.groups.add(Group.objects.get_or_create(name=BUSINESS_OWNERS_GROUP)[0])
+        self.url = '/api/my-business/dashboard'
+
+    def get_dashboard(self):
+        # Issued after the business exists so it carries the business claim
+        token = ClaimsRefreshToken.for_user(self.owner).access_token
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_query_count_does_not_grow_with_bookings(self):
+        create_business(self.owner, 'Salon', employees=1, bookings_today=1)
+        with override_settings(DASHBOARD_CACHE_TIMEOUT=0):
+            data, small = self.get_dashboard()
+            self.assertEqual(data['summary']['today_bookings'], 1)
+
+            business = Business.objects.get()
+            for i in range(3):
+                employee = Employee.objects.create(business=business, name=f'Extra {i}')
+                shift = Shift.objects.create(business=business, employee=employee, day_of_week=0,
+                                             start_time=time(9, 0), end_time=time(10, 0))
+                slot = TimeSlot.objects.create(shift=shift, date=timezone.now().date(), start_time=time(12, 0),
+                                               end_time=time(12, 30), is_available=False)
+                Booking.objects.create(business=business, customer=self.owner).time_slots.add(slot)
+            data, large = self.get_dashboard()
+
+        self.assertEqual(small, large)
+        self.assertEqual(data['summary']['today_bookings'], 4)
+        self.assertEqual(len(data['today']), 4)
+        self.assertEqual(len(data['employees']), 4)
+
+    def test_cached_until_bookings_change(self):
+        business = create_business(self.owner, 'Salon', bookings_today=1)
+        data, _ = self.get_dashboard()
+        _, cached = self.get_dashboard()
+        self.assertEqual(data['summary']['today_bookings'], 1)
+
+        slot = TimeSlot.objects.filter(shift__business=business, is_available=True).first()
+        Booking.objects.create(business=business, customer=self.owner).time_slots.add(slot)
+        data, fresh = self.get_dashboard()
+        self.assertLess(cached, fresh)
+        self.assertEqual(data['summary']['upcoming_bookings'], 2)
+
+
+class OwnerContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Resolving the business activates its shard, as a request would
+        self.addCleanup(sharding.deactivate, sharding.activate_business(None))
+        self.owner = User.objects.create_user('owner')
+        self.owner.groups.add(Group.objects.get_or_create(name=BUSINESS_OWNERS_GROUP)[0])
+
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {ClaimsRefreshToken.for_user(user).access_token}'}
+
+    def claims_context(self):
+        backend = ClaimsJWTAuthentication()
+        request = RequestFactory().get('/')
+        request.user = backend.get_user(backend.get_validated_token(self.auth(self.owner)['HTTP_AUTHORIZATION'][7:]))
+        return OwnerContext(request)
+
+    def test_business_is_loaded_once_per_request(self):
+        business = create_business(self.owner, 'Salon')
+        request = RequestFactory().get('/')
+        request.user = self.owner
+        context = OwnerContext(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(context.business, business)
+            self.assertEqual(context.business, business)
+
+    def test_customers_get_403_and_owners_without_a_business_404(self):
+        customer = User.objects.create_user('customer')
+        response = self.client.get('/api/my-business/schedule', **self.auth(customer))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/api/my-business/schedule', **self.auth(self.owner))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/businesses/employees/', **self.auth(self.owner))
+        self.assertEqual((response.status_code, response.json()), (404, {'error': 'No business found for this user'}))
+
+    @override_settings(OWNER_BUSINESS_CACHE_TIMEOUT=60)
+    def test_cached_business_is_dropped_when_its_content_changes(self):
+        business = create_business(self.owner, 'Salon')
+        version = self.claims_context().business.content_version
+        with self.assertNumQueries(0):
+            self.assertEqual(self.claims_context().business.content_version, version)
+
+        Business.touch_content(business.pk)
+        self.assertEqual(self.claims_context().business.content_version, version + 1)
+
+
+class EmployeeDailyStatsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.business = create_business(self.owner, 'Salon', bookings_today=2)
+        self.service = self.business.services.first()
+        for booking in self.business.bookings.all():
+            booking.services.add(self.service)
+        self.employee = Shift.objects.get(business=self.business).employee
+        self.today = timezone.now().date()
+
+    def stats_row(self):
+        return EmployeeDailyStats.objects.values(
+            'bookings', 'completed', 'cancelled', 'booked_minutes', 'revenue'
+        ).get(employee=self.employee, date=self.today)
+
+    def test_maintained_on_booking_changes(self):
+        self.assertEqual(self.stats_row(), {
+            'bookings': 2, 'completed': 0, 'cancelled': 0, 'booked_minutes': 60, 'revenue': 20,
+        })
+
+        first, second = self.business.bookings.order_by('pk')
+        first.cancel()
+        second.status = 'completed'
+        second.save()
+        self.assertEqual(self.stats_row(), {
+            'bookings': 2, 'completed': 1, 'cancelled': 1, 'booked_minutes': 30, 'revenue': 10,
+        })
+
+        first.delete()
+        second.time_slots.clear()
+        self.assertFalse(EmployeeDailyStats.objects.exists())
+
+    def test_rebuild_matches_incremental(self):
+        self.business.bookings.first().cancel()
+        incremental = list(EmployeeDailyStats.objects.values_list(
+            'employee_id', 'date', 'bookings', 'cancelled', 'booked_minutes', 'revenue'))
+
+        EmployeeDailyStats.objects.all().delete()
+        call_command('rebuild_employee_stats', '--chunk-days', '1', stdout=StringIO())
+        rebuilt = list(EmployeeDailyStats.objects.values_list(
+            'employee_id', 'date', 'bookings', 'cancelled', 'booked_minutes', 'revenue'))
+        self.assertEqual(rebuilt, incremental)
+
+    def test_follows_service_edits_and_slot_deletes(self):
+        self.service.price = 25
+        self.service.save()
+        self.assertEqual(self.stats_row()['revenue'], 50)
+
+        # A refresh of cells that already have rows updates them in place
+        first, second = self.business.bookings.order_by('pk')
+        stats_id = EmployeeDailyStats.objects.get(employee=self.employee, date=self.today).pk
+        second.time_slots.get().delete()
+        self.assertEqual(EmployeeDailyStats.objects.get(pk=stats_id).bookings, 1)
+        first.time_slots.get().delete()
+        self.assertFalse(EmployeeDailyStats.objects.exists())
+
+
+@skipUnless(analytics.np is not None, 'NumPy is not installed')
+class OccupancyAnalyticsTests(TestCase):
+    def test_reports(self):
+        monday = date(2025, 6, 2)
+        # 09:00 booked, 09:30 and 10:00 free, 10:30 booked, 11:00 free
+        rows = [
+            (1, monday, time(9, 0), False),
+            (1, monday, time(9, 30), True),
+            (1, monday, time(10, 0), True),
+            (1, monday, time(10, 30), False),
+            (1, monday, time(11, 0), True),
+            (2, monday + timedelta(days=1), time(9, 0), True),
+        ]
+        occupancy = analytics.Occupancy.from_rows(rows, monday, monday + timedelta(days=1), employee_ids=[1, 2])
+
+        self.assertEqual(occupancy.utilisation()[1], {
+            'booked_minutes': 60, 'available_minutes': 150, 'utilisation': 0.4,
+        })
+        self.assertEqual(occupancy.utilisation()[2]['utilisation'], 0)
+        # Only the 09:30-10:30 run sits between two bookings
+        self.assertEqual(occupancy.idle_gaps()[1], {'gaps': 1, 'idle_minutes': 60, 'average_gap_minutes': 60.0})
+        self.assertEqual(occupancy.idle_gaps()[2]['gaps'], 0)
+        self.assertEqual(occupancy.heatmap()[0, 9], 0.5)
+        self.assertEqual(occupancy.peak_hours(top=1), [
+            {'day': 'Monday', 'hour': 10, 'utilisation': 0.5, 'booked_slots': 1},
+        ])
+        self.assertEqual(occupancy.monthly_utilisation()[1], {'2025-06': 0.4})
+
+
+class RecurrenceTests(TestCase):
+    def test_expand_applies_exceptions(self):
+        monday = date(2025, 6, 2)
+        shift = {'id': 1, 'employee_id': 7, 'business_id': 3, 'day_of_week': 2,
+                 'start_time': time(9, 0), 'end_time': time(17, 0)}
+        exceptions = {1: {
+            monday + timedelta(days=2): {'is_cancelled': True, 'start_time': None, 'end_time': None, 'note': ''},
+            monday + timedelta(days=9): {'is_cancelled': False, 'start_time': time(12, 0), 'end_time': None, 'note': ''},
+            monday + timedelta(days=12): {'is_cancelled': False, 'start_time': None, 'end_time': None, 'note': 'Cover'},
+        }}
+        occurrences = list(recurrence.expand([shift], monday, monday + timedelta(days=20), exceptions))
+
+        self.assertEqual([(o.date.day, o.start_time, o.is_one_off, o.is_override) for o in occurrences], [
+            (11, time(12, 0), False, True),
+            (14, time(9, 0), True, False),
+            (18, time(9, 0), False, False),
+        ])
+
+    def test_schedule_endpoint(self):
+        owner = User.objects.create_user('owner')
+        owner.groups.add(Group.objects.get_or_create(name=BUSINESS_OWNERS_GROUP)[0])
+        business = create_business(owner, 'Salon', bookings_today=0)
+        shift = Shift.objects.get(business=business)
+        date_from = timezone.now().date()
+        ShiftException.objects.create(shift=shift, date=date_from + timedelta(days=1), is_cancelled=True)
+        token = ClaimsRefreshToken.for_user(owner).access_token
+
+        response = self.client.get('/api/my-business/schedule', {
+            'date_from': date_from, 'date_to': date_from + timedelta(days=89),
+        }, HTTP_AUTHORIZATION=f'Bearer {token}')
+        dates = [row['specific_date'] for row in response.json()]
+        # 13 weekly occurrences in 90 days from tomorrow, one cancelled
+        self.assertEqual(len(dates), 12)
+        self.assertEqual(dates[0], str(date_from + timedelta(days=8)))
+
+
+class TimeOffTests(TestCase):
+    def test_interval_subtraction(self):
+        blocked = availability.merge([(600, 660), (540, 600), (900, 960)])
+        self.assertEqual(blocked, [(540, 660), (900, 960)])
+        self.assertEqual(availability.subtract([(480, 1020)], blocked), [(480, 540), (660, 900), (960, 1020)])
+        self.assertTrue(availability.overlaps(630, 690, blocked))
+        self.assertFalse(availability.overlaps(660, 900, blocked))
+
+    def test_closures_hide_slots_without_touching_them(self):
+        owner = User.objects.create_user('owner')
+        business = create_business(owner, 'Salon', bookings_today=0)
+        shift = Shift.objects.get(business=business)
+        day = timezone.now().date() + timedelta(days=1)
+        url = f'/api/businesses/{business.pk}/available-slots'
+        params = {'date_from': day, 'date_to': day}
+        self.assertEqual(len(self.client.get(url, params).json()), 16)
+
+        TimeOff.objects.create(business=business, employee=shift.employee, start_date=day, end_date=day,
+                               start_time=time(12, 0), end_time=time(13, 0))
+        self.assertEqual(len(self.client.get(url, params).json()), 14)
+
+        with CaptureQueriesContext(connection) as queries:
+            TimeOff.add_holidays(business, [(day, 'Holiday')])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.client.get(url, params).json(), [])
+        self.assertEqual(TimeSlot.objects.filter(shift=shift, date=day, is_available=True).count(), 16)
+
+
+class OpeningHoursTests(TestCase):
+    def test_compile(self):
+        self.assertEqual(hours.compile_opening_hours({
+            '0': {'open': '09:00', 'close': '18:00'},
+            '1': [{'open': '09:00', 'close': '12:00'}, {'open': '11:00', 'close': '14:00'}],
+            '5': {'open': 'closed', 'close': 'closed'},
+            '6': {'open': '22:00', 'close': '02:00'},
+        }), [[0, 120], [540, 1080], [1980, 2280], [9960, 10080]])
+        with self.assertRaises(ValidationError):
+            hours.compile_opening_hours({'7': {'open': '09:00', 'close': '18:00'}})
+        with self.assertRaises(ValidationError):
+            hours.compile_opening_hours({'0': {'open': '9am', 'close': '18:00'}})
+
+    def test_open_at_filter(self):
+        salon = create_business(User.objects.create_user('salon'), 'Salon')
+        salon.opening_hours = {'0': {'open': '09:00', 'close': '18:00'}}
+        salon.save()
+        barber = create_business(User.objects.create_user('barber'), 'Barber')
+        barber.opening_hours = {'0': {'open': '12:00', 'close': '20:00'}}
+        barber.save()
+
+        def names(open_at):
+            response = self.client.get('/api/businesses', {'open_at': open_at})
+            return sorted(business['name'] for business in response.json())
+
+        # 2025-06-02 is a Monday
+        self.assertEqual(names('2025-06-02T10:00:00'), ['Salon'])
+        self.assertEqual(names('2025-06-02T13:00:00'), ['Barber', 'Salon'])
+        self.assertEqual(names('2025-06-02T19:00:00'), ['Barber'])
+        self.assertEqual(names('2025-06-03T13:00:00'), [])
+
+
+class SlotGranularityTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer')
+        self.business = create_business(User.objects.create_user('owner'), 'Barber', bookings_today=0)
+        self.business.slot_granularity = 15
+        self.business.save()
+        self.shift = Shift.objects.get(business=self.business)
+        self.day = timezone.now().date() + timedelta(days=1)
+        self.trim = Service.objects.create(business=self.business, name='Beard trim', description='',
+                                           price=10, duration=15)
+        self.token = ClaimsRefreshToken.for_user(self.customer).access_token
+
+    def test_generator_uses_business_granularity(self):
+        slots = self.shift.generate_time_slots(date=self.day)
+        self.assertEqual(len(slots), 32)
+        self.assertEqual((slots[0].start_time, slots[0].end_time), (time(9, 0), time(9, 15)))
+        self.assertEqual(self.business.slots_needed(15), 1)
+        self.assertEqual(self.business.slots_needed(40), 3)
+
+    def test_short_service_books_one_fine_slot(self):
+        self.shift.generate_time_slots(date=self.day)
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {self.token}'}
+        response = self.client.get('/businesses/bookings/available-slots/', {
+            'business_id': self.business.pk, 'employee_id': self.shift.employee_id,
+            'date': self.day.isoformat(), 'service_ids': str(self.trim.pk),
+        }, **auth)
+        self.assertEqual(response.json()['slots_needed'], 1)
+
+        response = self.client.post('/businesses/bookings/create/', {
+            'business_id': self.business.pk, 'employee_id': self.shift.employee_id,
+            'service_ids': [self.trim.pk], 'date': self.day.isoformat(), 'start_time': '09:00',
+        }, content_type='application/json', **auth)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['booking']['end_time'], '09:15')
+        self.assertEqual(TimeSlot.objects.filter(shift=self.shift, date=self.day, is_available=True).count(), 31)
+
+    def test_slots_keep_the_length_they_were_generated_with(self):
+        # Tomorrow's slots were generated at 30 minutes, before the change to 15
+        slots = TimeSlot.objects.filter(shift=self.shift, date=self.day).order_by('start_time')
+        self.assertEqual((slots.count(), slots[0].minutes), (16, 30))
+        hour = Service.objects.create(business=self.business, name='Cut', description='', price=20, duration=60)
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {self.token}'}
+
+        response = self.client.get('/businesses/bookings/available-slots/', {
+            'business_id': self.business.pk, 'employee_id': self.shift.employee_id,
+            'date': self.day.isoformat(), 'service_ids': str(hour.pk),
+        }, **auth)
+        self.assertEqual(response.json()['available_slots'][0], {
+            'start_time': '09:00', 'end_time': '10:00', 'duration': 60, 'slots_needed': 2,
+        })
+        days = self.client.get(f'/api/businesses/{self.business.pk}/month-availability', {
+            'service_ids': str(hour.pk), 'month': self.day.strftime('%Y-%m'),
+        }).json()['days']
+        self.assertEqual(next(d['start_times'] for d in days if d['date'] == self.day.isoformat()), 15)
+
+        response = self.client.post('/businesses/bookings/create/', {
+            'business_id': self.business.pk, 'employee_id': self.shift.employee_id,
+            'service_ids': [hour.pk], 'date': self.day.isoformat(), 'start_time': '09:00',
+        }, content_type='application/json', **auth)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual((response.json()['booking']['end_time'], response.json()['booking']['slots_used']), ('10:00', 2))
+        self.assertEqual(slots.filter(is_available=False).count(), 2)
+
+
+    def test_booking_queries_do_not_grow_with_its_slots(self):
+        self.business.slot_granularity = 5
+        self.business.save()
+        TimeSlot.objects.filter(shift=self.shift, date=self.day).delete()
+        self.shift.generate_time_slots(date=self.day)
+        hour = Service.objects.create(business=self.business, name='Cut', description='', price=20, duration=60)
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {self.token}'}
+        SnapshotDirtyDay.objects.all().delete()
+
+        def book(service, start_time):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/businesses/bookings/create/', {
+                    'business_id': self.business.pk, 'employee_id': self.shift.employee_id,
+                    'service_ids': [service.pk], 'date': self.day.isoformat(), 'start_time': start_time,
+                }, content_type='application/json', **auth)
+            self.assertEqual(response.status_code, 201, response.content)
+            return len(queries)
+
+        # 3 slots and 12 slots
+        self.assertEqual(book(self.trim, '09:00'), book(hour, '10:00'))
+        self.assertEqual(TimeSlot.objects.filter(shift=self.shift, date=self.day, is_available=False).count(), 15)
+        self.assertEqual(list(SnapshotDirtyDay.objects.values_list('date', flat=True)), [self.day])
+
+class DayAvailabilityTests(TestCase):
+    def setUp(self):
+        self.business = create_business(User.objects.create_user('owner'), 'Salon', bookings_today=0)
+        self.shift = Shift.objects.get(business=self.business)
+        self.day = timezone.now().date() + timedelta(days=1)
+
+    def test_fit_is_a_bit_scan(self):
+        free = bitmaps.span(9 * 60, 12 * 60) | bitmaps.span(13 * 60, 14 * 60)
+        self.assertEqual(bitmaps.fit_starts(free, 60, step=30), [540, 570, 600, 630, 660, 780])
+        self.assertEqual(bitmaps.fit_starts(free, 150, step=30), [540, 570])
+        self.assertEqual(bitmaps.decode(bitmaps.encode(free)), free)
+
+    def test_parity_with_time_slots(self):
+        TimeSlot.objects.filter(shift=self.shift, date=self.day, start_time=time(11, 0)).update(is_available=False)
+        self.assertEqual(bitmaps.build(self.business.pk, self.day, self.day), 1)
+        self.assertEqual(bitmaps.compare(self.business, self.day, self.day, [15, 30, 60, 120]), [])
+        self.assertEqual(bitmaps.fit_starts(bitmaps.get_free(self.shift.employee_id, self.day), 120, 30),
+                         [540, 690, 720, 750, 780, 810, 840, 870, 900])
+
+    def test_reserve_is_conditional(self):
+        bitmaps.build(self.business.pk, self.day, self.day)
+        employee_id = self.shift.employee_id
+        self.assertTrue(bitmaps.reserve(employee_id, self.day, 600, 45))
+        self.assertFalse(bitmaps.reserve(employee_id, self.day, 630, 30))
+        self.assertNotIn(600, bitmaps.fit_starts(bitmaps.get_free(employee_id, self.day), 30, 30))
+        self.assertTrue(bitmaps.release(employee_id, self.day, 600, 45))
+        self.assertTrue(bitmaps.reserve(employee_id, self.day, 630, 30))
+
+    @override_settings(DAY_AVAILABILITY_BITMAPS=True)
+    def test_time_slot_writes_are_mirrored(self):
+        bitmaps.build(self.business.pk, self.day, self.day)
+        slot = TimeSlot.objects.get(shift=self.shift, date=self.day, start_time=time(9, 0))
+        slot.is_available = False
+        slot.save()
+        self.assertEqual(bitmaps.compare(self.business, self.day, self.day, [30, 60]), [])
+        slot.delete()
+        self.assertEqual(bitmaps.compare(self.business, self.day, self.day, [30, 60]), [])
+
+    @override_settings(DAY_AVAILABILITY_BITMAPS=True)
+    def test_regenerated_slots_are_rebuilt(self):
+        bitmaps.build(self.business.pk, self.day, self.day)
+        self.shift.generate_time_slots(date=self.day)
+        self.assertEqual(bitmaps.get_free(self.shift.employee_id, self.day), bitmaps.span(9 * 60, 17 * 60))
+        self.assertEqual(bitmaps.compare(self.business, self.day, self.day, [30, 60]), [])
+
+    def test_starts_count_from_the_shift_start(self):
+        self.shift.start_time = time(9, 15)
+        self.shift.end_time = time(12, 15)
+        self.shift.save()
+        self.shift.generate_time_slots(date=self.day)
+        bitmaps.build(self.business.pk, self.day, self.day)
+        self.assertEqual(bitmaps.compare(self.business, self.day, self.day, [30, 60]), [])
+
+    @override_settings(DAY_AVAILABILITY_BITMAPS=True)
+    def test_bookings_reserve_and_cancelling_releases(self):
+        bitmaps.build(self.business.pk, self.day, self.day)
+        employee_id = self.shift.employee_id
+        service = Service.objects.filter(business=self.business).first()
+        customer = User.objects.create_user('customer')
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {ClaimsRefreshToken.for_user(customer).access_token}'}
+
+        def book(start_time):
+            return self.client.post('/businesses/bookings/create/', {
+                'business_id': self.business.pk, 'employee_id': employee_id,
+                'service_ids': [service.pk], 'date': self.day.isoformat(), 'start_time': start_time,
+            }, content_type='application/json', **auth)
+
+        # Another booking took 09:00 in the bitset but has not marked its slot yet
+        self.assertTrue(bitmaps.reserve(employee_id, self.day, 9 * 60, 30))
+        self.assertEqual(book('09:00').status_code, 409)
+        self.assertFalse(Booking.objects.filter(customer=customer).exists())
+
+        response = book('10:00')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertNotIn(600, bitmaps.fit_starts(bitmaps.get_free(employee_id, self.day), 30, 30))
+        Booking.objects.get(pk=response.json()['booking']['id']).cancel()
+        self.assertIn(600, bitmaps.fit_starts(bitmaps.get_free(employee_id, self.day), 30, 30))
+
+
+class MonthAvailabilityTests(TestCase):
+    def test_counts_start_times_and_invalidates_on_booking(self):
+        business = create_business(User.objects.create_user('owner'), 'Salon', bookings_today=0)
+        shift = Shift.objects.get(business=business)
+        service = Service.objects.filter(business=business).first()
+        service.duration = 60
+        service.save()
+        day = timezone.now().date() + timedelta(days=1)
+        url = f'/api/businesses/{business.pk}/month-availability'
+        params = {'service_ids': str(service.pk), 'month': day.strftime('%Y-%m')}
+
+        def day_counts():
+            with CaptureQueriesContext(connection) as queries:
+                days = self.client.get(url, params).json()['days']
+            return {d['date']: d['start_times'] for d in days if d['start_times']}, len(queries)
+
+        # 16 half-hour slots from 09:00 leave 15 starts for an hour
+        self.assertEqual(day_counts(), ({day.isoformat(): 15}, 4))
+        # Cached: only the business and its services are read
+        self.assertEqual(day_counts(), ({day.isoformat(): 15}, 2))
+
+        slot = TimeSlot.objects.get(shift=shift, date=day, start_time=time(12, 0))
+        booking = Booking.objects.create(business=business, customer=business.owner)
+        booking.time_slots.add(slot)
+        slot.is_available = False
+        slot.save()
+        self.assertEqual(day_counts()[0], {day.isoformat(): 13})
+
+        self.assertEqual(self.client.get(url, {'service_ids': '999'}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'service_ids': str(service.pk), 'month': '2025-13'}).status_code, 400)
+
+
+class AvailabilitySnapshotTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        override = override_settings(AVAILABILITY_SNAPSHOT_DIR=self.directory.name, AVAILABILITY_SNAPSHOT_DAYS=7)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.business = create_business(User.objects.create_user('owner'), 'Salon', bookings_today=0)
+        self.shift = Shift.objects.get(business=self.business)
+        self.day = timezone.now().date() + timedelta(days=1)
+
+    def read(self, day):
+        with open(snapshots.snapshot_path(self.business.pk, day)) as f:
+            return json.load(f)
+
+    def test_full_build_writes_every_day(self):
+        stats = snapshots.build_all()
+        self.assertEqual((stats.businesses, stats.files), (1, 7))
+        self.assertEqual(len(self.read(self.day)['slots']), 16)
+        self.assertEqual(self.read(self.day - timedelta(days=1))['slots'], [])
+        self.assertFalse(SnapshotDirtyDay.objects.exists())
+
+    def test_booking_rebuilds_only_its_day(self):
+        snapshots.build_all()
+        slot = TimeSlot.objects.get(shift=self.shift, date=self.day, start_time=time(9, 0))
+        slot.is_available = False
+        slot.save()
+        self.assertEqual(list(SnapshotDirtyDay.objects.values_list('date', flat=True)), [self.day])
+
+        stats = snapshots.build_dirty()
+        self.assertEqual(stats.files, 1)
+        self.assertEqual(len(self.read(self.day)['slots']), 15)
+        self.assertFalse(SnapshotDirtyDay.objects.exists())
+        self.assertEqual(snapshots.build_dirty().files, 0)
+
+    def test_moving_time_off_rebuilds_the_days_it_left(self):
+        time_off = TimeOff.objects.create(business=self.business, kind='closure',
+                                          start_date=self.day, end_date=self.day)
+        snapshots.build_all()
+        self.assertEqual(self.read(self.day)['slots'], [])
+
+        time_off.start_date = time_off.end_date = self.day + timedelta(days=1)
+        time_off.save()
+        self.assertEqual(sorted(SnapshotDirtyDay.objects.values_list('date', flat=True)),
+                         [self.day, self.day + timedelta(days=1)])
+        snapshots.build_dirty()
+        self.assertEqual(len(self.read(self.day)['slots']), 16)
+
+
+    def test_dirty_build_follows_the_window(self):
+        snapshots.build_all()
+        today = timezone.now().date()
+        tomorrow = timezone.now() + timedelta(days=1)
+        with mock.patch.object(timezone, 'now', return_value=tomorrow):
+            stats = snapshots.build_dirty()
+            self.assertEqual(stats.files, 1)
+            self.assertTrue(snapshots.snapshot_path(self.business.pk, today + timedelta(days=7)).exists())
+            self.assertFalse(snapshots.snapshot_path(self.business.pk, today).exists())
+            self.assertEqual(snapshots.built_through(), today + timedelta(days=7))
+            self.assertEqual(snapshots.build_dirty().files, 0)
+
+# 'default' stands in for the replica alias, the test database has no other
+@override_settings(REPLICA_DATABASE_ALIAS='default', REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = replicas.ReplicaRouter()
+
+        @replicas.replica_reads
+        def view(request):
+            return HttpResponse(str(self.router.db_for_read(Business)))
+        self.view = view
+
+    def test_safe_requests_read_from_the_replica(self):
+        self.assertEqual(self.view(self.factory.get('/')).content, b'default')
+        self.assertEqual(self.view(self.factory.post('/')).content, b'None')
+        self.assertIsNone(self.router.db_for_read(Business))
+        self.assertEqual(db_router.db_for_write(Business), 'default')
+
+    def test_writes_stick_to_the_primary(self):
+        auth = {'HTTP_AUTHORIZATION': 'Bearer token-a'}
+        middleware = ReplicaStickyMiddleware(lambda request: HttpResponse(status=201))
+        response = middleware(self.factory.post('/', **auth))
+        self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+
+        # The same token, with or without the cookie, reads from the primary
+        self.assertEqual(self.view(self.factory.get('/', **auth)).content, b'None')
+        self.assertEqual(self.view(self.factory.get('/', HTTP_AUTHORIZATION='Bearer token-b')).content, b'default')
+        request = self.factory.get('/')
+        request.COOKIES[replicas.STICKY_COOKIE] = '1'
+        self.assertEqual(self.view(request).content, b'None')
+
+    def test_replica_results_are_cached_apart_and_briefly(self):
+        def cached(compute):
+            return cached_for_business(1, 'test', timeout=300, compute=compute)
+
+        with replicas.reading_from('default'), mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.assertEqual(cached(lambda: 'replica'), 'replica')
+            self.assertEqual(cached(lambda: 'recomputed'), 'replica')
+        cache_set.assert_called_once_with(business_cache_key(1, 'test', 'default'), 'replica', 10)
+        self.assertEqual(cached(lambda: 'primary'), 'primary')
+
+        with override_settings(REPLICA_STICKY_SECONDS=0), replicas.reading_from('default'):
+            self.assertEqual(cached_for_business(1, 'other', timeout=300, compute=lambda: 1), 1)
+            self.assertEqual(cached_for_business(1, 'other', timeout=300, compute=lambda: 2), 2)
+
+
+class ShardingTests(TestCase):
+    databases = set(settings.BUSINESS_SHARDS)
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', password='pass')
+        self.business = create_business(self.owner, 'Sharded')
+
+    @override_settings(BUSINESS_SHARDS=['default', 'shard1'])
+    def test_business_owned_models_follow_the_active_business(self):
+        with self.assertRaises(ValueError):
+            sharding.set_shard(self.business.pk, 'missing')
+        sharding.set_shard(self.business.pk, 'shard1')
+
+        with sharding.for_business(self.business.pk):
+            self.assertEqual(db_router.db_for_read(Booking), 'shard1')
+            self.assertEqual(db_router.db_for_write(Booking.time_slots.through), 'shard1')
+            # The directory stays on default
+            self.assertEqual(db_router.db_for_read(Business), 'default')
+        self.assertEqual(db_router.db_for_write(Booking), 'default')
+        self.assertIsNone(sharding.current_shard())
+
+    def test_fan_out_merges_in_order(self):
+        create_business(User.objects.create_user('second'), 'Second', bookings_today=2)
+        bookings = Booking.objects.order_by('-created_at', '-pk')
+        merged = sharding.fan_out(bookings, key=lambda booking: booking.created_at, reverse=True, limit=2)
+        self.assertEqual(merged, list(bookings[:2]))
+
+
+class ShardFanOutTests(TransactionTestCase):
+    # Committed rows, so the pool threads' own connections see them
+    databases = set(settings.BUSINESS_SHARDS)
+
+    def test_fan_out_queries_the_shards_in_parallel(self):
+        owner = User.objects.create_user('owner')
+        create_business(owner, 'First', bookings_today=2)
+        bookings = Booking.objects.order_by('-created_at', '-pk')
+        expected = list(bookings[:2])
+        aliases = sharding.shard_aliases()
+        if len(aliases) == 1:
+            # The one shard twice stands in for two
+            aliases = aliases * 2
+            expected = [expected[0], expected[0], expected[1]]
+        with mock.patch.object(sharding, 'shard_aliases', return_value=aliases), \
+                mock.patch.object(sharding, '_evaluate', wraps=sharding._evaluate) as evaluate:
+            merged = sharding.fan_out(bookings, key=lambda booking: booking.created_at, reverse=True,
+                                      limit=len(expected))
+        self.assertEqual(merged, expected)
+        self.assertEqual(evaluate.call_count, len(aliases))
+
+
+@skipUnless('shard1' in settings.DATABASES, 'Set BUSINESS_SHARD_PATHS=shard1=<path> to test moving businesses')
+class ShardMoveTests(TestCase):
+    # The runner checks the aliases of skipped tests too
+    databases = {'default', 'shard1'} if 'shard1' in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        self.business = create_business(User.objects.create_user('owner'), 'Moved', bookings_today=0)
+        call_command('move_business_shard', self.business.pk, 'shard1', stdout=StringIO())
+        self.shift = Shift.objects.using('shard1').get(business_id=self.business.pk)
+
+    def test_moved_business_takes_bookings_from_new_customers(self):
+        customer = User.objects.create_user('customer')
+        token = ClaimsRefreshToken.for_user(customer).access_token
+        response = self.client.post('/businesses/bookings/create/', {
+            'business_id': self.business.pk, 'employee_id': self.shift.employee_id,
+            'service_ids': [Service.objects.using('shard1').filter(business_id=self.business.pk).first().pk],
+            'date': (timezone.now().date() + timedelta(days=1)).isoformat(), 'start_time': '10:00',
+        }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 201, response.content)
+        booking_id = response.json()['booking']['id']
+        # SQLite only checks foreign keys on commit, which TestCase never does
+        self.assertTrue(User.objects.using('shard1').filter(pk=customer.pk).exists())
+
+        self.client.force_login(customer)
+        response = self.client.put(f'/api/bookings/{booking_id}/cancel')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Booking.objects.using('shard1').get(pk=booking_id).status, 'cancelled')
+        self.assertFalse(Booking.objects.using('default').filter(pk=booking_id, customer=customer).exists())
+
+    def test_workers_run_on_the_business_shard(self):
+        today = timezone.now().date()
+        job = run_job(enqueue_slot_generation([self.shift.pk], today, today + timedelta(days=13), shard='shard1'))
+        self.assertEqual(job.status, 'completed')
+        self.assertGreater(job.slots_created, 0)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(AVAILABILITY_SNAPSHOT_DIR=directory):
+            snapshots.build_all([self.business.pk])
+            day = next(day for day in shift_dates(self.shift, today, today + timedelta(days=6)))
+            payload = json.loads(snapshots.snapshot_path(self.business.pk, day).read_text())
+        self.assertTrue(payload['slots'])
+
+    def test_move_onto_a_shard_with_rows_of_its_own(self):
+        # Takes the next service id on shard1, which the directory hands out too
+        with sharding.for_business(self.business.pk):
+            Service.objects.create(business=self.business, name='Extra', description='', price=10, duration=30)
+        other = create_business(User.objects.create_user('other'), 'Other', bookings_today=1)
+        call_command('move_business_shard', other.pk, 'shard1', stdout=StringIO())
+
+        with sharding.for_business(other.pk):
+            self.assertEqual(sorted(Service.objects.filter(business=other).values_list('name', flat=True)),
+                             ['Service 0', 'Service 1'])
+            booking = Booking.objects.get(business=other)
+            self.assertEqual(booking.time_slots.get().shift.business_id, other.pk)
+            shift = Shift.objects.get(business=other)
+            self.assertEqual(shift.employee.business_id, other.pk)
+        self.assertEqual(Service.objects.using('shard1').filter(business=self.business).count(), 3)
+        self.assertFalse(Service.objects.using('default').filter(business=other).exists())
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer')
+        self.business = create_business(User.objects.create_user('owner'), 'Barber', bookings_today=0)
+        self.shift = Shift.objects.get(business=self.business)
+        self.token = ClaimsRefreshToken.for_user(self.customer).access_token
+        self.delivered = []
+        self.failing = set()
+        outbox.register('test.event', self.handle)
+        self.addCleanup(outbox.unregister, 'test.event', self.handle)
+
+    def handle(self, event):
+        if event.payload['n'] in self.failing:
+            raise RuntimeError('unavailable')
+        self.delivered.append((event.business_id, event.payload['n']))
+
+    def test_booking_changes_write_events(self):
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {self.token}'}
+        response = self.client.post('/businesses/bookings/create/', {
+            'business_id': self.business.pk, 'employee_id': self.shift.employee_id,
+            'service_ids': [self.business.services.first().pk],
+            'date': (timezone.now().date() + timedelta(days=1)).isoformat(), 'start_time': '10:00',
+        }, content_type='application/json', **auth)
+        self.assertEqual(response.status_code, 201, response.content)
+        booking_id = response.json()['booking']['id']
+
+        # The Ninja booking endpoints use the session
+        self.client.force_login(self.customer)
+        response = self.client.put(f'/api/bookings/{booking_id}/cancel')
+        self.assertEqual(response.status_code, 200, response.content)
+        events = list(OutboxEvent.objects.order_by('pk').values_list('topic', 'payload'))
+        self.assertEqual([topic for topic, payload in events], [outbox.BOOKING_CREATED, outbox.BOOKING_CANCELLED])
+        self.assertEqual(events[0][1]['booking_id'], booking_id)
+        self.assertEqual(events[0][1]['start_time'], '10:00:00')
+
+    def test_failed_event_holds_back_its_business(self):
+        other = create_business(User.objects.create_user('other'), 'Salon', bookings_today=0)
+        for business, n in ((self.business, 1), (self.business, 2), (other, 3), (self.business, 4)):
+            outbox.publish('test.event', business.pk, {'n': n})
+
+        self.failing = {2}
+        with self.assertLogs('businesses.outbox', 'WARNING'):
+            stats = outbox.drain()
+        self.assertEqual((stats.delivered, stats.retried), (2, 1))
+        self.assertEqual(self.delivered, [(self.business.pk, 1), (other.pk, 3)])
+        # Waiting for its retry, the failed event keeps 4 back
+        self.assertFalse(outbox.drain())
+
+        self.failing = set()
+        OutboxEvent.objects.filter(status='pending').update(available_at=timezone.now())
+        outbox.drain()
+        self.assertEqual(self.delivered[2:], [(self.business.pk, 2), (self.business.pk, 4)])
+        self.assertFalse(OutboxEvent.objects.filter(status='pending').exists())
+
+    def test_business_in_backoff_does_not_stall_the_others(self):
+        other = create_business(User.objects.create_user('other'), 'Salon', bookings_today=0)
+        for n in range(5):
+            outbox.publish('test.event', self.business.pk, {'n': n})
+        self.failing = set(range(5))
+        with self.assertLogs('businesses.outbox', 'WARNING'):
+            outbox.drain(batch_size=5)
+        outbox.publish('test.event', other.pk, {'n': 5})
+
+        # The five oldest pending events all belong to the business in backoff
+        outbox.drain(batch_size=5)
+        self.assertEqual(self.delivered, [(other.pk, 5)])
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_SECONDS=0)
+    def test_event_fails_after_max_attempts(self):
+        outbox.publish('test.event', self.business.pk, {'n': 1})
+        outbox.publish('test.event', self.business.pk, {'n': 2})
+        self.failing = {1}
+        with self.assertLogs('businesses.outbox', 'WARNING') as logs:
+            outbox.drain()
+            stats = outbox.drain()
+        self.assertIn('failed after 2 attempts', logs.output[-1])
+        self.assertEqual((stats.failed, stats.delivered), (1, 0))
+        event = OutboxEvent.objects.get(payload__n=1)
+        self.assertEqual((event.status, event.attempts), ('failed', 2))
+        # A failed event no longer holds up the business
+        outbox.drain()
+        self.assertEqual(self.delivered, [(self.business.pk, 2)])
+
+
+class CountingEmailBackend(EmailBackend):
+    opened = 0
+    unreachable = False
+    refused = ()
+
+    def open(self):
+        if CountingEmailBackend.unreachable:
+            raise ConnectionRefusedError('Connection refused')
+        CountingEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if any(message.to[0] in CountingEmailBackend.refused for message in messages):
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='businesses.tests.CountingEmailBackend', NOTIFICATION_COALESCE_SECONDS=0)
+class NotificationTests(TestCase):
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+        CountingEmailBackend.unreachable = False
+        CountingEmailBackend.refused = ()
+        self.customer = User.objects.create_user('customer', email='customer@example.com')
+        self.business = create_business(User.objects.create_user('owner'), 'Barber', bookings_today=0)
+
+    def book(self):
+        booking = Booking.objects.create(business=self.business, customer=self.customer)
+        outbox.booking_event(outbox.BOOKING_CREATED, booking)
+        return booking
+
+    def test_burst_is_sent_as_one_digest_per_recipient(self):
+        self.book()
+        self.book().cancel()
+        outbox.drain()
+        self.assertEqual(Notification.objects.filter(recipient='customer@example.com').count(), 3)
+
+        stats = notifications.send_pending()
+        self.assertEqual((stats.emails, stats.notifications), (2, 6))
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['barber@example.com', 'customer@example.com'])
+        digest = next(message for message in mail.outbox if message.to == ['customer@example.com'])
+        self.assertEqual(digest.subject, '3 booking updates')
+        self.assertIn('at Barber has been cancelled', digest.body)
+        self.assertFalse(Notification.objects.filter(status='pending').exists())
+
+    @override_settings(NOTIFICATION_COALESCE_SECONDS=60)
+    def test_notifications_wait_for_the_coalescing_window(self):
+        self.book()
+        event = OutboxEvent.objects.get()
+        # Redelivering an event doesn't queue its emails twice
+        notifications.queue_booking_notifications(event)
+        notifications.queue_booking_notifications(event)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertFalse(notifications.send_pending())
+        self.assertEqual(mail.outbox, [])
+
+    def test_unreachable_server_backs_the_batch_off(self):
+        self.book()
+        outbox.drain()
+        CountingEmailBackend.unreachable = True
+        stats = notifications.send_pending()
+        self.assertEqual((stats.emails, stats.failed), (0, 2))
+        self.assertEqual(list(Notification.objects.values_list('status', 'attempts')), [('pending', 1)] * 2)
+        self.assertFalse(Notification.objects.filter(send_after__lte=timezone.now()).exists())
+
+    def test_failed_send_reopens_the_connection(self):
+        self.book()
+        outbox.drain()
+        CountingEmailBackend.refused = {'barber@example.com'}
+        stats = notifications.send_pending()
+        self.assertEqual((stats.emails, stats.failed, CountingEmailBackend.opened), (1, 1, 2))
+        self.assertEqual([message.to for message in mail.outbox], [['customer@example.com']])
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user('customer')
+        self.business = create_business(User.objects.create_user('owner'), 'Barber', bookings_today=0)
+        self.shift = Shift.objects.get(business=self.business)
+        token = ClaimsRefreshToken.for_user(self.customer).access_token
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}', 'HTTP_IDEMPOTENCY_KEY': 'booking-1'}
+        self.data = {
+            'business_id': self.business.pk, 'employee_id': self.shift.employee_id,
+            'service_ids': [self.business.services.first().pk],
+            'date': (timezone.now().date() + timedelta(days=1)).isoformat(), 'start_time': '10:00',
+        }
+
+    def post(self, data):
+        return self.client.post('/businesses/bookings/create/', data, content_type='application/json', **self.auth)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post(self.data)
+        self.assertEqual(first.status_code, 201, first.content)
+        # Only JWTAuthentication's user lookup, the booking view doesn't run
+        with self.assertNumQueries(1):
+            retry = self.post(self.data)
+        self.assertEqual((retry.status_code, retry.content), (201, first.content))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+
+        # Without the cache the stored row answers
+        cache.clear()
+        self.assertEqual(self.post(self.data).content, first.content)
+        self.assertEqual(self.post({**self.data, 'start_time': '11:00'}).status_code, 422)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_retry_of_a_request_in_flight_gets_a_conflict(self):
+        IdempotencyKey.objects.create(
+            user=self.customer, key='booking-1', expires_at=timezone.now() + timedelta(hours=1),
+            request_hash=idempotency.request_hash(RequestFactory().post(
+                '/businesses/bookings/create/', self.data, content_type='application/json',
+            )),
+        )
+        response = self.post(self.data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Booking.objects.count(), 0)
+
+
+class TokenBucketThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = create_business(User.objects.create_user('owner'), 'Barber')
+        self.customers = [User.objects.create_user(f'customer{i}') for i in range(2)]
+
+    @override_settings(TOKEN_BUCKET_RATES={'test.ip': '3/min'})
+    def test_tokens_come_back_as_the_window_slides(self):
+        # 1000 is 40s into the minute from 960
+        self.assertEqual([throttling.take('test', None, '10.0.0.1', now=1000) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(throttling.take('test', None, '10.0.0.1', now=1000), 40)
+        self.assertEqual(throttling.take('test', None, '10.0.0.2', now=1000), 0)
+        # At 1040 a third of the previous minute has left the window
+        self.assertEqual(throttling.take('test', None, '10.0.0.1', now=1040), 0)
+        self.assertGreater(throttling.take('test', None, '10.0.0.1', now=1040), 0)
+
+    @override_settings(TOKEN_BUCKET_RATES={'test.ip': '5/min', 'test.endpoint': '100/min'})
+    def test_parallel_takes_do_not_exceed_the_capacity(self):
+        start = threading.Barrier(20)
+        waits = []
+
+        def request():
+            start.wait()
+            waits.append(throttling.take('test', None, '10.0.0.1', now=1000))
+
+        threads = [threading.Thread(target=request) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(waits.count(0), 5)
+        # Refused requests hand their endpoint token back
+        self.assertEqual(cache.get('throttle:test:endpoint:all:16'), 5)
+
+    @override_settings(TOKEN_BUCKET_RATES={'availability.user': '2/min', 'login.ip': '1/min'})
+    def test_throttled_requests_get_429_with_retry_after(self):
+        params = {'business_id': self.business.pk, 'employee_id': self.business.employees.first().pk,
+                  'date': timezone.now().date().isoformat(), 'service_ids': str(self.business.services.first().pk)}
+        statuses = []
+        for customer in (self.customers[0],) * 3 + (self.customers[1],):
+            token = ClaimsRefreshToken.for_user(customer).access_token
+            response = self.client.get('/businesses/bookings/available-slots/', params,
+                                       HTTP_AUTHORIZATION=f'Bearer {token}')
+            statuses.append(response.status_code)
+        self.assertEqual(statuses, [200, 200, 429, 200])
+
+        for _ in range(2):
+            # The client picks X-Forwarded-For, so it does not choose the bucket
+            response = self.client.post('/auth/login/', {'username': 'owner', 'password': 'wrong'},
+                                        HTTP_X_FORWARDED_FOR=f'10.1.0.{_}')
+        self.assertEqual(response.status_code, 429)
+        # The minute's request weighs on the window until the next minute ends
+        self.assertTrue(60 <= int(response['Retry-After']) <= 120)
+
+    @override_settings(TOKEN_BUCKET_RATES={'availability.endpoint': '1/min'})
+    def test_ninja_operations_share_the_endpoint_bucket(self):
+        url = f'/api/businesses/{self.business.pk}/available-slots'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(60 <= int(response['Retry-After']) <= 120)
+
+
+class SingleflightTests(TestCase):
+    def test_concurrent_threads_share_one_computation(self):
+        flights = singleflight.Group('test')
+        release = threading.Event()
+        runs = []
+
+        def compute():
+            runs.append(1)
+            release.wait(5)
+            return ['09:00']
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.do(('b', 1), compute))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        deadline = time_module.monotonic() + 5
+        while flights.stats()['calls'] < 4 and time_module.monotonic() < deadline:
+            time_module.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(results, [['09:00']] * 4)
+        stats = flights.stats()
+        self.assertEqual((stats['executions'], stats['coalesced'], stats['max_waiting'], stats['in_flight']), (1, 3, 3, 0))
+        self.assertEqual(stats['coalescing_ratio'], 0.75)
+        # Nothing is kept once the flight lands
+        flights.do(('b', 1), compute)
+        self.assertEqual(len(runs), 2)
+
+    def test_sync_views_under_asgi_share_one_computation(self):
+        flights = singleflight.Group('test')
+        runs = []
+
+        def compute():
+            runs.append(1)
+            deadline = time_module.monotonic() + 2
+            while flights.stats()['calls'] < 3 and time_module.monotonic() < deadline:
+                time_module.sleep(0.01)
+            return ['09:00']
+
+        async def request():
+            # What ASGIHandler does for each request: its sync code runs on
+            # a thread of its own, not on one thread shared by all requests
+            async with ThreadSensitiveContext():
+                return await sync_to_async(flights.do)('key', compute)
+
+        async def main():
+            return await asyncio.gather(*(request() for _ in range(3)))
+
+        self.assertEqual(asyncio.run(main()), [['09:00']] * 3)
+        self.assertEqual(len(runs), 1)
+
+    def test_coroutines_share_one_task_and_its_error(self):
+        flights = singleflight.Group('test')
+        runs = []
+
+        async def compute():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError('no shifts')
+
+        async def main():
+            return await asyncio.gather(*(flights.ado('key', compute) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertEqual(len(runs), 1)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual((flights.stats()['coalesced'], flights.stats()['errors']), (2, 1))
+
+    def test_availability_requests_are_counted(self):
+        business = create_business(User.objects.create_user('owner'), 'Barber')
+        groups = [singleflight.group(name) for name in ('available-slots', 'api-available-slots')]
+        for flights in groups:
+            flights.reset_stats()
+        token = ClaimsRefreshToken.for_user(business.owner).access_token
+        self.client.get('/businesses/bookings/available-slots/', {
+            'business_id': business.pk, 'employee_id': business.employees.first().pk,
+            'date': timezone.now().date().isoformat(), 'service_ids': str(business.services.first().pk),
+        }, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.client.get(f'/api/businesses/{business.pk}/available-slots')
+        self.assertEqual([flights.stats()['executions'] for flights in groups], [1, 1])
+
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        response = self.client.get(reverse('businesses:singleflight_stats'))
+        self.assertEqual(response.json()['available-slots']['calls'], 1)
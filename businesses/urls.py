@@ -10,6 +10,7 @@ urlpatterns = [
     path('account/setup/success/', views.account_setup_success, name='account_setup_success'),
     path('employees/', views.get_employees, name='get_employees'),
     path('employees/add/', views.add_employee, name='add_employee'),
+    path('employees/leaderboard/', views.get_employee_leaderboard, name='get_employee_leaderboard'),
     path('employees/<int:employee_id>/', views.get_employee_details, name='get_employee_details'),
     path('employees/<int:employee_id>/bookings/', views.get_employee_bookings, name='get_employee_bookings'),
     path('employees/<int:employee_id>/shifts/', views.get_employee_shifts, name='get_employee_shifts'),
@@ -23,4 +24,5 @@ urlpatterns = [
     path('bookings/', views.get_business_bookings, name='get_business_bookings'),
     path('bookings/available-slots/', views.get_available_slots, name='get_available_slots'),
     path('bookings/create/', views.create_booking, name='create_booking'),
+    path('metrics/singleflight/', views.singleflight_stats, name='singleflight_stats'),
 ] 
\ No newline at end of file
@@ -1,22 +1,38 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib import messages
-from .models import BusinessRequest, Business, Employee, Service, Shift, Booking, TimeSlot
+from .models import BusinessRequest, Business, Employee, Service, Shift, Booking, TimeSlot, EmployeeDailyStats
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
 from django.contrib.auth.models import User, Group, Permission
 from django.contrib.auth.hashers import make_password
-from django.http import Http404, JsonResponse
+from django.http import Http404
 from django.contrib.contenttypes.models import ContentType
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from authentication.authentication import ClaimsJWTAuthentication
+from authentication.claims import BUSINESS_OWNERS_GROUP
+from . import bitmaps, outbox, singleflight
+from .availability import BlockedTime
+from .idempotency import idempotent
+from .owner import owner_required
+from .replicas import current_read_db, replica_reads
+from .sharding import activate_business, copy_user
+from .snapshots import mark_dirty
+from api.renderers import FastJsonResponse
+from api.throttling import AvailabilityThrottle
 import uuid
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.db import models
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+
+AVAILABLE_SLOTS = singleflight.group('available-slots')
 
 # Create your views here.
 
@@ -101,7 +117,7 @@ def business_account_setup(request, token):
             last_name = name_parts[1] if len(name_parts) > 1 else ''
             
             # Get or create business owners group with appropriate permissions
-            business_owners_group, created = Group.objects.get_or_create(name='Business Owners')
+            business_owners_group, created = Group.objects.get_or_create(name=BUSINESS_OWNERS_GROUP)
             
             # If the group was just created, add appropriate permissions
             if created:
@@ -162,24 +178,19 @@ def account_setup_success(request):
 
 @csrf_exempt
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def get_employees(request):
+@owner_required
+def get_employees(request, business):
     """
     Get all employees for a business.
     Requires authentication token in header: Authorization: Bearer <your_token>
     """
     try:
-        # Get the business for the current user
-        try:
-            business = Business.objects.get(owner=request.user)
-        except Business.DoesNotExist:
-            return JsonResponse({'error': 'No business found for this user'}, status=404)
-        
         # Get all active employees for the business
         employees = Employee.objects.filter(business=business, is_active=True)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'employees': [{
                 'id': employee.id,
                 'name': employee.name,
@@ -190,31 +201,26 @@ def get_employees(request):
         })
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'error': str(e),
             'type': str(type(e).__name__)
         }, status=500)
 
 @csrf_exempt
 @api_view(['POST'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def add_employee(request):
+@owner_required
+def add_employee(request, business):
     """
     Add a new employee to a business.
     Requires authentication token in header: Authorization: Bearer <your_token>
     """
     try:
-        # Get the business for the current user
-        try:
-            business = Business.objects.get(owner=request.user)
-        except Business.DoesNotExist:
-            return JsonResponse({'error': 'No business found for this user'}, status=404)
-        
         # Get data from request
         name = request.data.get('name')
         if not name:
-            return JsonResponse({'error': 'Employee name is required'}, status=400)
+            return FastJsonResponse({'error': 'Employee name is required'}, status=400)
             
         # Create the employee
         employee = Employee.objects.create(
@@ -235,7 +241,7 @@ def add_employee(request):
             )
             employee.services.set(services)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'message': 'Employee added successfully',
             'employee': {
                 'id': employee.id,
@@ -247,52 +253,48 @@ def add_employee(request):
         }, status=201)
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'error': str(e),
             'type': str(type(e).__name__)
         }, status=500)
 
 @csrf_exempt
 @api_view(['DELETE'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def delete_employee(request, employee_id):
+@owner_required
+def delete_employee(request, employee_id, business):
     """
     Delete an employee from a business.
     Requires authentication token in header: Authorization: Bearer <your_token>
     """
     try:
-        # Get the business for the current user
-        try:
-            business = Business.objects.get(owner=request.user)
-        except Business.DoesNotExist:
-            return JsonResponse({'error': 'No business found for this user'}, status=404)
-        
         # Get the employee and verify it belongs to this business
         try:
             employee = Employee.objects.get(id=employee_id, business=business)
         except Employee.DoesNotExist:
-            return JsonResponse({'error': 'Employee not found'}, status=404)
+            return FastJsonResponse({'error': 'Employee not found'}, status=404)
         
         # Delete the employee
         employee.delete()
         
-        return JsonResponse({
+        return FastJsonResponse({
             'message': 'Employee deleted successfully',
             'employee_id': employee_id
         })
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'error': str(e),
             'type': str(type(e).__name__)
         }, status=500)
 
 @csrf_exempt
 @api_view(['POST'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def add_service(request):
+@owner_required
+def add_service(request, business):
     """
     Add a new service to a business.
     Requires authentication token in header: Authorization: Bearer <your_token>
@@ -306,16 +308,10 @@ def add_service(request):
     }
     """
     try:
-        # Get the business for the current user
-        try:
-            business = Business.objects.get(owner=request.user)
-        except Business.DoesNotExist:
-            return JsonResponse({'error': 'No business found for this user'}, status=404)
-        
         # Get data from request
         name = request.data.get('name')
         if not name:
-            return JsonResponse({'error': 'Service name is required'}, status=400)
+            return FastJsonResponse({'error': 'Service name is required'}, status=400)
             
         description = request.data.get('description', '')
         duration = request.data.get('duration')  # in minutes
@@ -325,13 +321,13 @@ def add_service(request):
         try:
             duration = int(duration) if duration else None
         except ValueError:
-            return JsonResponse({'error': 'Duration must be a number in minutes'}, status=400)
+            return FastJsonResponse({'error': 'Duration must be a number in minutes'}, status=400)
         
         # Validate price
         try:
             price = float(price) if price else None
         except ValueError:
-            return JsonResponse({'error': 'Price must be a valid number'}, status=400)
+            return FastJsonResponse({'error': 'Price must be a valid number'}, status=400)
             
         # Create the service
         service = Service.objects.create(
@@ -343,7 +339,7 @@ def add_service(request):
             is_active=True
         )
         
-        return JsonResponse({
+        return FastJsonResponse({
             'message': 'Service added successfully',
             'service': {
                 'id': service.id,
@@ -355,25 +351,25 @@ def add_service(request):
         }, status=201)
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'error': str(e),
             'type': str(type(e).__name__)
         }, status=500)
 
 @csrf_exempt
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def manage_shifts(request):
+@owner_required
+def manage_shifts(request, business):
     """
     Get all shifts for a business.
     Requires authentication token in header: Authorization: Bearer <your_token>
     """
     try:
-        business = Business.objects.get(owner=request.user)
         shifts = Shift.objects.filter(business=business).select_related('employee')
         
-        return JsonResponse({
+        return FastJsonResponse({
             'shifts': [{
                 'id': shift.id,
                 'employee': {
@@ -386,22 +382,20 @@ def manage_shifts(request):
                 'is_active': shift.is_active
             } for shift in shifts]
         })
-    except Business.DoesNotExist:
-        return JsonResponse({'error': 'Business not found'}, status=404)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def get_weekly_shifts(request):
+@owner_required
+def get_weekly_shifts(request, business):
     """
     Get shifts organized by day of the week.
     Requires authentication token in header: Authorization: Bearer <your_token>
     """
     try:
-        business = Business.objects.get(owner=request.user)
         shifts = Shift.objects.filter(business=business, is_active=True).select_related('employee')
         
         # Organize shifts by day
@@ -422,28 +416,21 @@ def get_weekly_shifts(request):
                 'end_time': shift.end_time.strftime('%H:%M'),
             })
         
-        return JsonResponse({'weekly_shifts': weekly_shifts})
-    except Business.DoesNotExist:
-        return JsonResponse({'error': 'Business not found'}, status=404)
+        return FastJsonResponse({'weekly_shifts': weekly_shifts})
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
 @api_view(['POST'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def add_shift(request):
+@owner_required
+def add_shift(request, business):
     """
     Add a new shift for an employee.
     Requires authentication token in header: Authorization: Bearer <your_token>
     """
     try:
-        # Get the business for the current user
-        try:
-            business = Business.objects.get(owner=request.user)
-        except Business.DoesNotExist:
-            return JsonResponse({'error': 'No business found for this user'}, status=404)
-        
         # Get data from request
         employee_id = request.data.get('employee_id')
         day_of_week = request.data.get('day_of_week')
@@ -452,20 +439,20 @@ def add_shift(request):
         
         # Validate required fields
         if not all([employee_id, day_of_week is not None, start_time, end_time]):
-            return JsonResponse({'error': 'Missing required fields'}, status=400)
+            return FastJsonResponse({'error': 'Missing required fields'}, status=400)
             
         # Convert times to datetime.time objects
         try:
             start_time = datetime.strptime(start_time, '%H:%M').time()
             end_time = datetime.strptime(end_time, '%H:%M').time()
         except ValueError:
-            return JsonResponse({'error': 'Invalid time format. Use HH:MM'}, status=400)
+            return FastJsonResponse({'error': 'Invalid time format. Use HH:MM'}, status=400)
             
         # Validate employee belongs to this business
         try:
             employee = Employee.objects.get(id=employee_id, business=business)
         except Employee.DoesNotExist:
-            return JsonResponse({'error': 'Employee not found'}, status=404)
+            return FastJsonResponse({'error': 'Employee not found'}, status=404)
             
         # Check for overlapping shifts
         overlapping_shifts = Shift.objects.filter(
@@ -476,7 +463,7 @@ def add_shift(request):
         )
         
         if overlapping_shifts.exists():
-            return JsonResponse({'error': 'This shift overlaps with an existing shift'}, status=400)
+            return FastJsonResponse({'error': 'This shift overlaps with an existing shift'}, status=400)
             
         # Create the shift
         shift = Shift.objects.create(
@@ -490,7 +477,7 @@ def add_shift(request):
         
         # Time slots will be automatically generated in the Shift.save() method
         
-        return JsonResponse({
+        return FastJsonResponse({
             'message': 'Shift added successfully',
             'shift': {
                 'id': shift.id,
@@ -506,47 +493,46 @@ def add_shift(request):
         }, status=201)
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'error': str(e),
             'type': str(type(e).__name__)
         }, status=500)
 
 @csrf_exempt
 @api_view(['PUT'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def update_shift(request, shift_id):
+@owner_required
+def update_shift(request, shift_id, business):
     """
     Update an existing shift.
     Requires authentication token in header: Authorization: Bearer <your_token>
     """
     try:
-        business = Business.objects.get(owner=request.user)
-        
         try:
             shift = Shift.objects.get(id=shift_id, business=business)
         except Shift.DoesNotExist:
-            return JsonResponse({'error': 'Shift not found'}, status=404)
+            return FastJsonResponse({'error': 'Shift not found'}, status=404)
         
         # Update fields if provided
         if 'start_time' in request.data:
             try:
                 shift.start_time = datetime.strptime(request.data['start_time'], '%H:%M').time()
             except ValueError:
-                return JsonResponse({'error': 'Invalid start time format. Use HH:MM'}, status=400)
+                return FastJsonResponse({'error': 'Invalid start time format. Use HH:MM'}, status=400)
         
         if 'end_time' in request.data:
             try:
                 shift.end_time = datetime.strptime(request.data['end_time'], '%H:%M').time()
             except ValueError:
-                return JsonResponse({'error': 'Invalid end time format. Use HH:MM'}, status=400)
+                return FastJsonResponse({'error': 'Invalid end time format. Use HH:MM'}, status=400)
         
         if 'is_active' in request.data:
             shift.is_active = request.data['is_active']
         
         # Validate times
         if shift.start_time >= shift.end_time:
-            return JsonResponse({'error': 'End time must be after start time'}, status=400)
+            return FastJsonResponse({'error': 'End time must be after start time'}, status=400)
         
         # Check for overlapping shifts
         existing_shifts = Shift.objects.filter(
@@ -558,13 +544,13 @@ def update_shift(request, shift_id):
         for existing_shift in existing_shifts:
             if (shift.start_time < existing_shift.end_time and 
                 shift.end_time > existing_shift.start_time):
-                return JsonResponse({
+                return FastJsonResponse({
                     'error': 'This shift overlaps with an existing shift'
                 }, status=400)
         
         shift.save()
         
-        return JsonResponse({
+        return FastJsonResponse({
             'message': 'Shift updated successfully',
             'shift': {
                 'id': shift.id,
@@ -579,44 +565,40 @@ def update_shift(request, shift_id):
             }
         })
         
-    except Business.DoesNotExist:
-        return JsonResponse({'error': 'Business not found'}, status=404)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
 @api_view(['DELETE'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def delete_shift(request, shift_id):
+@owner_required
+def delete_shift(request, shift_id, business):
     """
     Delete a shift.
     Requires authentication token in header: Authorization: Bearer <your_token>
     """
     try:
-        business = Business.objects.get(owner=request.user)
-        
         try:
             shift = Shift.objects.get(id=shift_id, business=business)
         except Shift.DoesNotExist:
-            return JsonResponse({'error': 'Shift not found'}, status=404)
+            return FastJsonResponse({'error': 'Shift not found'}, status=404)
         
         shift.delete()
         
-        return JsonResponse({
+        return FastJsonResponse({
             'message': 'Shift deleted successfully',
             'shift_id': shift_id
         })
         
-    except Business.DoesNotExist:
-        return JsonResponse({'error': 'Business not found'}, status=404)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
 @api_view(['POST'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_booking(request):
     """
     Create a new booking with multiple services.
@@ -640,35 +622,36 @@ def create_booking(request):
         
         # Validate required fields
         if not all([business_id, service_ids, employee_id, date_str, start_time_str]):
-            return JsonResponse({'error': 'Missing required fields'}, status=400)
+            return FastJsonResponse({'error': 'Missing required fields'}, status=400)
         
         # Get business and validate
         try:
             business = Business.objects.get(id=business_id)
         except Business.DoesNotExist:
-            return JsonResponse({'error': 'Business not found'}, status=404)
+            return FastJsonResponse({'error': 'Business not found'}, status=404)
+        activate_business(business.id)
             
         # Get employee and validate
         try:
             employee = Employee.objects.get(id=employee_id, business=business)
         except Employee.DoesNotExist:
-            return JsonResponse({'error': 'Employee not found'}, status=404)
+            return FastJsonResponse({'error': 'Employee not found'}, status=404)
             
         # Get services and validate
         services = Service.objects.filter(id__in=service_ids, business=business)
         if len(services) != len(service_ids):
-            return JsonResponse({'error': 'One or more services not found'}, status=404)
+            return FastJsonResponse({'error': 'One or more services not found'}, status=404)
             
         # Calculate total duration needed
         total_duration = sum(service.duration for service in services)
-        required_slots = (total_duration + 29) // 30  # Round up to nearest 30-min slot
+        required_slots = business.slots_needed(total_duration)
         
         # Parse date and time
         try:
             booking_date = datetime.strptime(date_str, '%Y-%m-%d').date()
             start_time = datetime.strptime(start_time_str, '%H:%M').time()
         except ValueError:
-            return JsonResponse({'error': 'Invalid date or time format'}, status=400)
+            return FastJsonResponse({'error': 'Invalid date or time format'}, status=400)
             
         # Get employee's shift for this day
         day_of_week = booking_date.weekday()
@@ -681,40 +664,62 @@ def create_booking(request):
         ).first()
         
         if not shift:
-            return JsonResponse({'error': 'No available shift found for this time'}, status=400)
+            return FastJsonResponse({'error': 'No available shift found for this time'}, status=400)
             
-        # Find consecutive available slots
-        available_slots = TimeSlot.objects.filter(
+        # Find consecutive available slots, going by their own lengths
+        # since slots keep the granularity they were generated with
+        candidates = list(TimeSlot.objects.filter(
             shift=shift,
             date=booking_date,
             start_time__gte=start_time,
             is_available=True
-        ).order_by('start_time')[:required_slots]
+        ).order_by('start_time')[:total_duration])  # a slot lasts at least a minute
+        available_slots = TimeSlot.covering(candidates, total_duration)
         
-        if len(available_slots) < required_slots:
-            return JsonResponse({
+        if available_slots is None:
+            return FastJsonResponse({
                 'error': 'Not enough consecutive time slots available',
                 'required_slots': required_slots,
-                'available_slots': len(available_slots)
+                'available_slots': len(candidates)
             }, status=400)
-            
-        # Create the booking
-        booking = Booking.objects.create(
-            business=business,
-            customer=request.user,
-            status='pending'
-        )
-        
-        # Add services
-        booking.services.set(services)
+        required_slots = len(available_slots)
         
-        # Add time slots
-        for slot in available_slots:
-            booking.time_slots.add(slot)
-            slot.is_available = False
-            slot.save()
+        blocked = BlockedTime(business.id, booking_date, booking_date, employee_ids=[employee.id])
+        if any(blocked.is_blocked(employee.id, booking_date, slot.start_time, slot.end_time) for slot in available_slots):
+            return FastJsonResponse({'error': 'The employee is not available at this time'}, status=400)
+            
+        # Create the booking, its slots and its outbox event together
+        with outbox.atomic():
+            # Take the time in the day's bitset first, so of two bookings
+            # racing for the same minutes only one gets it
+            if settings.DAY_AVAILABILITY_BITMAPS and bitmaps.reserve_slots(employee.id, available_slots) is False:
+                return FastJsonResponse({'error': 'Not enough consecutive time slots available'}, status=409)
+            
+            # The booking's customer foreign key needs the user on the shard
+            copy_user(request.user.pk)
+            booking = Booking.objects.create(
+                business=business,
+                customer=request.user,
+                status='pending'
+            )
+            
+            # Add services
+            booking.services.set(services)
+            
+            # Take the slots in one UPDATE rather than a save per slot. The
+            # reserve above already cleared their bits, and adding them to
+            # the booking bumps the business version afterwards.
+            TimeSlot.objects.filter(pk__in=[slot.pk for slot in available_slots]).update(is_available=False)
+            for slot in available_slots:
+                slot.is_available = False
+            mark_dirty(business.id, [booking_date])
+            
+            # Add time slots
+            booking.time_slots.add(*available_slots)
+            
+            outbox.booking_event(outbox.BOOKING_CREATED, booking)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'message': 'Booking created successfully',
             'booking': {
                 'id': booking.id,
@@ -728,13 +733,13 @@ def create_booking(request):
                 'slots_used': required_slots,
                 'date': date_str,
                 'start_time': start_time_str,
-                'end_time': available_slots.last().end_time.strftime('%H:%M'),
+                'end_time': available_slots[-1].end_time.strftime('%H:%M'),
                 'status': booking.status
             }
         }, status=201)
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'error': str(e),
             'type': str(type(e).__name__)
         }, status=500)
@@ -743,6 +748,8 @@ def create_booking(request):
 @api_view(['GET'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
+@throttle_classes([AvailabilityThrottle])
+@replica_reads
 def get_available_slots(request):
     """
     Get available slots for a specific date and employee, considering service durations.
@@ -760,75 +767,80 @@ def get_available_slots(request):
         service_ids = request.GET.get('service_ids', '').split(',')
         
         if not all([business_id, employee_id, date_str, service_ids]):
-            return JsonResponse({'error': 'Missing required parameters'}, status=400)
+            return FastJsonResponse({'error': 'Missing required parameters'}, status=400)
             
         # Convert service_ids to integers and remove empty strings
         service_ids = [int(sid) for sid in service_ids if sid]
         
+        try:
+            business = Business.objects.only('id', 'slot_granularity').get(id=business_id)
+        except Business.DoesNotExist:
+            return FastJsonResponse({'error': 'Business not found'}, status=404)
+        activate_business(business.id)
+        
         # Get services and calculate total duration
-        services = Service.objects.filter(id__in=service_ids, business_id=business_id)
+        services = Service.objects.filter(id__in=service_ids, business=business)
         total_duration = sum(service.duration for service in services)
-        required_slots = (total_duration + 29) // 30  # Round up to nearest 30-min slot
+        required_slots = business.slots_needed(total_duration)
         
         # Parse date
         try:
             booking_date = datetime.strptime(date_str, '%Y-%m-%d').date()
         except ValueError:
-            return JsonResponse({'error': 'Invalid date format'}, status=400)
+            return FastJsonResponse({'error': 'Invalid date format'}, status=400)
             
-        # Get employee's shifts for this day
-        day_of_week = booking_date.weekday()
-        shifts = Shift.objects.filter(
-            employee_id=employee_id,
-            day_of_week=day_of_week,
-            is_active=True
-        )
-        
-        available_slots = []
-        
-        for shift in shifts:
-            # Get all available slots for this shift
-            slots = TimeSlot.objects.filter(
-                shift=shift,
-                date=booking_date,
-                is_available=True
-            ).order_by('start_time')
-            
-            # Find consecutive slot groups
-            current_group = []
-            for slot in slots:
-                if not current_group:
-                    current_group.append(slot)
-                else:
-                    # Check if this slot is consecutive with the last one
-                    last_slot = current_group[-1]
-                    if last_slot.end_time == slot.start_time:
-                        current_group.append(slot)
+        def compute():
+            # Get employee's shifts for this day
+            day_of_week = booking_date.weekday()
+            shifts = Shift.objects.filter(
+                employee_id=employee_id,
+                day_of_week=day_of_week,
+                is_active=True
+            )
+
+            # Time off and closures are subtracted without touching the slots
+            blocked = BlockedTime(business_id, booking_date, booking_date, employee_ids=[employee_id])
+
+            available_slots = []
+
+            for shift in shifts:
+                # Get all available slots for this shift
+                slots = TimeSlot.objects.filter(
+                    shift=shift,
+                    date=booking_date,
+                    is_available=True
+                ).order_by('start_time')
+                if blocked:
+                    # A blocked slot breaks the run of consecutive slots
+                    slots = [slot for slot in slots
+                             if not blocked.is_blocked(shift.employee_id, booking_date, slot.start_time, slot.end_time)]
+
+                # Find consecutive slot groups
+                groups = []
+                for slot in slots:
+                    if groups and groups[-1][-1].end_time == slot.start_time:
+                        groups[-1].append(slot)
                     else:
-                        # If we have enough slots in the current group, add it to available slots
-                        if len(current_group) >= required_slots:
-                            start_slot = current_group[0]
-                            end_slot = current_group[required_slots - 1]
-                            available_slots.append({
-                                'start_time': start_slot.start_time.strftime('%H:%M'),
-                                'end_time': end_slot.end_time.strftime('%H:%M'),
-                                'duration': total_duration,
-                                'slots_needed': required_slots
-                            })
-                        current_group = [slot]
-                        
-            # Check the last group
-            if len(current_group) >= required_slots:
-                start_slot = current_group[0]
-                end_slot = current_group[required_slots - 1]
-                available_slots.append({
-                    'start_time': start_slot.start_time.strftime('%H:%M'),
-                    'end_time': end_slot.end_time.strftime('%H:%M'),
-                    'duration': total_duration,
-                    'slots_needed': required_slots
-                })
+                        groups.append([slot])
+
+                # Slots keep the length they were generated with, so fit by minutes
+                for group in groups:
+                    covering = TimeSlot.covering(group, total_duration)
+                    if covering:
+                        available_slots.append({
+                            'start_time': covering[0].start_time.strftime('%H:%M'),
+                            'end_time': covering[-1].end_time.strftime('%H:%M'),
+                            'duration': total_duration,
+                            'slots_needed': len(covering)
+                        })
+
+            return available_slots
+
+        # Concurrent requests for the same employee, day and duration share one computation
+        key = (business.id, int(employee_id), booking_date, total_duration, current_read_db())
+        available_slots = AVAILABLE_SLOTS.do(key, compute)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'date': date_str,
             'total_duration': total_duration,
             'slots_needed': required_slots,
@@ -836,16 +848,18 @@ def get_available_slots(request):
         })
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'error': str(e),
             'type': str(type(e).__name__)
         }, status=500)
 
 @csrf_exempt
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def get_business_bookings(request):
+@replica_reads
+@owner_required
+def get_business_bookings(request, business):
     """
     Get all bookings for a business with optional filters.
     
@@ -856,12 +870,6 @@ def get_business_bookings(request):
     - customer_search: Optional customer name/email search
     """
     try:
-        # Get the business for the current user
-        try:
-            business = Business.objects.get(owner=request.user)
-        except Business.DoesNotExist:
-            return JsonResponse({'error': 'No business found for this user'}, status=404)
-        
         # Get query parameters
         date_str = request.GET.get('date')
         status = request.GET.get('status')
@@ -883,7 +891,7 @@ def get_business_bookings(request):
                 booking_date = datetime.strptime(date_str, '%Y-%m-%d').date()
                 bookings = bookings.filter(time_slots__date=booking_date).distinct()
             except ValueError:
-                return JsonResponse({'error': 'Invalid date format'}, status=400)
+                return FastJsonResponse({'error': 'Invalid date format'}, status=400)
         
         if status:
             bookings = bookings.filter(status=status)
@@ -935,7 +943,7 @@ def get_business_bookings(request):
                 }
                 bookings_data.append(booking_data)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'bookings': bookings_data,
             'total_count': len(bookings_data),
             'filters_applied': {
@@ -947,81 +955,125 @@ def get_business_bookings(request):
         })
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'error': str(e),
             'type': str(type(e).__name__)
         }, status=500)
 
 @csrf_exempt
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def get_employee_details(request, employee_id):
+@owner_required
+def get_employee_details(request, employee_id, business):
     """
     Get detailed information about an employee including their stats
     """
     try:
-        business = Business.objects.get(owner=request.user)
         employee = get_object_or_404(Employee, id=employee_id, business=business)
+        today = datetime.now().date()
+        
+        # Booking totals come from the daily rollup, one row per day worked
+        totals = EmployeeDailyStats.objects.filter(employee=employee).aggregate(
+            total_completed=Sum('completed'),
+            total_upcoming=Sum(F('bookings') - F('completed') - F('cancelled'), filter=Q(date__gte=today)),
+            total_minutes=Sum('booked_minutes'),
+            total_revenue=Sum('revenue'),
+        )
         
-        # Get employee's active shifts
-        shifts = Shift.objects.filter(employee=employee, is_active=True)
-        
-        # Get employee's upcoming bookings
-        upcoming_bookings = Booking.objects.filter(
-            time_slots__shift__employee=employee,
-            time_slots__date__gte=datetime.now().date(),
-            status__in=['pending', 'confirmed']
-        ).distinct()
-        
-        # Get employee's completed bookings
-        completed_bookings = Booking.objects.filter(
-            time_slots__shift__employee=employee,
-            status='completed'
-        ).distinct()
-        
-        # Calculate statistics
-        total_completed = completed_bookings.count()
-        total_upcoming = upcoming_bookings.count()
-        total_shifts = shifts.count()
-        
-        # Calculate total slots per week
-        weekly_slots = 0
-        for shift in shifts:
-            duration_minutes = (
-                datetime.combine(datetime.min, shift.end_time) - 
-                datetime.combine(datetime.min, shift.start_time)
-            ).seconds / 60
-            weekly_slots += duration_minutes / 30  # 30-minute slots
+        # Weekly shift length summed in the database
+        shifts = Shift.objects.filter(employee=employee, is_active=True).aggregate(
+            total=Count('id'),
+            duration=Sum(ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())),
+        )
+        weekly_minutes = shifts['duration'].total_seconds() / 60 if shifts['duration'] else 0
         
-        return JsonResponse({
+        return FastJsonResponse({
             'employee': {
                 'id': employee.id,
                 'name': employee.name,
                 'image': employee.image.url if employee.image else None,
                 'stats': {
-                    'total_completed_bookings': total_completed,
-                    'total_upcoming_bookings': total_upcoming,
-                    'total_shifts': total_shifts,
-                    'weekly_slots': int(weekly_slots),
+                    'total_completed_bookings': totals['total_completed'] or 0,
+                    'total_upcoming_bookings': totals['total_upcoming'] or 0,
+                    'total_shifts': shifts['total'],
+                    'weekly_slots': int(weekly_minutes // business.slot_granularity),
+                    'total_booked_minutes': totals['total_minutes'] or 0,
+                    'total_revenue': str(totals['total_revenue'] or 0),
                 }
             }
         })
-    except Business.DoesNotExist:
-        return JsonResponse({'error': 'Business not found'}, status=404)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
+@permission_classes([IsAuthenticated])
+@owner_required
+def get_employee_leaderboard(request, business):
+    """
+    Rank the business's employees over a recent period.
+    
+    Query parameters:
+    - days: Number of days back from today to include (default: 30)
+    - order_by: bookings, completed, booked_minutes or revenue (default: completed)
+    """
+    order_fields = ('bookings', 'completed', 'booked_minutes', 'revenue')
+    order_by = request.GET.get('order_by', 'completed')
+    if order_by not in order_fields:
+        return FastJsonResponse({'error': f"order_by must be one of {', '.join(order_fields)}"}, status=400)
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        return FastJsonResponse({'error': 'days must be a number'}, status=400)
+    
+    try:
+        date_to = datetime.now().date()
+        date_from = date_to - timedelta(days=max(days, 1) - 1)
+        
+        rows = EmployeeDailyStats.objects.filter(
+            business=business,
+            date__range=(date_from, date_to),
+        ).values('employee_id', 'employee__name').annotate(
+            bookings=Sum('bookings'),
+            completed=Sum('completed'),
+            cancelled=Sum('cancelled'),
+            booked_minutes=Sum('booked_minutes'),
+            revenue=Sum('revenue'),
+        ).order_by(f'-{order_by}', 'employee__name')
+        
+        return FastJsonResponse({
+            'leaderboard': [{
+                'rank': rank,
+                'employee': {
+                    'id': row['employee_id'],
+                    'name': row['employee__name']
+                },
+                'bookings': row['bookings'],
+                'completed': row['completed'],
+                'cancelled': row['cancelled'],
+                'booked_minutes': row['booked_minutes'],
+                'revenue': str(row['revenue']),
+            } for rank, row in enumerate(rows, start=1)],
+            'date_from': date_from.strftime('%Y-%m-%d'),
+            'date_to': date_to.strftime('%Y-%m-%d'),
+            'order_by': order_by
+        })
+    except Exception as e:
+        return FastJsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def get_employee_bookings(request, employee_id):
+@replica_reads
+@owner_required
+def get_employee_bookings(request, employee_id, business):
     """
     Get all bookings for a specific employee with optional filters
     """
     try:
-        business = Business.objects.get(owner=request.user)
         employee = get_object_or_404(Employee, id=employee_id, business=business)
         
         # Get query parameters
@@ -1055,14 +1107,14 @@ def get_employee_bookings(request, employee_id):
                 date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
                 bookings = bookings.filter(time_slots__date__gte=date_from)
             except ValueError:
-                return JsonResponse({'error': 'Invalid date_from format'}, status=400)
+                return FastJsonResponse({'error': 'Invalid date_from format'}, status=400)
                 
         if date_to:
             try:
                 date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
                 bookings = bookings.filter(time_slots__date__lte=date_to)
             except ValueError:
-                return JsonResponse({'error': 'Invalid date_to format'}, status=400)
+                return FastJsonResponse({'error': 'Invalid date_to format'}, status=400)
         
         # Format response
         bookings_data = []
@@ -1091,7 +1143,7 @@ def get_employee_bookings(request, employee_id):
                 }
                 bookings_data.append(booking_data)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'bookings': bookings_data,
             'total': len(bookings_data),
             'filters': {
@@ -1101,21 +1153,19 @@ def get_employee_bookings(request, employee_id):
             }
         })
         
-    except Business.DoesNotExist:
-        return JsonResponse({'error': 'Business not found'}, status=404)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def get_employee_shifts(request, employee_id):
+@owner_required
+def get_employee_shifts(request, employee_id, business):
     """
     Get all shifts for a specific employee
     """
     try:
-        business = Business.objects.get(owner=request.user)
         employee = get_object_or_404(Employee, id=employee_id, business=business)
         
         # Get all active shifts for this employee
@@ -1135,7 +1185,7 @@ def get_employee_shifts(request, employee_id):
             slots = (
                 datetime.combine(datetime.min, shift.end_time) - 
                 datetime.combine(datetime.min, shift.start_time)
-            ).seconds / 1800  # 1800 seconds = 30 minutes
+            ).seconds // (60 * business.slot_granularity)
             
             weekly_shifts[day].append({
                 'id': shift.id,
@@ -1144,11 +1194,14 @@ def get_employee_shifts(request, employee_id):
                 'slots': int(slots)
             })
         
-        return JsonResponse({
+        return FastJsonResponse({
             'weekly_shifts': weekly_shifts
         })
         
-    except Business.DoesNotExist:
-        return JsonResponse({'error': 'Business not found'}, status=404)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
+
+@staff_member_required
+def singleflight_stats(request):
+    """Coalescing counters of this worker process, per singleflight group"""
+    return FastJsonResponse(singleflight.stats())